@@ -1,6 +1,13 @@
 from django.contrib import admin
 from unfold.admin import ModelAdmin as UnflodModelAdmin
-from .models import DeliveryDriver, DeliveryOrder
+from .models import (
+    DeliveryDailySummary,
+    DeliveryDriver,
+    DeliveryOrder,
+    DeliveryStatusTransition,
+)
 
 admin.site.register(DeliveryDriver, UnflodModelAdmin)
 admin.site.register(DeliveryOrder, UnflodModelAdmin)
+admin.site.register(DeliveryStatusTransition, UnflodModelAdmin)
+admin.site.register(DeliveryDailySummary, UnflodModelAdmin)
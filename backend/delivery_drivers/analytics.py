@@ -0,0 +1,85 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+from .models import DeliveryDailySummary, DeliveryOrder
+
+
+def _day_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def _average(values):
+    return sum(values) / len(values) if values else None
+
+
+def compute_delivery_summaries(day):
+    """
+    Build (unsaved) DeliveryDailySummary rows for the orders placed on `day`.
+
+    One grouped query over the status log gives each delivery order its
+    accept, pick-up and delivery times; the per-driver, per-hour and
+    whole-day rows are rolled up from that.
+    """
+    start, end = _day_bounds(day)
+    milestones = (
+        DeliveryOrder.objects.filter(created_at__gte=start, created_at__lt=end)
+        .order_by()
+        .annotate(
+            accepted_at=Min(
+                "transitions__created_at", filter=Q(transitions__to_status="accepted")
+            ),
+            on_road_at=Min(
+                "transitions__created_at", filter=Q(transitions__to_status="in_progress")
+            ),
+            delivered_at=Max(
+                "transitions__created_at", filter=Q(transitions__to_status="delivered")
+            ),
+        )
+        .values_list(
+            "driver_id", "created_at", "status", "accepted_at", "on_road_at", "delivered_at"
+        )
+    )
+
+    groups = defaultdict(lambda: {"orders": 0, "delivered": 0, "cancelled": 0, "accept": [], "road": []})
+    for driver_id, created_at, status, accepted_at, on_road_at, delivered_at in milestones:
+        hour = timezone.localtime(created_at).hour
+        keys = [(None, None), (None, hour)]
+        if driver_id:
+            keys.append((driver_id, None))
+        for key in keys:
+            group = groups[key]
+            group["orders"] += 1
+            group["delivered"] += status == "delivered"
+            group["cancelled"] += status == "cancelled"
+            if accepted_at:
+                group["accept"].append((accepted_at - created_at).total_seconds())
+            if on_road_at and delivered_at:
+                group["road"].append((delivered_at - on_road_at).total_seconds())
+
+    return [
+        DeliveryDailySummary(
+            date=day,
+            driver_id=driver_id,
+            hour=hour,
+            orders=group["orders"],
+            delivered=group["delivered"],
+            cancelled=group["cancelled"],
+            avg_seconds_to_accept=_average(group["accept"]),
+            avg_seconds_on_road=_average(group["road"]),
+        )
+        for (driver_id, hour), group in groups.items()
+    ]
+
+
+def summarize_deliveries(day):
+    """Replace the stored summary rows for `day`. Safe to re-run."""
+    summaries = compute_delivery_summaries(day)
+    with transaction.atomic():
+        DeliveryDailySummary.objects.filter(date=day).delete()
+        DeliveryDailySummary.objects.bulk_create(summaries)
+    return summaries
@@ -0,0 +1,70 @@
+import heapq
+
+from django.conf import settings
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import DeliveryDriver, DeliveryOrder
+
+ACTIVE_STATUSES = ("pending", "accepted", "in_progress")
+
+
+def _idle_since(last_dispatched_at):
+    # Drivers that were never dispatched are the longest idle.
+    return last_dispatched_at.timestamp() if last_dispatched_at else 0.0
+
+
+def dispatch_pending_orders(max_load=None):
+    """
+    Assign unassigned pending delivery orders to active, available drivers.
+
+    Orders are taken oldest first. Drivers sit in a heap keyed by
+    (open orders, last dispatch time), so each order goes to the least
+    loaded driver and ties go to whoever has waited longest. Each pick is
+    O(log n). Every assignment is a conditional UPDATE, so an order claimed
+    by someone else in the meantime is skipped rather than reassigned.
+
+    Returns a list of (delivery_order_id, driver_id) pairs.
+    """
+    max_load = max_load or settings.DELIVERY_MAX_OPEN_ORDERS
+    pending = list(
+        DeliveryOrder.objects.filter(driver__isnull=True, status="pending")
+        .order_by("created_at", "id")
+        .values_list("id", flat=True)
+    )
+    if not pending:
+        return []
+
+    drivers = (
+        DeliveryDriver.objects.filter(is_active=True, is_available=True)
+        .annotate(load=Count("orders", filter=Q(orders__status__in=ACTIVE_STATUSES)))
+        .values_list("load", "last_dispatched_at", "id")
+    )
+    heap = [
+        (load, _idle_since(last_dispatched_at), driver_id)
+        for load, last_dispatched_at, driver_id in drivers
+        if load < max_load
+    ]
+    heapq.heapify(heap)
+
+    now = timezone.now()
+    assignments = []
+    for order_id in pending:
+        if not heap:
+            break
+        load, idle_since, driver_id = heapq.heappop(heap)
+        claimed = DeliveryOrder.objects.filter(pk=order_id, driver__isnull=True).update(
+            driver_id=driver_id, updated_at=now
+        )
+        if not claimed:
+            heapq.heappush(heap, (load, idle_since, driver_id))
+            continue
+        assignments.append((order_id, driver_id))
+        if load + 1 < max_load:
+            heapq.heappush(heap, (load + 1, now.timestamp(), driver_id))
+
+    if assignments:
+        DeliveryDriver.objects.filter(
+            pk__in={driver_id for _, driver_id in assignments}
+        ).update(last_dispatched_at=now)
+    return assignments
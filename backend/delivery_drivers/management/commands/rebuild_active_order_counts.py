@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from delivery_drivers.models import DeliveryDriver, DeliveryOrder
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount DeliveryDriver.active_order_count from the delivery orders. "
+        "Run once after deploying the column, or to repair drift."
+    )
+
+    def handle(self, *args, **options):
+        active_orders = (
+            DeliveryOrder.objects.filter(
+                driver=OuterRef("pk"), status__in=DeliveryOrder.ACTIVE_STATUSES
+            )
+            .values("driver")
+            .annotate(total=Count("id"))
+            .values("total")
+        )
+        updated = DeliveryDriver.objects.update(
+            active_order_count=Coalesce(Subquery(active_orders), Value(0))
+        )
+        self.stdout.write(self.style.SUCCESS(f"Recounted {updated} drivers"))
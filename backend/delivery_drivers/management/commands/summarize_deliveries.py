@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from delivery_drivers.analytics import summarize_deliveries
+
+
+class Command(BaseCommand):
+    help = "Precompute delivery KPIs for a day (default: yesterday). Meant to run nightly."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date", help="Day to summarize as YYYY-MM-DD.")
+        parser.add_argument(
+            "--days", type=int, default=1, help="Number of days ending at --date."
+        )
+
+    def handle(self, *args, **options):
+        day = timezone.localdate() - timedelta(days=1)
+        if options["date"]:
+            try:
+                day = parse_date(options["date"])
+            except ValueError:
+                # Well-formed but impossible, such as 2024-02-30.
+                day = None
+            if day is None:
+                raise CommandError("--date must be YYYY-MM-DD")
+
+        for offset in range(options["days"]):
+            current = day - timedelta(days=offset)
+            summaries = summarize_deliveries(current)
+            self.stdout.write(f"{current}: {len(summaries)} summary rows")
+        self.stdout.write(self.style.SUCCESS("Done"))
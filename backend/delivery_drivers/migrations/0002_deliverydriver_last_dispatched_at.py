@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery_drivers', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deliverydriver',
+            name='last_dispatched_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
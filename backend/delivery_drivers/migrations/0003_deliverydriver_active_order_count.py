@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:25
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def count_active_orders(apps, schema_editor):
+    DeliveryDriver = apps.get_model("delivery_drivers", "DeliveryDriver")
+    drivers = list(
+        DeliveryDriver.objects.annotate(
+            active=Count("orders", filter=Q(orders__status__in=("accepted", "in_progress")))
+        ).filter(active__gt=0)
+    )
+    for driver in drivers:
+        driver.active_order_count = driver.active
+    DeliveryDriver.objects.bulk_update(drivers, ["active_order_count"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery_drivers', '0002_deliverydriver_last_dispatched_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deliverydriver',
+            name='active_order_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_active_orders, migrations.RunPython.noop),
+    ]
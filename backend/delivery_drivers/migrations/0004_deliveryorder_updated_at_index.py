@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery_drivers', '0003_deliverydriver_active_order_count'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='deliveryorder',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
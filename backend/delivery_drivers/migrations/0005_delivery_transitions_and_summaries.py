@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery_drivers', '0004_deliveryorder_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliveryDailySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(db_index=True)),
+                ('hour', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('delivered', models.PositiveIntegerField(default=0)),
+                ('cancelled', models.PositiveIntegerField(default=0)),
+                ('avg_seconds_to_accept', models.FloatField(blank=True, null=True)),
+                ('avg_seconds_on_road', models.FloatField(blank=True, null=True)),
+                ('driver', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_summaries', to='delivery_drivers.deliverydriver')),
+            ],
+            options={
+                'verbose_name_plural': 'Delivery daily summaries',
+                'ordering': ('date', 'hour', 'driver'),
+            },
+        ),
+        migrations.CreateModel(
+            name='DeliveryStatusTransition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.CharField(blank=True, max_length=20)),
+                ('to_status', models.CharField(max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('delivery_order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transitions', to='delivery_drivers.deliveryorder')),
+                ('driver', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='delivery_drivers.deliverydriver')),
+            ],
+            options={
+                'ordering': ('created_at',),
+            },
+        ),
+    ]
@@ -1,6 +1,8 @@
-from django.db import models
-from django.db.models.signals import post_save
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 from restaurant_app.models import Order
 
@@ -13,6 +15,9 @@ class DeliveryDriver(models.Model):
     )
     is_active = models.BooleanField(default=False)
     is_available = models.BooleanField(default=False)
+    last_dispatched_at = models.DateTimeField(null=True, blank=True)
+    # Accepted or in-progress orders, kept in step by the DeliveryOrder receivers
+    active_order_count = models.PositiveIntegerField(default=0)
 
     class Meta:
         ordering = ("-is_active",)
@@ -38,14 +43,81 @@ class DeliveryOrder(models.Model):
     )
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ("-updated_at",)
 
+    ACTIVE_STATUSES = ("accepted", "in_progress")
+
     def __str__(self):
         return f"Order {self.id} - {self.status}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered so the save receiver can tell what changed.
+        instance._loaded_active_driver_id = instance.active_driver_id()
+        instance._loaded_status = instance.__dict__.get("status")
+        return instance
+
+    def active_driver_id(self):
+        """The driver this order currently keeps busy, if any."""
+        if self.__dict__.get("status") in self.ACTIVE_STATUSES:
+            return self.__dict__.get("driver_id")
+        return None
+
+
+class DeliveryStatusTransition(models.Model):
+    """One row per DeliveryOrder status change, the raw data for delivery KPIs."""
+
+    delivery_order = models.ForeignKey(
+        DeliveryOrder, on_delete=models.CASCADE, related_name="transitions"
+    )
+    driver = models.ForeignKey(
+        DeliveryDriver, on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    from_status = models.CharField(max_length=20, blank=True)
+    to_status = models.CharField(max_length=20)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ("created_at",)
+
+    def __str__(self):
+        return f"Order {self.delivery_order_id}: {self.from_status} -> {self.to_status}"
+
+
+class DeliveryDailySummary(models.Model):
+    """
+    Delivery KPIs for one day, written nightly by summarize_deliveries.
+
+    Rows with a driver are per-driver totals, rows with an hour are per-hour
+    totals (hour the order came in) and the row with neither is the day.
+    """
+
+    date = models.DateField(db_index=True)
+    driver = models.ForeignKey(
+        DeliveryDriver,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="daily_summaries",
+    )
+    hour = models.PositiveSmallIntegerField(null=True, blank=True)
+    orders = models.PositiveIntegerField(default=0)
+    delivered = models.PositiveIntegerField(default=0)
+    cancelled = models.PositiveIntegerField(default=0)
+    avg_seconds_to_accept = models.FloatField(null=True, blank=True)
+    avg_seconds_on_road = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        ordering = ("date", "hour", "driver")
+        verbose_name_plural = "Delivery daily summaries"
+
+    def __str__(self):
+        return f"{self.date} - {self.orders} orders"
+
 
 @receiver(post_save, sender=Order)
 def create_delivery_order(sender, instance, created, **kwargs):
@@ -56,3 +128,92 @@ def create_delivery_order(sender, instance, created, **kwargs):
                 id=instance.delivery_driver_id
             ).first()
         DeliveryOrder.objects.create(order=instance, driver=driver)
+        if driver is None and settings.DELIVERY_AUTO_DISPATCH:
+            from .dispatch import dispatch_pending_orders
+
+            transaction.on_commit(dispatch_pending_orders)
+
+
+def change_active_order_count(driver_id, delta):
+    """
+    Move a driver's active_order_count by delta in one UPDATE. A driver whose
+    last active order ends becomes available again, and one taking an order
+    becomes unavailable.
+    """
+    if delta > 0:
+        is_available = models.Value(False)
+    else:
+        is_available = models.Case(
+            models.When(active_order_count__lte=-delta, then=models.Value(True)),
+            default=models.F("is_available"),
+        )
+    DeliveryDriver.objects.filter(pk=driver_id).update(
+        active_order_count=models.Case(
+            models.When(active_order_count__lt=-delta, then=models.Value(0)),
+            default=models.F("active_order_count") + delta,
+        ),
+        is_available=is_available,
+    )
+
+
+@receiver(post_save, sender=DeliveryOrder)
+def update_driver_active_orders(sender, instance, **kwargs):
+    previous = getattr(instance, "_loaded_active_driver_id", None)
+    current = instance.active_driver_id()
+    instance._loaded_active_driver_id = current
+    if previous == current:
+        return
+    if previous:
+        change_active_order_count(previous, -1)
+        if settings.DELIVERY_AUTO_DISPATCH:
+            from .dispatch import dispatch_pending_orders
+
+            transaction.on_commit(dispatch_pending_orders)
+    if current:
+        change_active_order_count(current, 1)
+
+
+@receiver(post_delete, sender=DeliveryOrder)
+def release_driver_on_delete(sender, instance, **kwargs):
+    previous = getattr(instance, "_loaded_active_driver_id", None)
+    if previous:
+        change_active_order_count(previous, -1)
+
+
+@receiver(post_save, sender=DeliveryOrder)
+def log_status_transition(sender, instance, created, **kwargs):
+    previous = getattr(instance, "_loaded_status", None)
+    instance._loaded_status = instance.status
+    if created or previous is None or previous == instance.status:
+        return
+    DeliveryStatusTransition.objects.create(
+        delivery_order=instance,
+        driver_id=instance.driver_id,
+        from_status=previous,
+        to_status=instance.status,
+    )
+
+
+def change_delivery_status(delivery_order, new_status):
+    """
+    Move a loaded delivery order to new_status with a conditional UPDATE that
+    only matches while the row still has the status and driver it was loaded
+    with. Two concurrent changes from the same status can't both apply, so
+    the driver counter and the transition log move once. Returns False when
+    the row changed in the meantime.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        matched = DeliveryOrder.objects.filter(
+            pk=delivery_order.pk,
+            status=delivery_order.status,
+            driver_id=delivery_order.driver_id,
+        ).update(status=new_status, updated_at=now)
+        if not matched:
+            return False
+        delivery_order.status = new_status
+        delivery_order.updated_at = now
+        # update() sends no post_save, so run the save receivers directly.
+        update_driver_active_orders(DeliveryOrder, delivery_order)
+        log_status_transition(DeliveryOrder, delivery_order, created=False)
+    return True
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import DeliveryDriver, DeliveryOrder
+from .models import DeliveryDailySummary, DeliveryDriver, DeliveryOrder
 from restaurant_app.serializers import OrderSerializer
 
 class DeliveryDriverSerializer(serializers.ModelSerializer):
@@ -9,7 +9,24 @@ class DeliveryDriverSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = DeliveryDriver
-        fields = ["id", "username", "email", "mobile_number", "is_active", "is_available"]
+        fields = [
+            "id",
+            "username",
+            "email",
+            "mobile_number",
+            "is_active",
+            "is_available",
+            "active_order_count",
+        ]
+        read_only_fields = ["active_order_count"]
+
+    def update(self, instance, validated_data):
+        # Write only the fields sent, so a concurrent active_order_count
+        # change isn't overwritten with the value loaded for this request.
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=list(validated_data))
+        return instance
 
 
 class DeliveryOrderSerializer(serializers.ModelSerializer):
@@ -29,6 +46,62 @@ class DeliveryOrderSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ["id", "created_at", "updated_at"]
 
+class DeliveryFeedSerializer(serializers.ModelSerializer):
+    """Just what the driver app shows, so a feed refresh stays a few KB."""
+
+    order_id = serializers.IntegerField(read_only=True)
+    invoice_number = serializers.CharField(source="order.invoice_number", read_only=True)
+    customer_name = serializers.CharField(source="order.customer_name", read_only=True)
+    address = serializers.CharField(source="order.address", read_only=True)
+    customer_phone_number = serializers.CharField(
+        source="order.customer_phone_number", read_only=True
+    )
+    payment_method = serializers.CharField(source="order.payment_method", read_only=True)
+    amount_due = serializers.DecimalField(
+        source="order.total_amount", max_digits=8, decimal_places=2, read_only=True
+    )
+    items = serializers.SerializerMethodField()
+
+    class Meta:
+        model = DeliveryOrder
+        fields = [
+            "id",
+            "status",
+            "updated_at",
+            "order_id",
+            "invoice_number",
+            "customer_name",
+            "address",
+            "customer_phone_number",
+            "payment_method",
+            "amount_due",
+            "items",
+        ]
+
+    def get_items(self, obj):
+        return ", ".join(
+            f"{item.quantity} x {item.dish.name}" for item in obj.order.items.all()
+        )
+
+
+class DeliveryDailySummarySerializer(serializers.ModelSerializer):
+    driver_name = serializers.CharField(source="driver.user.username", read_only=True, default=None)
+
+    class Meta:
+        model = DeliveryDailySummary
+        fields = [
+            "date",
+            "driver",
+            "driver_name",
+            "hour",
+            "orders",
+            "delivered",
+            "cancelled",
+            "avg_seconds_to_accept",
+            "avg_seconds_on_road",
+        ]
+
+
 class DeliveryOrderUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = DeliveryOrder
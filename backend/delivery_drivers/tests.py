@@ -1,3 +1,340 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import CommandError, call_command
+from django.test import override_settings
+from django.utils import timezone
+
+from restaurant_app.models import User
+from restaurant_app.tests import AdminAPITestCase, QueryBudgetTestCase, make_orders, unique, unique_phone
+from .analytics import summarize_deliveries
+from .models import (
+    DeliveryDailySummary,
+    DeliveryDriver,
+    DeliveryOrder,
+    DeliveryStatusTransition,
+    change_delivery_status,
+)
+from .views import DeliveryDriverViewSet, DeliveryOrderViewSet
+
+
+def make_drivers(n):
+    users = User.objects.bulk_create(
+        [
+            User(
+                username=unique("driver"),
+                email=f"{unique('driver')}@example.com",
+                role="driver",
+                passcode=unique_phone(6),
+            )
+            for _ in range(n)
+        ]
+    )
+    return DeliveryDriver.objects.bulk_create(
+        [DeliveryDriver(user=user, is_active=True, is_available=True) for user in users]
+    )
+
+
+def make_delivery_orders(n, user, driver):
+    return DeliveryOrder.objects.bulk_create(
+        [
+            DeliveryOrder(order=order, driver=driver)
+            for order in make_orders(n, user, order_type="takeaway")
+        ]
+    )
+
+
+def deliver(delivery_orders):
+    with override_settings(DELIVERY_AUTO_DISPATCH=False):
+        for delivery_order in DeliveryOrder.objects.filter(pk__in=[o.pk for o in delivery_orders]):
+            for new_status in ("accepted", "in_progress", "delivered"):
+                delivery_order.status = new_status
+                delivery_order.save()
+
+
+class DeliveryQueryBudgetTests(QueryBudgetTestCase):
+    def test_delivery_drivers(self):
+        self.assertEndpointQueries(
+            "/api/delivery-drivers/",
+            make_drivers,
+            list_max=2,
+            retrieve_max=1,
+        )
+
+    def test_delivery_orders(self):
+        def make_delivery_orders(n):
+            drivers = make_drivers(1)
+            return DeliveryOrder.objects.bulk_create(
+                [
+                    DeliveryOrder(order=order, driver=drivers[0])
+                    for order in make_orders(n, self.user, order_type="takeaway")
+                ]
+            )
+
+        self.assertEndpointQueries(
+            "/api/delivery-orders/",
+            make_delivery_orders,
+            list_max=3,
+            retrieve_max=2,
+        )
+
+    def test_update_status(self):
+        (driver,) = make_drivers(1)
+        (delivery_order,) = DeliveryOrder.objects.bulk_create(
+            [
+                DeliveryOrder(order=order, driver=driver)
+                for order in make_orders(1, self.user, order_type="takeaway")
+            ]
+        )
+        with self.settings(DELIVERY_AUTO_DISPATCH=False):
+            # One SELECT, the conditional order UPDATE, the driver UPDATE and the
+            # transition INSERT, inside a savepoint.
+            self.assertLessEqual(
+                self.count_queries(
+                    "patch",
+                    f"/api/delivery-orders/{delivery_order.id}/update_status/",
+                    {"status": "accepted"},
+                ),
+                6,
+            )
+
+    def test_feed(self):
+        (driver,) = make_drivers(1)
+        for size in self.sizes:
+            DeliveryOrder.objects.bulk_create(
+                [
+                    DeliveryOrder(order=order, driver=driver)
+                    for order in make_orders(size, self.user, order_type="takeaway")
+                ]
+            )
+            self.assertLessEqual(self.count_queries("get", "/api/delivery-orders/feed/"), 2)
+
+    def test_delivery_analytics(self):
+        (driver,) = make_drivers(1)
+        for size in self.sizes:
+            deliver(make_delivery_orders(size, self.user, driver))
+            # Reading the live day is a constant number of queries.
+            self.assertLessEqual(
+                self.count_queries("get", "/api/delivery-orders/analytics/"), 3
+            )
+
+
+class DispatchTests(AdminAPITestCase):
+    def test_least_loaded_longest_idle_driver_first(self):
+        idle, busy, recent = make_drivers(3)
+        now = timezone.now()
+        DeliveryDriver.objects.filter(pk=recent.pk).update(last_dispatched_at=now)
+        DeliveryDriver.objects.filter(pk=idle.pk).update(
+            last_dispatched_at=now - timedelta(hours=1)
+        )
+        orders = make_orders(4, self.user, order_type="takeaway")
+        DeliveryOrder.objects.create(order=orders[0], driver=busy, status="accepted")
+        pending = DeliveryOrder.objects.bulk_create(
+            [DeliveryOrder(order=order) for order in orders[1:]]
+        )
+
+        with self.settings(DELIVERY_MAX_OPEN_ORDERS=1):
+            response = self.client.post("/api/delivery-orders/dispatch/")
+        self.assertEqual(
+            response.data["assigned"],
+            [
+                {"delivery_order": pending[0].id, "driver": idle.id},
+                {"delivery_order": pending[1].id, "driver": recent.id},
+            ],
+        )
+        self.assertIsNone(DeliveryOrder.objects.get(pk=pending[2].pk).driver_id)
+
+        # Finishing the busy driver's delivery frees them and picks up the rest.
+        busy_order = DeliveryOrder.objects.get(order=orders[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(
+                f"/api/delivery-orders/{busy_order.id}/update_status/",
+                {"status": "delivered"},
+                format="json",
+            )
+        self.assertEqual(DeliveryOrder.objects.get(pk=pending[2].pk).driver_id, busy.id)
+
+    def test_new_delivery_order_is_dispatched(self):
+        (driver,) = make_drivers(1)
+        with self.captureOnCommitCallbacks(execute=True):
+            order = make_orders(1, self.user, order_type="delivery")[0]
+        self.assertEqual(DeliveryOrder.objects.get(order=order).driver_id, driver.id)
+
+
+class DriverLoadTests(AdminAPITestCase):
+    def test_counter_follows_status_changes(self):
+        (driver,) = make_drivers(1)
+        orders = DeliveryOrder.objects.bulk_create(
+            [
+                DeliveryOrder(order=order, driver=driver)
+                for order in make_orders(2, self.user, order_type="takeaway")
+            ]
+        )
+
+        def set_status(delivery_order, new_status):
+            response = self.client.patch(
+                f"/api/delivery-orders/{delivery_order.id}/update_status/",
+                {"status": new_status},
+                format="json",
+            )
+            self.assertEqual(response.status_code, 200)
+
+        with self.settings(DELIVERY_AUTO_DISPATCH=False):
+            set_status(orders[0], "accepted")
+            set_status(orders[1], "in_progress")
+            driver.refresh_from_db()
+            self.assertEqual((driver.active_order_count, driver.is_available), (2, False))
+
+            set_status(orders[0], "delivered")
+            driver.refresh_from_db()
+            self.assertEqual((driver.active_order_count, driver.is_available), (1, False))
+            self.assertEqual(
+                self.client.patch(f"/api/delivery-drivers/{driver.id}/toggle_available/").status_code,
+                400,
+            )
+
+            set_status(orders[1], "cancelled")
+            driver.refresh_from_db()
+            self.assertEqual((driver.active_order_count, driver.is_available), (0, True))
+
+
+    def test_driver_updates_keep_the_counter(self):
+        (driver,) = make_drivers(1)
+        stale = DeliveryDriver.objects.get(pk=driver.pk)
+        # An order is accepted after the request loaded the driver.
+        DeliveryDriver.objects.filter(pk=driver.pk).update(active_order_count=1)
+        with mock.patch.object(DeliveryDriverViewSet, "get_object", return_value=stale):
+            url = f"/api/delivery-drivers/{driver.id}/"
+            self.assertEqual(self.client.patch(f"{url}toggle_active/").status_code, 200)
+            self.assertEqual(
+                self.client.patch(url, {"is_active": True}, format="json").status_code, 200
+            )
+        driver.refresh_from_db()
+        self.assertEqual((driver.active_order_count, driver.is_active), (1, True))
+
+    def test_concurrent_changes_from_the_same_status_apply_once(self):
+        (driver,) = make_drivers(1)
+        (order,) = make_delivery_orders(1, self.user, driver)
+        with self.settings(DELIVERY_AUTO_DISPATCH=False):
+            change_delivery_status(DeliveryOrder.objects.get(pk=order.pk), "accepted")
+            first = DeliveryOrder.objects.get(pk=order.pk)
+            second = DeliveryOrder.objects.get(pk=order.pk)
+            self.assertTrue(change_delivery_status(first, "delivered"))
+            self.assertFalse(change_delivery_status(second, "cancelled"))
+
+        driver.refresh_from_db()
+        self.assertEqual(driver.active_order_count, 0)
+        self.assertEqual(DeliveryOrder.objects.get(pk=order.pk).status, "delivered")
+        self.assertEqual(DeliveryStatusTransition.objects.filter(delivery_order=order).count(), 2)
+
+    def test_stale_update_status_is_a_conflict(self):
+        (driver,) = make_drivers(1)
+        (order,) = make_delivery_orders(1, self.user, driver)
+        DeliveryOrder.objects.filter(pk=order.pk).update(status="accepted")
+        with mock.patch.object(
+            DeliveryOrderViewSet, "get_object", return_value=DeliveryOrder.objects.get(pk=order.pk)
+        ):
+            DeliveryOrder.objects.filter(pk=order.pk).update(status="cancelled")
+            response = self.client.patch(
+                f"/api/delivery-orders/{order.id}/update_status/",
+                {"status": "delivered"},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 409)
+
+
+class FeedTests(AdminAPITestCase):
+    def setUp(self):
+        super().setUp()
+        (driver,) = make_drivers(1)
+        DeliveryOrder.objects.bulk_create(
+            [
+                DeliveryOrder(order=order, driver=driver)
+                for order in make_orders(3, self.user, order_type="takeaway")
+            ]
+        )
+
+    def test_only_the_feed_is_compressed(self):
+        response = self.client.get("/api/delivery-orders/feed/", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        response = self.client.post(
+            "/api/login-passcode/", {"passcode": "999999"}, HTTP_ACCEPT_ENCODING="gzip"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_since_returns_only_changed_orders(self):
+        response = self.client.get("/api/delivery-orders/feed/")
+        self.assertEqual(len(response.data["results"]), 3)
+        self.assertEqual(len(response.data["results"][0]["items"].split(", ")), 2)
+
+        since = response.data["server_time"].isoformat()
+        changed = DeliveryOrder.objects.first()
+        changed.status = "delivered"
+        changed.save()
+        response = self.client.get("/api/delivery-orders/feed/", {"since": since})
+        self.assertEqual(
+            [(row["id"], row["status"]) for row in response.data["results"]],
+            [(changed.id, "delivered")],
+        )
+
+
+    def test_bad_since(self):
+        for since in ("yesterday", "2024-02-30T10:00:00"):
+            response = self.client.get("/api/delivery-orders/feed/", {"since": since})
+            self.assertEqual(response.status_code, 400, since)
+
+class DeliveryAnalyticsTests(AdminAPITestCase):
+    def setUp(self):
+        super().setUp()
+        (self.driver,) = make_drivers(1)
+        self.orders = make_delivery_orders(3, self.user, self.driver)
+        deliver(self.orders)
+
+    def test_transitions_are_logged(self):
+        self.assertEqual(DeliveryStatusTransition.objects.count(), 9)
+        self.assertEqual(
+            list(
+                DeliveryStatusTransition.objects.filter(delivery_order=self.orders[0]).values_list(
+                    "from_status", "to_status"
+                )
+            ),
+            [("pending", "accepted"), ("accepted", "in_progress"), ("in_progress", "delivered")],
+        )
+
+    def test_live_day(self):
+        response = self.client.get("/api/delivery-orders/analytics/")
+        (day,) = response.data["days"]
+        self.assertEqual((day["orders"], day["delivered"], day["cancelled"]), (3, 3, 0))
+        self.assertGreaterEqual(day["avg_seconds_to_accept"], 0)
+        (per_driver,) = response.data["drivers"]
+        self.assertEqual((per_driver["driver"], per_driver["orders"]), (self.driver.id, 3))
+        self.assertEqual(sum(row["orders"] for row in response.data["hours"]), 3)
+
+    def test_stored_summaries(self):
+        today = timezone.localdate()
+        # Stored summaries are replaced, not duplicated, when re-run.
+        summarize_deliveries(today)
+        summarize_deliveries(today)
+        self.assertEqual(
+            DeliveryDailySummary.objects.filter(date=today, driver=None, hour=None).get().orders,
+            3,
+        )
+        yesterday = today - timedelta(days=1)
+        DeliveryDailySummary.objects.filter(date=today).update(date=yesterday)
+        response = self.client.get(
+            "/api/delivery-orders/analytics/",
+            {"from_date": yesterday.isoformat(), "to_date": yesterday.isoformat()},
+        )
+        self.assertEqual(response.data["days"][0]["orders"], 3)
+
+    def test_bad_dates(self):
+        response = self.client.get("/api/delivery-orders/analytics/", {"from_date": "2024-02-30"})
+        self.assertEqual(response.status_code, 400)
+        with self.assertRaises(CommandError):
+            call_command("summarize_deliveries", date="2024-02-30", stdout=StringIO())
+
+    def test_staff_only(self):
+        self.client.force_authenticate(user=self.driver.user)
+        self.assertEqual(self.client.get("/api/delivery-orders/analytics/").status_code, 403)
@@ -1,9 +1,30 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.decorators import method_decorator
+from django.views.decorators.gzip import gzip_page
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from .models import DeliveryDriver, DeliveryOrder
-from .serializers import DeliveryDriverSerializer, DeliveryOrderSerializer, DeliveryOrderUpdateSerializer
-from restaurant_app.models import Order
+from .analytics import compute_delivery_summaries
+from .dispatch import dispatch_pending_orders
+from .models import (
+    DeliveryDailySummary,
+    DeliveryDriver,
+    DeliveryOrder,
+    change_delivery_status,
+)
+from .serializers import (
+    DeliveryDailySummarySerializer,
+    DeliveryDriverSerializer,
+    DeliveryFeedSerializer,
+    DeliveryOrderSerializer,
+    DeliveryOrderUpdateSerializer,
+)
+from restaurant_app.models import Order, OrderItem
 from restaurant_app.serializers import OrderTypeChangeSerializer
 
 
@@ -13,15 +34,18 @@ class DeliveryDriverViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
+        queryset = DeliveryDriver.objects.select_related("user")
         if self.request.user.is_staff:
-            return DeliveryDriver.objects.filter(is_active=True)
-        return DeliveryDriver.objects.filter(user=self.request.user)
+            return queryset.filter(is_active=True)
+        return queryset.filter(user=self.request.user)
 
     @action(detail=True, methods=["patch"])
     def toggle_active(self, request, pk=None):
         driver = self.get_object()
         driver.is_active = not driver.is_active
-        driver.save()
+        # Only this column: active_order_count is moved by the DeliveryOrder
+        # receivers meanwhile and a full save would write back a stale count.
+        driver.save(update_fields=["is_active"])
         return Response({"status": "active status updated"})
 
     @action(detail=True, methods=["patch"])
@@ -29,18 +53,16 @@ class DeliveryDriverViewSet(viewsets.ModelViewSet):
         driver = self.get_object()
 
         # Check if the driver has any active orders before allowing them to become available
-        active_orders = DeliveryOrder.objects.filter(
-            driver=driver, status__in=["accepted", "in_progress"]
-        )
-
-        if active_orders.exists() and not driver.is_available:
+        if driver.active_order_count and not driver.is_available:
             return Response(
                 {"error": "Cannot set availability to True while having active orders"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
         driver.is_available = not driver.is_available
-        driver.save()
+        driver.save(update_fields=["is_available"])
+        if driver.is_available and settings.DELIVERY_AUTO_DISPATCH:
+            dispatch_pending_orders()
         return Response({"status": "availability status updated"})
 
 
@@ -50,30 +72,91 @@ class DeliveryOrderViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
+        if self.action in ("update_status", "feed"):
+            # Requests from drivers' phones don't need the nested order.
+            queryset = DeliveryOrder.objects.all()
+        else:
+            queryset = DeliveryOrder.objects.select_related(
+                "driver__user", "order__user__driver_profile"
+            ).prefetch_related("order__items")
         if self.request.user.is_staff:
-            return DeliveryOrder.objects.all()
-        return DeliveryOrder.objects.filter(driver__user=self.request.user)
+            return queryset
+        return queryset.filter(driver__user=self.request.user)
+
+    @action(detail=False, methods=["get"])
+    @method_decorator(gzip_page)
+    def feed(self, request):
+        """
+        Compact feed for the driver app. Without `since` it lists open orders;
+        with `since` (ISO datetime, e.g. the previous server_time) it lists
+        every order changed after it, including finished ones.
+
+        Only this response is gzipped: it carries no secrets, unlike the
+        token endpoints, which must not be compressed (BREACH).
+        """
+        queryset = (
+            self.get_queryset()
+            .select_related("order")
+            .only(
+                "id",
+                "status",
+                "updated_at",
+                "order__id",
+                "order__invoice_number",
+                "order__customer_name",
+                "order__address",
+                "order__customer_phone_number",
+                "order__payment_method",
+                "order__total_amount",
+            )
+            .prefetch_related(
+                Prefetch(
+                    "order__items",
+                    queryset=OrderItem.objects.select_related("dish").only(
+                        "order_id", "quantity", "dish__name"
+                    ),
+                )
+            )
+        )
+
+        server_time = timezone.now()
+        since = request.query_params.get("since")
+        if since:
+            try:
+                since = parse_datetime(since)
+            except ValueError:
+                # Well-formed but impossible, such as 2024-02-30T10:00.
+                since = None
+            if since is None:
+                return Response(
+                    {"error": "since must be an ISO 8601 datetime"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+            queryset = queryset.filter(updated_at__gt=since)
+        else:
+            queryset = queryset.exclude(status__in=["delivered", "cancelled"])
+
+        return Response(
+            {
+                "server_time": server_time,
+                "results": DeliveryFeedSerializer(queryset, many=True).data,
+            }
+        )
 
     @action(detail=True, methods=["patch"])
     def update_status(self, request, pk=None):
         delivery_order = self.get_object()
         new_status = request.data.get("status")
         if new_status in dict(DeliveryOrder.STATUS_CHOICES):
-            old_status = delivery_order.status
-            delivery_order.status = new_status
-            delivery_order.save()
-
-            # Update driver availability if status changes to 'accepted' or 'in_progress'
-            if new_status in ["accepted", "in_progress"]:
-                self.update_driver_availability(delivery_order.driver, False)
-
-            # If status was 'accepted' or 'in_progress' and now it's not, check if driver can be made available
-            elif old_status in ["accepted", "in_progress"] and new_status not in [
-                "accepted",
-                "in_progress",
-            ]:
-                self.check_and_update_driver_availability(delivery_order.driver)
-
+            # Driver availability follows from the status change, see
+            # change_delivery_status in models.py.
+            if not change_delivery_status(delivery_order, new_status):
+                return Response(
+                    {"error": "Delivery order was changed by someone else, reload and retry"},
+                    status=status.HTTP_409_CONFLICT,
+                )
             return Response({"status": "Delivery order status updated"})
         return Response({"error": "Invalid status"}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -107,18 +190,66 @@ class DeliveryOrderViewSet(viewsets.ModelViewSet):
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-    def update_driver_availability(self, driver, is_available):
-        if driver:
-            driver.is_available = is_available
-            driver.save()
-
-    def check_and_update_driver_availability(self, driver):
-        if driver:
-            # Check if the driver has any other active orders
-            active_orders = DeliveryOrder.objects.filter(
-                driver=driver, status__in=["accepted", "in_progress"]
-            ).exclude(id=self.get_object().id)
-
-            if not active_orders.exists():
-                driver.is_available = True
-                driver.save()
+    @action(detail=False, methods=["post"], url_path="dispatch")
+    def dispatch_pending(self, request):
+        if not request.user.is_staff:
+            return Response(
+                {"error": "Only staff can dispatch orders"},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+        assignments = dispatch_pending_orders()
+        return Response(
+            {
+                "assigned": [
+                    {"delivery_order": order_id, "driver": driver_id}
+                    for order_id, driver_id in assignments
+                ]
+            }
+        )
+
+    @action(detail=False, methods=["get"])
+    def analytics(self, request):
+        """
+        Per-driver and per-hour delivery KPIs from the nightly summaries.
+        Today, which has no summary yet, is computed live.
+        """
+        if not request.user.is_staff:
+            return Response(
+                {"error": "Only staff can view delivery analytics"},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+        today = timezone.localdate()
+        from_date = request.query_params.get("from_date")
+        to_date = request.query_params.get("to_date")
+        try:
+            from_date = parse_date(from_date) if from_date else today - timedelta(days=7)
+            to_date = parse_date(to_date) if to_date else today
+        except ValueError:
+            from_date = to_date = None
+        if from_date is None or to_date is None:
+            return Response(
+                {"error": "Dates must be YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        summaries = list(
+            DeliveryDailySummary.objects.filter(date__range=(from_date, min(to_date, today)))
+            .exclude(date=today)
+            .select_related("driver__user")
+        )
+        if from_date <= today <= to_date:
+            live = compute_delivery_summaries(today)
+            drivers = DeliveryDriver.objects.select_related("user").in_bulk(
+                {row.driver_id for row in live if row.driver_id}
+            )
+            for row in live:
+                row.driver = drivers.get(row.driver_id)
+            summaries.extend(live)
+
+        rows = DeliveryDailySummarySerializer(summaries, many=True).data
+        return Response(
+            {
+                "days": [row for row in rows if row["driver"] is None and row["hour"] is None],
+                "drivers": [row for row in rows if row["driver"] is not None],
+                "hours": [row for row in rows if row["hour"] is not None],
+            }
+        )
@@ -1,15 +1,40 @@
 from unfold.admin import ModelAdmin as UnflodModelAdmin
+from django import forms
 from django.utils.translation import gettext_lazy as _
 from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
 from django.contrib import admin
 from django.contrib.auth.models import Group
 from restaurant_app.models import *
+from restaurant_app.services import (
+    create_opening_transaction,
+    record_mess_payment,
+    update_mess_payment,
+)
+from restaurant_app.utils import hash_passcode, is_hashed_passcode
 
 admin.site.unregister(Group)
 admin.site.unregister(BlacklistedToken)
 admin.site.unregister(OutstandingToken)
 
+class UserAdminForm(forms.ModelForm):
+    class Meta:
+        model = User
+        fields = "__all__"
+
+    def clean_passcode(self):
+        # The unique check on the model compares the typed passcode, but the
+        # column stores its digest, so look the digest up instead.
+        passcode = self.cleaned_data.get("passcode")
+        if passcode:
+            digest = passcode if is_hashed_passcode(passcode) else hash_passcode(passcode)
+            if User.objects.filter(passcode=digest).exclude(pk=self.instance.pk).exists():
+                raise forms.ValidationError(_("This passcode is already in use."))
+        return passcode
+
+
 class CustomUserAdmin(UnflodModelAdmin):
+    form = UserAdminForm
+
     # Define the fields to display in the list view
     list_display = ('username', 'email', 'first_name', 'last_name', 'is_staff')
 
@@ -54,10 +79,14 @@ admin.site.register(Category, UnflodModelAdmin)
 admin.site.register(Dish, UnflodModelAdmin)
 admin.site.register(Order, UnflodModelAdmin)
 admin.site.register(OrderItem, UnflodModelAdmin)
+admin.site.register(KitchenTicket, UnflodModelAdmin)
+admin.site.register(Customer, UnflodModelAdmin)
+admin.site.register(ArchivedOrder, UnflodModelAdmin)
 admin.site.register(Bill, UnflodModelAdmin)
 admin.site.register(Notification, UnflodModelAdmin)
 admin.site.register(Floor, UnflodModelAdmin)
 admin.site.register(Table, UnflodModelAdmin)
+admin.site.register(Reservation, UnflodModelAdmin)
 admin.site.register(Coupon, UnflodModelAdmin)
 
 @admin.register(Menu)
@@ -83,12 +112,33 @@ class MenuAdmin(UnflodModelAdmin):
     search_fields = ("name", "day_of_week", "mess_type__name", "created_by")
 
 admin.site.register(MenuItem, UnflodModelAdmin)
-admin.site.register(Mess, UnflodModelAdmin)
+
+@admin.register(Mess)
+class MessAdmin(UnflodModelAdmin):
+    def save_model(self, request, obj, form, change):
+        if not change:
+            obj.initial_transaction_created = True
+        super().save_model(request, obj, form, change)
+        if not change:
+            create_opening_transaction(obj)
+
 admin.site.register(MessType, UnflodModelAdmin)
 
 admin.site.register(CreditUser, UnflodModelAdmin)
 admin.site.register(CreditOrder, UnflodModelAdmin)
-admin.site.register(MessTransaction, UnflodModelAdmin)
+
+@admin.register(MessTransaction)
+class MessTransactionAdmin(UnflodModelAdmin):
+    # Keep the mess running totals in step, as the API does.
+    def save_model(self, request, obj, form, change):
+        if change:
+            previous = MessTransaction.objects.get(pk=obj.pk)
+            update_mess_payment(
+                previous, **{field: getattr(obj, field) for field in form.changed_data}
+            )
+        else:
+            record_mess_payment(obj)
+
 
 admin.site.register(LogoInfo, UnflodModelAdmin)
 admin.site.register(DishVariant, UnflodModelAdmin)
@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+# Every concrete field except the credential hashes is cached, so only
+# these two are deferred on request.user and cost a query when read.
+# Entries are dropped by the User post_save and post_delete receivers in
+# models.py. QuerySet.update() and bulk_update() skip those, so code using
+# them on users must delete user_cache_key(pk) itself; nothing does today.
+UNCACHED_USER_FIELDS = ("password", "passcode")
+
+
+def user_cache_key(user_id):
+    return f"auth-user:{user_id}"
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that keeps the authenticated user's fields, apart from
+    UNCACHED_USER_FIELDS, in the cache for AUTH_USER_CACHE_SECONDS, so
+    polling clients don't hit the user table on every request. Entries are
+    dropped when a User is saved or deleted (see models.py).
+    """
+
+    def get_user(self, validated_token):
+        if api_settings.CHECK_REVOKE_TOKEN:
+            # Needs the password hash, which is not cached.
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        # from_db() expects values in the model's field order.
+        field_names = [
+            field.attname
+            for field in self.user_model._meta.concrete_fields
+            if field.attname not in UNCACHED_USER_FIELDS
+        ]
+        key = user_cache_key(user_id)
+        values = cache.get(key)
+        if values is None:
+            values = (
+                self.user_model.objects.filter(**{api_settings.USER_ID_FIELD: user_id})
+                .values_list(*field_names)
+                .first()
+            )
+            if values is None:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            cache.set(key, values, settings.AUTH_USER_CACHE_SECONDS)
+
+        user = self.user_model.from_db(
+            self.user_model.objects.db, field_names, values
+        )
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        return user
@@ -0,0 +1,104 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from restaurant_app.models import ArchivedOrder, Notification, Order
+from restaurant_app.serializers import OrderSerializer
+
+CLOSED_STATUSES = ("delivered", "cancelled")
+
+
+class Command(BaseCommand):
+    help = (
+        "Move closed orders older than --days (default ORDER_ARCHIVE_AFTER_DAYS) "
+        "with their items, bills and delivery orders into ArchivedOrder, in "
+        "batches. Orders on credit stay live. Meant to run from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=None,
+            help="Age cutoff; sales reports assume it is no shorter than ORDER_ARCHIVE_AFTER_DAYS.",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--purge-notifications",
+            action="store_true",
+            help="Also delete read notifications older than the cutoff.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report how many orders would be archived.",
+        )
+
+    def handle(self, *args, **options):
+        days = options["days"]
+        if days is None:
+            days = settings.ORDER_ARCHIVE_AFTER_DAYS
+        cutoff = timezone.now() - timedelta(days=days)
+        batch_size = options["batch_size"]
+        eligible = Order.objects.filter(
+            created_at__lt=cutoff,
+            status__in=CLOSED_STATUSES,
+            creditorder__isnull=True,
+        )
+
+        if options["dry_run"]:
+            self.stdout.write(f"{eligible.count()} orders would be archived")
+            return
+
+        archived = 0
+        while True:
+            ids = list(eligible.order_by("id").values_list("id", flat=True)[:batch_size])
+            if not ids:
+                break
+            # One transaction per batch: the copies are written and the
+            # originals (with their cascaded rows) removed together.
+            with transaction.atomic():
+                orders = (
+                    Order.objects.filter(id__in=ids)
+                    .select_related("user__driver_profile", "delivery_order__driver__user")
+                    .prefetch_related("items", "bills")
+                )
+                ArchivedOrder.objects.bulk_create(
+                    [self.archive(order) for order in orders], ignore_conflicts=True
+                )
+                Order.objects.filter(id__in=ids).delete()
+            archived += len(ids)
+
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} orders"))
+
+        if options["purge_notifications"]:
+            deleted, _ = Notification.objects.filter(
+                is_read=True, created_at__lt=cutoff
+            ).delete()
+            self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} old notifications"))
+
+    def archive(self, order):
+        payload = dict(OrderSerializer(order).data)
+        payload["bills"] = [
+            {
+                "id": bill.id,
+                "user_id": bill.user_id,
+                "total_amount": bill.total_amount,
+                "paid": bill.paid,
+                "billed_at": bill.billed_at,
+            }
+            for bill in order.bills.all()
+        ]
+        return ArchivedOrder(
+            order_id=order.id,
+            created_at=order.created_at,
+            order_type=order.order_type,
+            status=order.status,
+            payment_method=order.payment_method,
+            total_amount=order.total_amount,
+            customer_phone_number=order.customer_phone_number,
+            payload=payload,
+        )
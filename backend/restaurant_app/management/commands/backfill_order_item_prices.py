@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+
+from restaurant_app.models import Dish, OrderItem
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill unit_price and line_total on order items created before they were "
+        "stored, from the current dish prices, in batches. Migration 0009 does "
+        "this on upgrade; the command re-runs it. Safe to re-run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report how many order items would be filled.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        missing = OrderItem.objects.filter(unit_price__isnull=True)
+
+        if options["dry_run"]:
+            self.stdout.write(f"{missing.count()} order items would be filled")
+            return
+
+        price = Subquery(Dish.objects.filter(pk=OuterRef("dish_id")).values("price")[:1])
+        filled = 0
+        last_id = 0
+        while True:
+            ids = list(
+                missing.filter(id__gt=last_id).order_by("id").values_list("id", flat=True)[
+                    :batch_size
+                ]
+            )
+            if not ids:
+                break
+            # One short transaction per batch so order taking isn't blocked meanwhile.
+            with transaction.atomic():
+                OrderItem.objects.filter(id__in=ids).update(unit_price=price)
+                OrderItem.objects.filter(id__in=ids).update(
+                    line_total=F("unit_price") * F("quantity")
+                )
+            filled += len(ids)
+            last_id = ids[-1]
+
+        self.stdout.write(self.style.SUCCESS(f"Filled prices on {filled} order items"))
@@ -0,0 +1,507 @@
+import json
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    CaptureQueriesContext,
+    setup_test_environment,
+    teardown_test_environment,
+)
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework.views import APIView
+from rest_framework_simplejwt.tokens import AccessToken
+
+from restaurant_app.models import (
+    Category,
+    CreditUser,
+    Dish,
+    Menu,
+    MenuItem,
+    Mess,
+    MessType,
+    Order,
+    OrderItem,
+)
+from transactions_app.models import Ledger, MainGroup, NatureGroup, Transaction
+
+User = get_user_model()
+
+BATCH_SIZE = 5000
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not samples:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(samples))) - 1, 0)
+    return samples[min(rank, len(samples) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway database with a realistic dataset and measure "
+        "throughput and p50/p95 latency of the POS hot paths."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=100000)
+        parser.add_argument("--days", type=int, default=365)
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--warmup", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument(
+            "--output",
+            default="benchmark-results.json",
+            help="Where to write the JSON results.",
+        )
+        parser.add_argument(
+            "--compare",
+            help="Previous results file; fail if any p95 regressed beyond --tolerance.",
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.2,
+            help="Allowed relative p95 slowdown when comparing (0.2 = 20%%).",
+        )
+
+    def handle(self, *args, **options):
+        random.seed(options["seed"])
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            started = time.perf_counter()
+            fixtures = self.seed(
+                options["orders"],
+                options["days"],
+                options["iterations"] + options["warmup"] + 1,
+            )
+            self.stdout.write(f"Seeded in {time.perf_counter() - started:.1f}s")
+
+            # The benchmark measures request handling, not the rate limiter.
+            with mock.patch.object(APIView, "throttle_classes", []):
+                results = self.run_scenarios(
+                    fixtures, options["iterations"], options["warmup"]
+                )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            "generated_at": timezone.now().isoformat(),
+            "database": connection.vendor,
+            "dataset": fixtures["counts"],
+            "iterations": options["iterations"],
+            "results": results,
+        }
+        with open(options["output"], "w") as fh:
+            json.dump(report, fh, indent=2)
+        self.print_report(results)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+        if options["compare"]:
+            self.compare(results, options["compare"], options["tolerance"])
+
+    # Seeding
+
+    def seed(self, order_count, days, pending_count):
+        now = timezone.now()
+        admin = User.objects.create(
+            username="bench-admin",
+            email="bench-admin@example.com",
+            role="admin",
+            passcode="000000",
+            password="bench-password",
+        )
+
+        categories = Category.objects.bulk_create(
+            [Category(name=f"Category {i}") for i in range(12)]
+        )
+        dishes = Dish.objects.bulk_create(
+            [
+                Dish(
+                    name=f"Dish {i}",
+                    price=Decimal(random.randrange(500, 4000)) / 100,
+                    category=categories[i % len(categories)],
+                )
+                for i in range(120)
+            ]
+        )
+
+        self.seed_mess(dishes)
+
+        credit_users = CreditUser.objects.bulk_create(
+            [
+                CreditUser(
+                    username=f"Credit {i}",
+                    mobile_number=f"9{i:09d}",
+                    limit_amount=Decimal("99999999"),
+                )
+                for i in range(200)
+            ]
+        )
+
+        # Spread historical orders over the whole period instead of "now".
+        created_at = Order._meta.get_field("created_at")
+        with mock.patch.object(created_at, "auto_now_add", False):
+            self.seed_orders(admin, dishes, order_count, days, now)
+
+        pending_orders = self.seed_orders_now(admin, dishes, pending_count * 2)
+
+        ledgers = self.seed_ledgers(days, now)
+
+        return {
+            "user": admin,
+            "dishes": [dish.id for dish in dishes],
+            "credit_user": credit_users[0].id,
+            "pending_orders": pending_orders,
+            "sales_ledger": ledgers["sales"].id,
+            "today": timezone.localdate(),
+            "days": days,
+            "counts": {
+                "categories": Category.objects.count(),
+                "dishes": Dish.objects.count(),
+                "orders": Order.objects.count(),
+                "order_items": OrderItem.objects.count(),
+                "credit_users": CreditUser.objects.count(),
+                "messes": Mess.objects.count(),
+                "ledgers": Ledger.objects.count(),
+                "transactions": Transaction.objects.count(),
+            },
+        }
+
+    def seed_mess(self, dishes):
+        days = [day for day, _ in Menu.DAY_OF_WEEK_CHOICES]
+        meals = [meal for meal, _ in MenuItem.MEAL_TYPE_CHOICES]
+        today = timezone.localdate()
+
+        for mess_type_name, _ in MessType.MESS_TYPE_CHOICES:
+            mess_type = MessType.objects.create(name=mess_type_name)
+            menus = Menu.objects.bulk_create(
+                [Menu(name=f"{mess_type_name} {day}", day_of_week=day, mess_type=mess_type) for day in days]
+            )
+            items = [
+                MenuItem(menu=menu, dish=random.choice(dishes), meal_type=meal)
+                for menu in menus
+                for meal in meals
+            ]
+            MenuItem.objects.bulk_create(items)
+            for menu in menus:
+                menu.sub_total = sum(
+                    item.dish.price for item in items if item.menu is menu
+                )
+            Menu.objects.bulk_update(menus, ["sub_total"])
+
+            weekly_total = sum(menu.sub_total for menu in menus)
+            messes = Mess.objects.bulk_create(
+                [
+                    Mess(
+                        customer_name=f"{mess_type_name} customer {i}",
+                        mobile_number=f"{mess_type.id}{i:08d}",
+                        start_date=today - timedelta(days=i % 28),
+                        end_date=today + timedelta(days=28 - i % 28),
+                        mess_type=mess_type,
+                        total_amount=weekly_total * 4,
+                        grand_total=weekly_total * 4,
+                        pending_amount=weekly_total * 4,
+                        initial_transaction_created=True,
+                    )
+                    for i in range(75)
+                ]
+            )
+            Mess.menus.through.objects.bulk_create(
+                [
+                    Mess.menus.through(mess_id=mess.id, menu_id=menu.id)
+                    for mess in messes
+                    for menu in menus
+                ]
+            )
+
+    def build_orders(self, user, dishes, count, created_at_for):
+        orders, lines = [], []
+        for i in range(count):
+            order_lines = [
+                (random.choice(dishes), random.randint(1, 3))
+                for _ in range(random.randint(1, 4))
+            ]
+            orders.append(
+                Order(
+                    user=user,
+                    created_at=created_at_for(i),
+                    total_amount=sum(dish.price * qty for dish, qty in order_lines),
+                    status=random.choice(("delivered",) * 8 + ("cancelled", "approved")),
+                    order_type=random.choice(("dining", "takeaway", "delivery")),
+                    payment_method=random.choice(("cash", "bank", "cash-bank")),
+                )
+            )
+            lines.append(order_lines)
+        return orders, lines
+
+    def insert_orders(self, orders, lines):
+        for start in range(0, len(orders), BATCH_SIZE):
+            batch = Order.objects.bulk_create(orders[start:start + BATCH_SIZE])
+            for order in batch:
+                order.invoice_number = f"{order.id:04d}"
+            Order.objects.bulk_update(batch, ["invoice_number"])
+            OrderItem.objects.bulk_create(
+                [
+                    OrderItem(
+                        order=order,
+                        dish=dish,
+                        quantity=qty,
+                        unit_price=dish.price,
+                        line_total=dish.price * qty,
+                    )
+                    for order, order_lines in zip(batch, lines[start:start + BATCH_SIZE])
+                    for dish, qty in order_lines
+                ],
+                batch_size=BATCH_SIZE,
+            )
+        return orders
+
+    def seed_orders(self, user, dishes, count, days, now):
+        step = timedelta(days=days) / max(count, 1)
+        orders, lines = self.build_orders(
+            user, dishes, count, lambda i: now - timedelta(days=days) + step * i
+        )
+        self.insert_orders(orders, lines)
+
+    def seed_orders_now(self, user, dishes, count):
+        orders, lines = self.build_orders(user, dishes, count, lambda i: None)
+        for order in orders:
+            order.status = "pending"
+        return [order.id for order in self.insert_orders(orders, lines)]
+
+    def seed_ledgers(self, days, now):
+        natures = {
+            name: NatureGroup.objects.create(name=name)
+            for name in ("Assets", "Liabilities", "Income", "Expense")
+        }
+        groups = {
+            "cash": MainGroup.objects.create(name="Cash-in-Hand", nature_group=natures["Assets"]),
+            "debtors": MainGroup.objects.create(name="Sundry Debtors", nature_group=natures["Assets"]),
+            "sales": MainGroup.objects.create(name="Sales Account", nature_group=natures["Income"]),
+            "expense": MainGroup.objects.create(name="Indirect Expenses", nature_group=natures["Expense"]),
+        }
+        ledgers = {
+            "cash": Ledger.objects.create(name="Cash", group=groups["cash"]),
+            "sales": Ledger.objects.create(name="Sales", group=groups["sales"]),
+            "rent": Ledger.objects.create(name="Rent", group=groups["expense"]),
+            "salary": Ledger.objects.create(name="Salary", group=groups["expense"]),
+        }
+
+        transactions = []
+        balances = {key: Decimal("0.00") for key in ledgers}
+        today = now.date()
+        for day in range(days):
+            date = today - timedelta(days=days - day)
+            for voucher in range(20):
+                voucher_no = day * 20 + voucher + 1
+                amount = Decimal(random.randrange(1000, 50000)) / 100
+                income = voucher % 4 != 0
+                ledger_key = "sales" if income else random.choice(("rent", "salary"))
+                if income:
+                    balances[ledger_key] -= amount
+                    balances["cash"] += amount
+                else:
+                    balances[ledger_key] += amount
+                    balances["cash"] -= amount
+                transactions.append(
+                    Transaction(
+                        ledger=ledgers[ledger_key],
+                        particulars=ledgers["cash"],
+                        date=date,
+                        debit_amount=0 if income else amount,
+                        credit_amount=amount if income else 0,
+                        balance_amount=balances[ledger_key],
+                        voucher_no=voucher_no,
+                        debit_credit="credit" if income else "debit",
+                    )
+                )
+                transactions.append(
+                    Transaction(
+                        ledger=ledgers["cash"],
+                        particulars=ledgers[ledger_key],
+                        date=date,
+                        debit_amount=amount if income else 0,
+                        credit_amount=0 if income else amount,
+                        balance_amount=balances["cash"],
+                        voucher_no=voucher_no,
+                        debit_credit="debit" if income else "credit",
+                    )
+                )
+        Transaction.objects.bulk_create(transactions, batch_size=BATCH_SIZE)
+        return ledgers
+
+    # Measurement
+
+    def run_scenarios(self, fixtures, iterations, warmup):
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(fixtures['user'])}"
+        )
+        today = fixtures["today"]
+        month_ago = today - timedelta(days=30)
+        year_ago = today - timedelta(days=fixtures["days"])
+        pending = iter(fixtures["pending_orders"])
+        dishes = fixtures["dishes"]
+
+        def order_create():
+            return client.post(
+                "/api/orders/",
+                {
+                    "order_type": "takeaway",
+                    "payment_method": "cash",
+                    "total_amount": "0.00",
+                    "items": [
+                        {"dish": random.choice(dishes), "quantity": random.randint(1, 3)}
+                        for _ in range(3)
+                    ],
+                },
+                format="json",
+            )
+
+        def order_status_credit():
+            return client.patch(
+                f"/api/order-status/{next(pending)}/",
+                {
+                    "status": "delivered",
+                    "payment_method": "credit",
+                    "credit_user_id": fixtures["credit_user"],
+                },
+                format="json",
+            )
+
+        def bill_create():
+            return client.post(
+                "/api/bills/",
+                {"order_id": next(pending), "total_amount": "100.00", "paid": True},
+                format="json",
+            )
+
+        scenarios = [
+            ("order_create", order_create, 201),
+            ("order_status_credit", order_status_credit, 200),
+            ("bill_create", bill_create, 201),
+            (
+                "dashboard_data",
+                lambda: client.get("/api/orders/dashboard_data/", {"time_range": "month"}),
+                200,
+            ),
+            (
+                "sales_report",
+                lambda: client.get(
+                    "/api/orders/sales_report/",
+                    {
+                        "from_date": (today - timedelta(days=1)).isoformat(),
+                        "to_date": (today - timedelta(days=1)).isoformat(),
+                        "order_status": "delivered",
+                    },
+                ),
+                200,
+            ),
+            (
+                "ledger_report",
+                lambda: client.get(
+                    "/api/transactions/ledger_report/",
+                    {
+                        "ledger": fixtures["sales_ledger"],
+                        "from_date": month_ago.isoformat(),
+                        "to_date": today.isoformat(),
+                    },
+                ),
+                200,
+            ),
+            (
+                "profit_and_loss",
+                lambda: client.get(
+                    "/api/transactions/profit-and-loss/",
+                    {"from_date": year_ago.isoformat(), "to_date": today.isoformat()},
+                ),
+                200,
+            ),
+        ]
+
+        results = {}
+        for name, call, expected_status in scenarios:
+            results[name] = self.measure(name, call, expected_status, iterations, warmup)
+            self.stdout.write(f"  {name}: p95 {results[name]['p95_ms']:.2f} ms")
+        return results
+
+    def measure(self, name, call, expected_status, iterations, warmup):
+        for _ in range(warmup):
+            self.check_response(name, call(), expected_status)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.check_response(name, call(), expected_status)
+        query_count = len(queries)
+
+        samples = []
+        started = time.perf_counter()
+        for _ in range(iterations):
+            t0 = time.perf_counter()
+            response = call()
+            samples.append((time.perf_counter() - t0) * 1000)
+            self.check_response(name, response, expected_status)
+        elapsed = time.perf_counter() - started
+
+        samples.sort()
+        return {
+            "iterations": iterations,
+            "throughput_rps": round(iterations / elapsed, 2) if elapsed else None,
+            "mean_ms": round(sum(samples) / len(samples), 3),
+            "p50_ms": round(percentile(samples, 50), 3),
+            "p95_ms": round(percentile(samples, 95), 3),
+            "max_ms": round(samples[-1], 3),
+            "queries": query_count,
+        }
+
+    def check_response(self, name, response, expected_status):
+        if response.status_code != expected_status:
+            raise CommandError(
+                f"{name} returned {response.status_code}, expected {expected_status}: "
+                f"{response.content[:500]!r}"
+            )
+
+    # Reporting
+
+    def print_report(self, results):
+        self.stdout.write(
+            f"{'scenario':<22}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'queries':>9}"
+        )
+        for name, row in results.items():
+            self.stdout.write(
+                f"{name:<22}{row['throughput_rps']:>10}{row['p50_ms']:>10}"
+                f"{row['p95_ms']:>10}{row['queries']:>9}"
+            )
+
+    def compare(self, results, baseline_path, tolerance):
+        try:
+            with open(baseline_path) as fh:
+                baseline = json.load(fh)["results"]
+        except (OSError, ValueError, KeyError) as exc:
+            raise CommandError(f"Cannot read baseline {baseline_path}: {exc}")
+
+        regressions = []
+        for name, row in results.items():
+            previous = baseline.get(name)
+            if not previous:
+                continue
+            change = (row["p95_ms"] - previous["p95_ms"]) / previous["p95_ms"]
+            self.stdout.write(
+                f"{name:<22}{previous['p95_ms']:>10} -> {row['p95_ms']:<10}{change:+.1%}"
+            )
+            if change > tolerance:
+                regressions.append(name)
+
+        if regressions:
+            raise CommandError(f"p95 regression beyond {tolerance:.0%}: {', '.join(regressions)}")
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from restaurant_app.services import bill_messes
+
+
+class Command(BaseCommand):
+    help = (
+        "Renew mess subscriptions whose period has ended: charge the next "
+        "period pro rata, roll pending amounts forward and record due transactions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--date", help="Billing date as YYYY-MM-DD (default: today)."
+        )
+        parser.add_argument("--period-days", type=int, default=30)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Show what would be billed without saving anything.",
+        )
+
+    def handle(self, *args, **options):
+        billing_date = timezone.localdate()
+        if options["date"]:
+            try:
+                billing_date = parse_date(options["date"])
+            except ValueError:
+                # Well-formed but impossible, such as 2024-02-30.
+                billing_date = None
+            if billing_date is None:
+                raise CommandError("--date must be YYYY-MM-DD")
+        if options["period_days"] < 1:
+            raise CommandError("--period-days must be at least 1")
+
+        messes = bill_messes(
+            billing_date,
+            period_days=options["period_days"],
+            dry_run=options["dry_run"],
+        )
+        billed = sum(mess.total_amount for mess in messes)
+        pending = sum(mess.pending_amount for mess in messes)
+        prefix = "Would bill" if options["dry_run"] else "Billed"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{prefix} {len(messes)} messes: {billed} charged, {pending} now pending"
+            )
+        )
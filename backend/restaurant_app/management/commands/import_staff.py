@@ -0,0 +1,39 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from restaurant_app.services import STAFF_IMPORT_FIELDS, StaffImportError, import_staff
+
+
+class Command(BaseCommand):
+    help = (
+        "Create staff, admin and driver users from a CSV file with the columns "
+        + ", ".join(STAFF_IMPORT_FIELDS)
+        + "."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Processes used for password hashing (default: one per CPU).",
+        )
+
+    def handle(self, *args, **options):
+        with open(options["path"], newline="", encoding="utf-8-sig") as handle:
+            rows = list(csv.DictReader(handle))
+
+        try:
+            users, drivers = import_staff(rows, workers=options["workers"])
+        except StaffImportError as e:
+            for number, messages in sorted(e.errors.items()):
+                self.stderr.write(f"Row {number}: {'; '.join(messages)}")
+            raise CommandError("No users were imported")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {len(users)} users ({len(drivers)} delivery drivers)"
+            )
+        )
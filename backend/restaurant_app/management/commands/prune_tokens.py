@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+from rest_framework_simplejwt.utils import aware_utcnow
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired outstanding and blacklisted JWTs in batches. "
+        "Meant to run daily from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report how many tokens would be deleted.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        expired = OutstandingToken.objects.filter(expires_at__lte=aware_utcnow())
+
+        if options["dry_run"]:
+            self.stdout.write(f"{expired.count()} expired tokens would be deleted")
+            return
+
+        deleted = 0
+        while True:
+            ids = list(expired.order_by("id").values_list("id", flat=True)[:batch_size])
+            if not ids:
+                break
+            # One short transaction per batch keeps logins and refreshes
+            # from waiting on the whole prune. Blacklist rows cascade.
+            with transaction.atomic():
+                OutstandingToken.objects.filter(id__in=ids).delete()
+            deleted += len(ids)
+
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired tokens"))
@@ -0,0 +1,87 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+
+from restaurant_app.models import CreditUser, Customer, Mess, Order, add_customers
+from restaurant_app.utils import normalize_phone
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill missing order phone keys and rebuild the customer directory and its "
+        "order stats from scratch. Use after importing data or if stats drift."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+
+        # Rows written around Order.save() (bulk inserts, raw imports) may lack
+        # the key; the phone number as typed is left alone.
+        keyed = 0
+        last_id = 0
+        while True:
+            rows = list(
+                Order.objects.filter(id__gt=last_id)
+                .exclude(customer_phone_number="")
+                .order_by("id")
+                .values_list("id", "customer_phone_number", "customer_phone_key")[:batch_size]
+            )
+            if not rows:
+                break
+            changed = [
+                Order(id=order_id, customer_phone_key=normalize_phone(phone))
+                for order_id, phone, key in rows
+                if normalize_phone(phone) != key
+            ]
+            Order.objects.bulk_update(changed, ["customer_phone_key"])
+            keyed += len(changed)
+            last_id = rows[-1][0]
+
+        add_customers(CreditUser.objects.values_list("mobile_number", "username"))
+        add_customers(Mess.objects.values_list("mobile_number", "customer_name"))
+
+        stats = (
+            Order.objects.filter(status="delivered")
+            .exclude(customer_phone_key="")
+            .order_by()
+            .values("customer_phone_key")
+            .annotate(
+                name=Max("customer_name"),
+                order_count=Count("id"),
+                total_spent=Sum("total_amount"),
+                first_order_at=Min("created_at"),
+                last_order_at=Max("created_at"),
+            )
+        )
+        customers = [
+            Customer(
+                phone=row["customer_phone_key"],
+                name=row["name"],
+                order_count=row["order_count"],
+                total_spent=row["total_spent"],
+                first_order_at=row["first_order_at"],
+                last_order_at=row["last_order_at"],
+            )
+            for row in stats
+        ]
+        with transaction.atomic():
+            Customer.objects.update(
+                order_count=0, total_spent=0, first_order_at=None, last_order_at=None
+            )
+            Customer.objects.bulk_create(
+                customers,
+                batch_size=batch_size,
+                update_conflicts=True,
+                unique_fields=["phone"],
+                update_fields=["order_count", "total_spent", "first_order_at", "last_order_at"],
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Filled {keyed} order phone keys; "
+                f"{len(customers)} customers have delivered orders"
+            )
+        )
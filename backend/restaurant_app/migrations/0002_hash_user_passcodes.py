@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:15
+
+from django.db import migrations, models
+
+from restaurant_app.utils import hash_passcode, is_hashed_passcode
+
+
+def hash_existing_passcodes(apps, schema_editor):
+    User = apps.get_model("restaurant_app", "User")
+    users = [user for user in User.objects.only("id", "passcode") if user.passcode]
+    for user in users:
+        if not is_hashed_passcode(user.passcode):
+            user.passcode = hash_passcode(user.passcode)
+    User.objects.bulk_update(users, ["passcode"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='passcode',
+            field=models.CharField(max_length=64, unique=True),
+        ),
+        migrations.RunPython(hash_existing_passcodes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant_app', '0002_hash_user_passcodes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='table',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='orders', to='restaurant_app.table'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant_app', '0003_order_table'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Reservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('customer_name', models.CharField(max_length=100)),
+                ('customer_phone_number', models.CharField(blank=True, max_length=12)),
+                ('party_size', models.PositiveIntegerField()),
+                ('start_time', models.DateTimeField(db_index=True)),
+                ('end_time', models.DateTimeField(db_index=True)),
+                ('status', models.CharField(choices=[('booked', 'Booked'), ('seated', 'Seated'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], default='booked', max_length=20)),
+                ('note', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('tables', models.ManyToManyField(related_name='reservations', to='restaurant_app.table')),
+            ],
+            options={
+                'ordering': ('start_time',),
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant_app', '0005_order_item_prices'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='station',
+            field=models.CharField(default='main', max_length=50),
+        ),
+        migrations.CreateModel(
+            name='KitchenTicket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('station', models.CharField(max_length=50)),
+                ('status', models.CharField(choices=[('new', 'New'), ('preparing', 'Preparing'), ('ready', 'Ready'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], default='new', max_length=20)),
+                ('order_type', models.CharField(max_length=20)),
+                ('table_name', models.CharField(blank=True, max_length=50)),
+                ('note', models.TextField(blank=True)),
+                ('lines', models.JSONField(default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='kitchen_tickets', to='restaurant_app.order')),
+            ],
+            options={
+                'ordering': ('id',),
+                'indexes': [models.Index(fields=['station', 'status', 'id'], name='restaurant__station_737609_idx')],
+            },
+        ),
+    ]
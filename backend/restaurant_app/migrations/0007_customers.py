@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant_app', '0006_kitchen_tickets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Customer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone', models.CharField(max_length=15, unique=True)),
+                ('name', models.CharField(blank=True, max_length=100)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('total_spent', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('first_order_at', models.DateTimeField(blank=True, null=True)),
+                ('last_order_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ('-last_order_at',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer_phone_number', 'created_at'], name='restaurant__custome_0e6171_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:59
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant_app', '0007_customers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_id', models.PositiveIntegerField(unique=True)),
+                ('created_at', models.DateTimeField(db_index=True)),
+                ('order_type', models.CharField(max_length=20)),
+                ('status', models.CharField(max_length=20)),
+                ('payment_method', models.CharField(max_length=20)),
+                ('total_amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('customer_phone_number', models.CharField(blank=True, max_length=12)),
+                ('payload', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ('-created_at',),
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:40
+
+from django.db import migrations
+from django.db.models import F, OuterRef, Subquery
+
+
+def fill_order_item_prices(apps, schema_editor, batch_size=1000):
+    """Price order items created before unit_price/line_total were stored, from the current dish prices."""
+    Dish = apps.get_model("restaurant_app", "Dish")
+    OrderItem = apps.get_model("restaurant_app", "OrderItem")
+    missing = OrderItem.objects.filter(unit_price__isnull=True)
+    price = Subquery(Dish.objects.filter(pk=OuterRef("dish_id")).values("price")[:1])
+    last_id = 0
+    while True:
+        ids = list(
+            missing.filter(id__gt=last_id).order_by("id").values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        OrderItem.objects.filter(id__in=ids).update(unit_price=price)
+        OrderItem.objects.filter(id__in=ids).update(line_total=F("unit_price") * F("quantity"))
+        last_id = ids[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant_app', '0008_archived_orders'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_order_item_prices, migrations.RunPython.noop),
+    ]
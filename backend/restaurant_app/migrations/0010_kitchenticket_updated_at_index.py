@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant_app', '0009_backfill_order_item_prices'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='kitchenticket',
+            index=models.Index(fields=['station', 'updated_at', 'id'], name='restaurant__station_f88cf8_idx'),
+        ),
+    ]
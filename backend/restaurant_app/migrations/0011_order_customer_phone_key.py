@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:50
+
+from django.db import migrations, models
+
+from restaurant_app.utils import normalize_phone
+
+
+def fill_customer_phone_keys(apps, schema_editor, batch_size=1000):
+    Order = apps.get_model("restaurant_app", "Order")
+    last_id = 0
+    while True:
+        orders = list(
+            Order.objects.filter(id__gt=last_id)
+            .exclude(customer_phone_number="")
+            .order_by("id")
+            .only("id", "customer_phone_number")[:batch_size]
+        )
+        if not orders:
+            break
+        for order in orders:
+            order.customer_phone_key = normalize_phone(order.customer_phone_number)
+        Order.objects.bulk_update(orders, ["customer_phone_key"])
+        last_id = orders[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant_app', '0010_kitchenticket_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='order',
+            name='restaurant__custome_0e6171_idx',
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='customer_phone_key',
+            field=models.CharField(blank=True, editable=False, max_length=15),
+        ),
+        migrations.RunPython(fill_customer_phone_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer_phone_key', 'created_at'], name='restaurant__custome_0db234_idx'),
+        ),
+    ]
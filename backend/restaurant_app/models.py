@@ -1,13 +1,30 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import timedelta
-from django.db import models,transaction
+from decimal import Decimal
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Exists, F, OuterRef, Q, Value
+from django.db.models.functions import Coalesce, Greatest, Least
 from django.contrib.auth.models import AbstractUser
-from django.db.models.signals import post_save
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
 from django.utils import timezone
 from django.contrib.auth.hashers import make_password
 
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
 from transactions_app.models import MainGroup,Ledger
-from .utils import default_time_period
+from .authentication import user_cache_key
+from .tokens import revoked_tokens
+from .utils import (
+    default_time_period,
+    hash_passcode,
+    is_hashed_passcode,
+    is_hashed_password,
+    normalize_phone,
+)
 import logging
 
 logger = logging.getLogger(__name__)
@@ -25,14 +42,14 @@ class User(AbstractUser):
         ("other", "Other"),
     )
     role = models.CharField(max_length=10, choices=ROLES, blank=True, null=True)
-    passcode = models.CharField(max_length=6, unique=True)
+    passcode = models.CharField(max_length=64, unique=True)  # HMAC digest, see hash_passcode
     gender = models.CharField(max_length=10, choices=GENDERS, null=True, blank=True)
     mobile_number = models.CharField(max_length=15, blank=True)
 
     def __str__(self):
         return self.email
 
-    def save(self, *args, **kwargs):
+    def apply_role_flags(self):
         if self.role == "admin":
             self.is_staff = True
             self.is_superuser = True
@@ -43,9 +60,15 @@ class User(AbstractUser):
             self.is_staff = False
             self.is_superuser = False
 
-        if self.password and not self.password.startswith("pbkdf2_"):
+    def save(self, *args, **kwargs):
+        self.apply_role_flags()
+
+        if self.password and not is_hashed_password(self.password):
             self.password = make_password(self.password)
 
+        if self.passcode and not is_hashed_passcode(self.passcode):
+            self.passcode = hash_passcode(self.passcode)
+
         super().save(*args, **kwargs)
 
 class LogoInfo(models.Model):
@@ -62,6 +85,8 @@ class LogoInfo(models.Model):
 
 class Category(models.Model):
     name = models.CharField(max_length=200, unique=True)
+    # Kitchen station whose screen shows this category's dishes.
+    station = models.CharField(max_length=50, default="main")
 
     class Meta:
         verbose_name = "Category"
@@ -142,18 +167,32 @@ class Order(models.Model):
     customer_name = models.CharField(max_length=100, blank=True)
     address = models.TextField(blank=True)
     customer_phone_number = models.CharField(max_length=12, blank=True)
+    # normalize_phone(customer_phone_number), kept in sync by save(), so
+    # customer lookups are an index equality match whatever was typed.
+    customer_phone_key = models.CharField(max_length=15, blank=True, editable=False)
     delivery_charge = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     delivery_driver_id = models.IntegerField(null=True, blank=True)
     credit_user_id = models.IntegerField(null=True, blank=True)
     kitchen_note = models.TextField(blank=True)
+    table = models.ForeignKey(
+        "Table", related_name="orders", on_delete=models.SET_NULL, null=True, blank=True
+    )
+
+    # A dining order keeps its table until it is delivered or cancelled.
+    OPEN_STATUSES = ("pending", "approved")
 
     class Meta:
         ordering = ("-created_at",)
+        indexes = [models.Index(fields=["customer_phone_key", "created_at"])]
 
     def __str__(self):
         return f"{self.id} - {self.created_at} - {self.order_type}"
 
     def save(self, *args, **kwargs):
+        self.customer_phone_key = normalize_phone(self.customer_phone_number)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "customer_phone_number" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "customer_phone_key"}
         super().save(*args, **kwargs)
 
         if not self.invoice_number:
@@ -165,6 +204,61 @@ class Order(models.Model):
     def is_delivery_order(self):
         return self.order_type == "delivery"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Let the save receivers free the old table and spot deliveries.
+        instance._loaded_table_id = instance.__dict__.get("table_id")
+        instance._loaded_status = instance.__dict__.get("status")
+        return instance
+
+
+class Customer(models.Model):
+    """
+    One row per normalized phone number, shared by orders, credit users and
+    mess subscriptions. The order stats count delivered orders and are
+    kept up to date as orders are delivered (see record_customer_order).
+    """
+
+    phone = models.CharField(max_length=15, unique=True)
+    name = models.CharField(max_length=100, blank=True)
+    order_count = models.PositiveIntegerField(default=0)
+    total_spent = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    first_order_at = models.DateTimeField(null=True, blank=True)
+    last_order_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ("-last_order_at",)
+
+    def __str__(self):
+        return f"{self.name or 'Customer'} ({self.phone})"
+
+
+def add_customers(pairs):
+    """Make sure a Customer exists for each (phone, name), in one INSERT."""
+    customers = {}
+    for phone, name in pairs:
+        phone = normalize_phone(phone)
+        if phone:
+            customers.setdefault(phone, Customer(phone=phone, name=name or ""))
+    Customer.objects.bulk_create(customers.values(), ignore_conflicts=True)
+
+
+def record_customer_order(order):
+    """Add a delivered order to its customer's stats with one UPDATE (plus an INSERT the first time)."""
+    placed_at = Value(order.created_at)
+    stats = {
+        "order_count": F("order_count") + 1,
+        "total_spent": F("total_spent") + order.total_amount,
+        "first_order_at": Least(Coalesce("first_order_at", placed_at), placed_at),
+        "last_order_at": Greatest(Coalesce("last_order_at", placed_at), placed_at),
+    }
+    customers = Customer.objects.filter(phone=order.customer_phone_key)
+    if not customers.update(**stats):
+        add_customers([(order.customer_phone_key, order.customer_name)])
+        customers.update(**stats)
+
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="items")
@@ -172,10 +266,66 @@ class OrderItem(models.Model):
     quantity = models.PositiveIntegerField(default=1)
     is_newly_added = models.BooleanField(default=False)
     variants = models.JSONField(default=list)
+    # Dish price when the line was ordered, so totals and reports don't move
+    # when the menu price changes. Null only for rows not yet backfilled.
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    line_total = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
 
     def __str__(self):
         return f"{self.order.id} - {self.dish} - {self.quantity}"
 
+    def set_price(self, unit_price):
+        self.unit_price = unit_price
+        self.line_total = unit_price * self.quantity
+
+    def save(self, *args, **kwargs):
+        if self.unit_price is None:
+            self.unit_price = Dish.objects.values_list("price", flat=True).get(pk=self.dish_id)
+        self.set_price(self.unit_price)
+        super().save(*args, **kwargs)
+
+
+
+class KitchenTicket(models.Model):
+    """
+    What one kitchen station has to prepare for one batch of items added to
+    an order. Lines are copied in at creation, so kitchen screens read this
+    table alone.
+    """
+
+    STATUS_CHOICES = [
+        ("new", "New"),
+        ("preparing", "Preparing"),
+        ("ready", "Ready"),
+        ("completed", "Completed"),
+        ("cancelled", "Cancelled"),
+    ]
+
+    OPEN_STATUSES = ("new", "preparing", "ready")
+    # Where "bump" moves a ticket from each open status.
+    NEXT_STATUS = {"new": "preparing", "preparing": "ready", "ready": "completed"}
+
+    order = models.ForeignKey(Order, related_name="kitchen_tickets", on_delete=models.CASCADE)
+    station = models.CharField(max_length=50)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="new")
+    order_type = models.CharField(max_length=20)
+    table_name = models.CharField(max_length=50, blank=True)
+    note = models.TextField(blank=True)
+    # [{"dish": name, "quantity": n, "variants": [...]}, ...]
+    lines = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ("id",)
+        indexes = [
+            models.Index(fields=["station", "status", "id"]),
+            # The kitchen queue's (updated_at, id) cursor.
+            models.Index(fields=["station", "updated_at", "id"]),
+        ]
+
+    def __str__(self):
+        return f"Ticket #{self.id} ({self.station}) - Order #{self.order_id}"
 
 class Bill(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="bills")
@@ -203,6 +353,30 @@ class Bill(models.Model):
     #     super().save(*args, **kwargs)
 
 
+class ArchivedOrder(models.Model):
+    """
+    A closed order moved out of the live tables by archive_orders. payload
+    is the order as OrderSerializer returned it, plus its bills, so reports
+    can show it without the original rows.
+    """
+
+    order_id = models.PositiveIntegerField(unique=True)
+    created_at = models.DateTimeField(db_index=True)
+    order_type = models.CharField(max_length=20)
+    status = models.CharField(max_length=20)
+    payment_method = models.CharField(max_length=20)
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    customer_phone_number = models.CharField(max_length=12, blank=True)
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ("-created_at",)
+
+    def __str__(self):
+        return f"Archived order {self.order_id} - {self.created_at}"
+
+
 class Notification(models.Model):
     user = models.ForeignKey(
         User,
@@ -222,6 +396,18 @@ class Notification(models.Model):
         return f"{self.message[:50]}..."
 
 
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_auth_user(sender, instance, **kwargs):
+    cache.delete(user_cache_key(instance.pk))
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def remember_revoked_token(sender, instance, created, **kwargs):
+    if created:
+        revoked_tokens.add(instance.token.jti, instance.token.expires_at)
+
+
 @receiver(post_save, sender=Order)
 def create_notification_for_orders(sender, instance, created, **kwargs):
     if created:
@@ -230,6 +416,22 @@ def create_notification_for_orders(sender, instance, created, **kwargs):
         )
 
 
+@receiver(post_save, sender=Order)
+def update_customer_stats(sender, instance, **kwargs):
+    previous = getattr(instance, "_loaded_status", None)
+    instance._loaded_status = instance.status
+    if instance.status == "delivered" and previous != "delivered" and instance.customer_phone_key:
+        record_customer_order(instance)
+
+
+@receiver(post_save, sender=Order)
+def cancel_kitchen_tickets(sender, instance, created, **kwargs):
+    if not created and instance.status == "cancelled":
+        KitchenTicket.objects.filter(
+            order=instance, status__in=KitchenTicket.OPEN_STATUSES
+        ).update(status="cancelled", updated_at=timezone.now())
+
+
 @receiver(post_save, sender=Bill)
 def create_notification_for_bills(sender, instance, created, **kwargs):
     if created:
@@ -258,6 +460,171 @@ class Table(models.Model):
         return f"{self.table_name} - {self.floor.name}"
 
 
+
+FLOOR_PLAN_CACHE_KEY = "floor-plan"
+
+
+def _table_states(table_ids=None):
+    """
+    {table_id: (state, order_id, running_total)} for tables with open dining
+    orders, from one query. A table is "billing" once all its open orders
+    have a bill, otherwise "occupied". order_id is the latest open order.
+    """
+    orders = Order.objects.filter(
+        order_type="dining", status__in=Order.OPEN_STATUSES, table__isnull=False
+    )
+    if table_ids is not None:
+        orders = orders.filter(table_id__in=table_ids)
+    rows = (
+        orders.annotate(
+            billed=Q(bill_generated=True) | Exists(Bill.objects.filter(order=OuterRef("pk")))
+        )
+        .order_by("created_at", "id")
+        .values_list("table_id", "id", "total_amount", "billed")
+    )
+    states = {}
+    for table_id, order_id, total_amount, billed in rows:
+        state, _, running_total = states.get(table_id, ("billing", None, Decimal("0.00")))
+        states[table_id] = (
+            "billing" if billed and state == "billing" else "occupied",
+            order_id,
+            running_total + total_amount,
+        )
+    return states
+
+
+def _apply_table_state(entry, state):
+    entry["state"], entry["order_id"], entry["running_total"] = state or ("free", None, None)
+
+
+def floor_plan_snapshot():
+    """
+    The cached floor plan: {"floors": {id: name}, "tables": {id: entry}}.
+
+    Built with three queries on a miss. Order and bill events patch only
+    the tables they touch (refresh_floor_plan_tables), and table or floor
+    edits drop the snapshot so its layout is rebuilt on the next read.
+    """
+    snapshot = cache.get(FLOOR_PLAN_CACHE_KEY)
+    if snapshot is not None:
+        return snapshot
+
+    floors = dict(Floor.objects.order_by("name").values_list("id", "name"))
+    tables = {}
+    for table in Table.objects.order_by("table_name", "id").values(
+        "id", "table_name", "floor_id", "seats_count", "capacity", "is_ready"
+    ):
+        tables[table["id"]] = table
+    states = _table_states()
+    for table_id, entry in tables.items():
+        _apply_table_state(entry, states.get(table_id))
+
+    snapshot = {"floors": floors, "tables": tables}
+    cache.set(FLOOR_PLAN_CACHE_KEY, snapshot, settings.FLOOR_PLAN_CACHE_SECONDS)
+    return snapshot
+
+
+def refresh_floor_plan_tables(table_ids):
+    """Recompute the given tables in the cached snapshot, if there is one."""
+    table_ids = {table_id for table_id in table_ids if table_id}
+    snapshot = cache.get(FLOOR_PLAN_CACHE_KEY)
+    if not table_ids or snapshot is None:
+        return
+    states = _table_states(table_ids)
+    for table_id in table_ids:
+        entry = snapshot["tables"].get(table_id)
+        if entry is not None:
+            _apply_table_state(entry, states.get(table_id))
+    cache.set(FLOOR_PLAN_CACHE_KEY, snapshot, settings.FLOOR_PLAN_CACHE_SECONDS)
+
+
+@receiver(post_save, sender=Order)
+def update_floor_plan_for_order(sender, instance, **kwargs):
+    table_ids = {instance.table_id, getattr(instance, "_loaded_table_id", None)}
+    instance._loaded_table_id = instance.table_id
+    if any(table_ids):
+        transaction.on_commit(lambda: refresh_floor_plan_tables(table_ids))
+
+
+@receiver(post_delete, sender=Order)
+def update_floor_plan_on_order_delete(sender, instance, **kwargs):
+    if instance.table_id:
+        transaction.on_commit(lambda: refresh_floor_plan_tables({instance.table_id}))
+
+
+@receiver(post_save, sender=Bill)
+@receiver(post_delete, sender=Bill)
+def update_floor_plan_for_bill(sender, instance, **kwargs):
+    def refresh():
+        if cache.get(FLOOR_PLAN_CACHE_KEY) is not None:
+            refresh_floor_plan_tables(
+                Order.objects.filter(pk=instance.order_id).values_list("table_id", flat=True)
+            )
+
+    transaction.on_commit(refresh)
+
+
+@receiver(post_save, sender=Floor)
+@receiver(post_delete, sender=Floor)
+@receiver(post_save, sender=Table)
+@receiver(post_delete, sender=Table)
+def invalidate_floor_plan(sender, **kwargs):
+    cache.delete(FLOOR_PLAN_CACHE_KEY)
+
+
+
+class Reservation(models.Model):
+    STATUS_CHOICES = [
+        ("booked", "Booked"),
+        ("seated", "Seated"),
+        ("completed", "Completed"),
+        ("cancelled", "Cancelled"),
+    ]
+
+    # Reservations in these states hold their tables.
+    ACTIVE_STATUSES = ("booked", "seated")
+
+    customer_name = models.CharField(max_length=100)
+    customer_phone_number = models.CharField(max_length=12, blank=True)
+    party_size = models.PositiveIntegerField()
+    start_time = models.DateTimeField(db_index=True)
+    end_time = models.DateTimeField(db_index=True)
+    tables = models.ManyToManyField(Table, related_name="reservations")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="booked")
+    note = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ("start_time",)
+
+    def __str__(self):
+        return f"{self.customer_name} ({self.party_size}) - {self.start_time}"
+
+
+RESERVATION_INDEX_VERSION_KEY = "reservation-index-version"
+
+
+def reservation_index_version():
+    return cache.get_or_set(RESERVATION_INDEX_VERSION_KEY, 1, None)
+
+
+def bump_reservation_index_version():
+    try:
+        cache.incr(RESERVATION_INDEX_VERSION_KEY)
+    except ValueError:
+        cache.set(RESERVATION_INDEX_VERSION_KEY, 1, None)
+
+
+# Bookings and table layout feed the cached availability indexes.
+@receiver(post_save, sender=Reservation)
+@receiver(post_delete, sender=Reservation)
+@receiver(post_save, sender=Table)
+@receiver(post_delete, sender=Table)
+@receiver(m2m_changed, sender=Reservation.tables.through)
+def invalidate_reservation_index(sender, **kwargs):
+    bump_reservation_index_version()
+
+
 class Coupon(models.Model):
     code = models.CharField(max_length=50, unique=True)
     discount_amount = models.DecimalField(max_digits=10, decimal_places=2)
@@ -296,6 +663,25 @@ class Coupon(models.Model):
             return amount - self.discount_amount
         return amount
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets the save receiver drop the cache entry for a renamed code.
+        instance._loaded_code = instance.__dict__.get("code")
+        return instance
+
+
+def coupon_cache_key(code):
+    return f"coupon:{code}"
+
+
+@receiver(post_save, sender=Coupon)
+@receiver(post_delete, sender=Coupon)
+def invalidate_cached_coupon(sender, instance, **kwargs):
+    codes = {instance.code, getattr(instance, "_loaded_code", None)}
+    cache.delete_many([coupon_cache_key(code) for code in codes if code])
+    instance._loaded_code = instance.code
+
 
 class MessType(models.Model):
     MESS_TYPE_CHOICES = [
@@ -311,6 +697,56 @@ class MessType(models.Model):
         return self.get_name_display()
 
 
+# Menu ids whose sub_total is waiting for the end of a deferred_menu_sub_totals() block.
+_pending_menu_ids = ContextVar("pending_menu_ids", default=None)
+
+
+class MenuQuerySet(models.QuerySet):
+    def refresh_sub_totals(self):
+        """Recompute sub_total for every menu in the queryset with one UPDATE."""
+        totals = (
+            MenuItem.objects.filter(menu=models.OuterRef("pk"))
+            .values("menu")
+            .annotate(total=models.Sum("dish__price"))
+            .values("total")
+        )
+        return self.update(
+            sub_total=Coalesce(
+                models.Subquery(totals),
+                models.Value(Decimal("0.00")),
+                output_field=models.DecimalField(max_digits=6, decimal_places=2),
+            )
+        )
+
+
+@contextmanager
+def deferred_menu_sub_totals():
+    """
+    Collect the menus touched by MenuItem saves/deletes inside the block and
+    refresh their sub_total once, when the outermost block exits.
+    """
+    if _pending_menu_ids.get() is not None:
+        yield
+        return
+    pending = set()
+    token = _pending_menu_ids.set(pending)
+    try:
+        yield
+    finally:
+        _pending_menu_ids.reset(token)
+    if pending:
+        Menu.objects.filter(pk__in=pending).refresh_sub_totals()
+
+
+def schedule_menu_sub_totals(menu_ids):
+    menu_ids = {menu_id for menu_id in menu_ids if menu_id}
+    pending = _pending_menu_ids.get()
+    if pending is not None:
+        pending.update(menu_ids)
+    elif menu_ids:
+        Menu.objects.filter(pk__in=menu_ids).refresh_sub_totals()
+
+
 class Menu(models.Model):
     DAY_OF_WEEK_CHOICES = [
         ("monday", "Monday"),
@@ -341,14 +777,14 @@ class Menu(models.Model):
         max_length=255, default="admin", null=True, blank=True
     )  # UUID for users, 'admin' for shop-created menus
 
+    objects = MenuQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
     def calculate_sub_total(self):
-        menu_items = self.menu_items.all()
-        total = sum(item.dish.price for item in menu_items) if menu_items else 0
-        self.sub_total = total
-        self.save()
+        Menu.objects.filter(pk=self.pk).refresh_sub_totals()
+        self.refresh_from_db(fields=["sub_total"])
 
 
 class MenuItem(models.Model):
@@ -367,12 +803,34 @@ class MenuItem(models.Model):
     def __str__(self):
         return f"{self.dish.name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets the save receiver refresh the old menu when an item is moved.
+        instance._loaded_menu_id = instance.__dict__.get("menu_id")
+        return instance
+
 
-# Signal handler to update Menu's sub_total
+# Signal handlers to keep Menu.sub_total in step with its items and dish prices
 @receiver(post_save, sender=MenuItem)
 def update_menu_sub_total(sender, instance, **kwargs):
-    menu = instance.menu
-    menu.calculate_sub_total()
+    schedule_menu_sub_totals(
+        {instance.menu_id, getattr(instance, "_loaded_menu_id", None)}
+    )
+    instance._loaded_menu_id = instance.menu_id
+
+
+@receiver(post_delete, sender=MenuItem)
+def update_menu_sub_total_on_delete(sender, instance, **kwargs):
+    schedule_menu_sub_totals({instance.menu_id})
+
+
+@receiver(post_save, sender=Dish)
+def update_menu_sub_totals_for_dish(sender, instance, created, **kwargs):
+    if not created:
+        Menu.objects.filter(
+            pk__in=MenuItem.objects.filter(dish=instance).values("menu_id")
+        ).refresh_sub_totals()
 
 
 class Mess(models.Model):
@@ -406,17 +864,6 @@ class Mess(models.Model):
     grand_total = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     initial_transaction_created = models.BooleanField(default=False)
 
-    def calculate_total_amount(self, weeks):
-        # Assuming the subtotal is the total for one week
-        weekly_total = sum(menu.sub_total for menu in self.menus.all())
-        return weekly_total * weeks
-
-    # def save(self, *args, **kwargs):
-    #     # Auto-calculate total amount before saving
-    #     weeks = (self.end_date - self.start_date).days // 7
-    #     self.total_amount = self.calculate_total_amount(weeks)
-    #     super().save(*args, **kwargs)
-
 
 class MessTransaction(models.Model):
     STATUS_CHOICES = [
@@ -445,54 +892,37 @@ class MessTransaction(models.Model):
     def __str__(self):
         return f"Transaction on {self.date} - {self.status}"
 
-transaction_creation = False
+@receiver(post_save, sender=Mess)
+def add_mess_customer(sender, instance, created, **kwargs):
+    if created:
+        add_customers([(instance.mobile_number, instance.customer_name)])
+
+
+MESS_FORECAST_VERSION_KEY = "mess-forecast-version"
+
+
+def mess_forecast_version():
+    return cache.get_or_set(MESS_FORECAST_VERSION_KEY, 1, None)
+
+
+def bump_mess_forecast_version():
+    try:
+        cache.incr(MESS_FORECAST_VERSION_KEY)
+    except ValueError:
+        cache.set(MESS_FORECAST_VERSION_KEY, 1, None)
+
 
+# Any change to subscriptions or menus invalidates the cached daily forecasts.
 @receiver(post_save, sender=Mess)
-def create_initial_transaction(sender, instance, created, **kwargs):
-    global transaction_creation
-    if created and not instance.initial_transaction_created:
-        transaction_creation = True
-        status = 'completed' if instance.pending_amount == 0 else 'due'
-        
-        try:
-            with transaction.atomic():
-                # Create the initial Transaction entry
-                MessTransaction.objects.create(
-                    received_amount=instance.paid_amount,
-                    status=status,
-                    cash_amount=instance.cash_amount,
-                    bank_amount=instance.bank_amount,
-                    payment_method=instance.payment_method,
-                    mess=instance
-                )
-                # Set the flag to True
-                instance.initial_transaction_created = True
-                instance.save()
-        except Exception as e:
-            print(f"Error creating initial transaction: {e}")
-        finally:
-            transaction_creation = False
-
-
-@receiver(post_save, sender=MessTransaction)
-def update_mess_on_transaction_save(sender, instance, **kwargs):
-    if transaction_creation:
-        return  # Skip updating Mess if a transaction is being created
-
-    mess = instance.mess
-    if mess:
-        try:
-            with transaction.atomic():
-                # Update Mess fields based on the Transaction
-                mess.pending_amount -= instance.received_amount
-                mess.paid_amount += instance.received_amount
-                mess.cash_amount += instance.cash_amount
-                mess.bank_amount += instance.bank_amount
-                
-                # Ensure Mess is saved only if changes are actually made
-                mess.save()
-        except Exception as e:
-            print(f"Error updating mess on transaction save: {e}")
+@receiver(post_delete, sender=Mess)
+@receiver(post_save, sender=Menu)
+@receiver(post_delete, sender=Menu)
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+@receiver(m2m_changed, sender=Mess.menus.through)
+def invalidate_mess_forecast(sender, **kwargs):
+    bump_mess_forecast_version()
+
 
 class CreditUser(models.Model):
     username = models.CharField(max_length=100)
@@ -578,6 +1008,12 @@ class CreditTransaction(models.Model):
             self.credit_user.total_due -= self.received_amount
             self.credit_user.save()
 
+@receiver(post_save, sender=CreditUser)
+def add_credit_user_customer(sender, instance, created, **kwargs):
+    if created:
+        add_customers([(instance.mobile_number, instance.username)])
+
+
 @receiver(post_save, sender=CreditUser)
 def create_ledger_for_credit_user(sender, instance, created, **kwargs):
     if created:
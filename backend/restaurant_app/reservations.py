@@ -0,0 +1,135 @@
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from itertools import accumulate
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from restaurant_app.models import Reservation, Table, reservation_index_version
+
+RESERVATION_INDEX_CACHE_SECONDS = 60 * 60
+
+# Most tables a party is spread over when no single table is big enough.
+MAX_COMBINED_TABLES = 3
+
+TABLE_FIELDS = ("id", "table_name", "floor_id", "floor__name", "capacity", "start_time", "end_time")
+
+
+class TableIntervalIndex:
+    """
+    Booked intervals per table, sorted by start, for O(log n) free checks.
+
+    Besides the sorted start times each table keeps a running maximum of end
+    times, so one bisect finds the last booking that starts before a window
+    ends and one comparison tells whether anything up to it runs into the
+    window. Times are stored as POSIX timestamps.
+    """
+
+    def __init__(self, tables, bookings):
+        self.tables = {table["id"]: table for table in tables}
+        intervals = defaultdict(list)
+        for table_id, start, end in bookings:
+            intervals[table_id].append((start.timestamp(), end.timestamp()))
+        self._starts = {}
+        self._max_ends = {}
+        for table_id, spans in intervals.items():
+            spans.sort()
+            self._starts[table_id] = [start for start, _ in spans]
+            self._max_ends[table_id] = list(accumulate((end for _, end in spans), max))
+
+    def is_booked(self, table_id, start, end):
+        starts = self._starts.get(table_id)
+        if not starts:
+            return False
+        i = bisect_left(starts, end.timestamp())
+        return i > 0 and self._max_ends[table_id][i - 1] > start.timestamp()
+
+    def is_open(self, table_id, start, end):
+        """Whether [start, end) falls inside the table's start_time/end_time hours."""
+        table = self.tables[table_id]
+        if table["start_time"] == table["end_time"]:
+            return True
+        local_start = timezone.localtime(start)
+        opens = datetime.combine(local_start.date(), table["start_time"], local_start.tzinfo)
+        closes = datetime.combine(local_start.date(), table["end_time"], local_start.tzinfo)
+        if closes <= opens:
+            # Open past midnight.
+            if local_start < closes:
+                opens -= timedelta(days=1)
+            else:
+                closes += timedelta(days=1)
+        return opens <= start and end <= closes
+
+    def free_tables(self, start, end):
+        return [
+            table
+            for table_id, table in self.tables.items()
+            if self.is_open(table_id, start, end) and not self.is_booked(table_id, start, end)
+        ]
+
+    def options(self, start, end, party_size, max_tables=MAX_COMBINED_TABLES):
+        """
+        Ways to seat the party, best first: per floor, the smallest free table
+        that fits, or else the fewest free tables on that floor that together
+        do. Options with fewer tables and fewer empty seats come first.
+        """
+        by_floor = defaultdict(list)
+        for table in self.free_tables(start, end):
+            by_floor[table["floor_id"]].append(table)
+
+        options = []
+        for floor_tables in by_floor.values():
+            floor_tables.sort(key=lambda table: table["capacity"])
+            single = next((t for t in floor_tables if t["capacity"] >= party_size), None)
+            if single:
+                chosen = [single]
+            else:
+                chosen, seats = [], 0
+                for table in reversed(floor_tables[-max_tables:]):
+                    chosen.append(table)
+                    seats += table["capacity"]
+                    if seats >= party_size:
+                        break
+                else:
+                    continue
+            options.append(chosen)
+        options.sort(key=lambda tables: (len(tables), sum(t["capacity"] for t in tables)))
+        return options
+
+    def best(self, start, end, party_size):
+        options = self.options(start, end, party_size)
+        return options[0] if options else None
+
+
+def _bookings(start, end, exclude=None):
+    bookings = Reservation.tables.through.objects.filter(
+        reservation__status__in=Reservation.ACTIVE_STATUSES,
+        reservation__start_time__lt=end,
+        reservation__end_time__gt=start,
+    )
+    if exclude:
+        bookings = bookings.exclude(reservation_id=exclude)
+    return bookings.values_list("table_id", "reservation__start_time", "reservation__end_time")
+
+
+def build_index(start, end, exclude=None):
+    """An index of the bookings overlapping [start, end), read straight from the database."""
+    return TableIntervalIndex(
+        Table.objects.values(*TABLE_FIELDS), _bookings(start, end, exclude)
+    )
+
+
+def reservation_index_for(day):
+    """
+    Cached index of every table and the bookings that touch `day` or run
+    into the next one, so windows crossing midnight are covered. Rebuilt
+    with two queries when a reservation or table changes.
+    """
+    key = f"reservation-index:{reservation_index_version()}:{day.isoformat()}"
+    index = cache.get(key)
+    if index is None:
+        start = timezone.make_aware(datetime.combine(day, time.min))
+        index = build_index(start, start + timedelta(days=2))
+        cache.set(key, index, RESERVATION_INDEX_CACHE_SECONDS)
+    return index
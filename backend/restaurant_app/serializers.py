@@ -1,11 +1,25 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import F
 from rest_framework import serializers
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
 from rest_framework_simplejwt.settings import api_settings
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth.models import update_last_login
 from django.contrib.auth import get_user_model
 from delivery_drivers.models import DeliveryDriver
 from restaurant_app.models import *
+from restaurant_app.services import (
+    create_kitchen_tickets,
+    create_mess,
+    prorated_charge,
+    record_mess_payment,
+    update_mess_payment,
+)
+from restaurant_app.reservations import build_index
+from restaurant_app.tokens import FilteredRefreshToken, PasscodeRefreshToken
+from restaurant_app.utils import PASSCODE_LENGTH, hash_passcode
 
 
 
@@ -60,22 +74,28 @@ class LoginSerializer(TokenObtainPairSerializer):
         return data
 
 
+class FilteredTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = FilteredRefreshToken
+
+
 class PasscodeLoginSerializer(serializers.Serializer):
-    passcode = serializers.CharField(max_length=6, min_length=6)
+    passcode = serializers.CharField(max_length=PASSCODE_LENGTH, min_length=PASSCODE_LENGTH)
 
     def validate(self, attrs):
         passcode = attrs.get("passcode")
         User = get_user_model()
 
         try:
-            user = User.objects.get(passcode=passcode)
+            user = User.objects.select_related("driver_profile").get(
+                passcode=hash_passcode(passcode)
+            )
         except User.DoesNotExist:
             raise serializers.ValidationError("Invalid passcode")
 
         if not user.is_active:
             raise serializers.ValidationError("User account is disabled")
 
-        refresh = RefreshToken.for_user(user)
+        refresh = PasscodeRefreshToken.for_user(user)
         return {
             "user": UserSerializer(user).data,
             "refresh": str(refresh),
@@ -93,7 +113,7 @@ class LogoInfoSerializer(serializers.ModelSerializer):
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
-        fields = ["id", "name"]
+        fields = ["id", "name", "station"]
 
 
 class DishSerializer(serializers.ModelSerializer):
@@ -115,11 +135,12 @@ class DishVariantSerializer(serializers.ModelSerializer):
         fields = ['id', 'name','dish']
 
 class OrderItemSerializer(serializers.ModelSerializer):
-    dish = serializers.PrimaryKeyRelatedField(queryset=Dish.objects.all())
+    # Checked for all items at once in OrderSerializer.validate_items.
+    dish = serializers.IntegerField(source="dish_id")
 
     class Meta:
         model = OrderItem
-        fields = ["dish", "quantity","is_newly_added","variants"]
+        fields = ["id", "dish", "quantity","is_newly_added","variants"]
 
 
 class OrderSerializer(serializers.ModelSerializer):
@@ -151,56 +172,123 @@ class OrderSerializer(serializers.ModelSerializer):
             "delivery_driver",
             "credit_user_id",
             "delivery_order_status",
-            "kitchen_note"
+            "kitchen_note",
+            "table",
         ]
 
+    def validate_items(self, items):
+        dish_ids = {item["dish_id"] for item in items}
+        rows = Dish.objects.filter(id__in=dish_ids).values_list(
+            "id", "price", "name", "category__station"
+        )
+        self.dish_prices = {dish_id: price for dish_id, price, _, _ in rows}
+        self.dish_stations = {dish_id: (name, station) for dish_id, _, name, station in rows}
+        missing = dish_ids - set(self.dish_prices)
+        if missing:
+            raise serializers.ValidationError(
+                f"Dishes not found: {', '.join(map(str, sorted(missing)))}."
+            )
+        return items
+
+    def build_items(self, order, items_data, **fields):
+        """Unsaved OrderItems for the payload and what they add to the order total."""
+        items = [OrderItem(order=order, **{**item_data, **fields}) for item_data in items_data]
+        for item in items:
+            item.set_price(self.dish_prices[item.dish_id])
+        return items, sum((item.line_total for item in items), Decimal("0.00"))
+
     def create(self, validated_data):
         items_data = validated_data.pop("items")
         user = self.context["request"].user
         order = Order.objects.create(user=user, **validated_data)
-        total_amount = 0
-
-        for item_data in items_data:
-            order_item = OrderItem.objects.create(order=order, **item_data)
-            total_amount += order_item.quantity * order_item.dish.price
-        
-        # Add delivery charge to total amount if it's not the default value
-        if order.delivery_charge != 0:
-            total_amount += order.delivery_charge
+        items, total_amount = self.build_items(order, items_data)
+        OrderItem.objects.bulk_create(items)
+        create_kitchen_tickets(order, items, self.dish_stations)
 
-        order.total_amount = total_amount
+        order.total_amount = total_amount + Decimal(order.delivery_charge)
         order.save()
         return order
 
     def update(self, instance, validated_data):
-        
-        items_data = validated_data.pop("items", None)
+        """
+        Add items to a running order. Only the new lines are priced (one
+        query, during validation) and inserted in bulk; the total moves by
+        their amount plus any change in delivery charge in one UPDATE.
+        """
+        items_data = validated_data.pop("items", None) or []
+        # Derived from the items; not set directly.
+        validated_data.pop("total_amount", None)
+        previous_delivery_charge = instance.delivery_charge
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
-        # Start by resetting the total amount to 0
-        total_amount = 0
-
-        # Sum existing items' total amount
-        for existing_item in instance.items.all():
-            total_amount += existing_item.quantity * existing_item.dish.price
-
-        # Add new items' total amount
-        if items_data:
-            for item_data in items_data:
-                item_data['is_newly_added'] = True  # Marking as newly added
-                order_item = OrderItem.objects.create(order=instance, **item_data)
-                total_amount += order_item.quantity * order_item.dish.price
-        
-        # Add delivery charge to total amount if it's not the default value
-        if instance.delivery_charge != 0:
-            total_amount += instance.delivery_charge
 
-        # Update the total amount
-        instance.total_amount = total_amount
-        instance.save()
+        items, delta = self.build_items(instance, items_data, is_newly_added=True)
+        delta += Decimal(instance.delivery_charge) - Decimal(previous_delivery_charge)
+        with transaction.atomic():
+            OrderItem.objects.bulk_create(items)
+            if items:
+                create_kitchen_tickets(instance, items, self.dish_stations)
+            Order.objects.filter(pk=instance.pk).update(total_amount=F("total_amount") + delta)
+            # Read back before save() so the post_save receivers see a plain
+            # value, and leave the column out of the save so it isn't rewritten.
+            instance.refresh_from_db(fields=["total_amount"])
+            instance.save(
+                update_fields=[
+                    field.name
+                    for field in Order._meta.concrete_fields
+                    if not field.primary_key and field.name != "total_amount"
+                ]
+            )
         return instance
     
 
+class KitchenTicketSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = KitchenTicket
+        fields = [
+            "id",
+            "order",
+            "station",
+            "status",
+            "order_type",
+            "table_name",
+            "note",
+            "lines",
+            "created_at",
+        ]
+
+
+class CustomerSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Customer
+        fields = [
+            "id",
+            "phone",
+            "name",
+            "order_count",
+            "total_spent",
+            "first_order_at",
+            "last_order_at",
+        ]
+        read_only_fields = fields
+
+
+class CustomerOrderSerializer(serializers.ModelSerializer):
+    """One history row per order, without the nested items."""
+
+    class Meta:
+        model = Order
+        fields = [
+            "id",
+            "invoice_number",
+            "created_at",
+            "order_type",
+            "status",
+            "payment_method",
+            "total_amount",
+        ]
+
+
 class OrderStatusUpdateSerializer(serializers.Serializer):
     status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
     payment_method = serializers.ChoiceField(choices=Order.PAYMENT_METHOD_CHOICES, required=False)
@@ -311,7 +399,7 @@ class BillOrderItemSerializer(serializers.ModelSerializer):
         fields = ['dish_name', 'quantity', 'item_total']
 
     def get_item_total(self, obj):
-        return obj.dish.price * obj.quantity
+        return obj.line_total
     
 
 class BillOrderSerializer(serializers.ModelSerializer):
@@ -326,7 +414,7 @@ class BillOrderSerializer(serializers.ModelSerializer):
                   'delivery_charge', 'sub_total']
 
     def get_sub_total(self, obj):
-        return sum(item.dish.price * item.quantity for item in obj.items.all())
+        return sum(item.line_total for item in obj.items.all())
     
 
 class BillSerializer(serializers.ModelSerializer):
@@ -366,6 +454,106 @@ class TableSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
+class ReservationSerializer(serializers.ModelSerializer):
+    """
+    Leave out "tables" to have the best free table, or tables on one floor,
+    picked for the party. Given tables are checked for clashes instead.
+    """
+
+    tables = serializers.PrimaryKeyRelatedField(
+        queryset=Table.objects.all(), many=True, required=False
+    )
+
+    class Meta:
+        model = Reservation
+        fields = [
+            "id",
+            "customer_name",
+            "customer_phone_number",
+            "party_size",
+            "start_time",
+            "end_time",
+            "tables",
+            "status",
+            "note",
+            "created_at",
+        ]
+
+    def validate(self, data):
+        start = data.get("start_time", getattr(self.instance, "start_time", None))
+        end = data.get("end_time", getattr(self.instance, "end_time", None))
+        if start and end and end <= start:
+            raise serializers.ValidationError("end_time must be after start_time.")
+        if start and end and end - start > timedelta(days=1):
+            raise serializers.ValidationError("A reservation can't be longer than a day.")
+        if data.get("party_size") == 0:
+            raise serializers.ValidationError("party_size must be at least 1.")
+        return data
+
+    def _assign_tables(self, reservation, tables):
+        """
+        Pick or check tables against the bookings that overlap this one.
+
+        Runs inside the caller's transaction. The candidate tables are locked
+        first (every table when picking), and the bookings are read after
+        that, so a concurrent booking for the same tables waits and then
+        sees this one.
+        """
+        if reservation.status not in Reservation.ACTIVE_STATUSES:
+            return tables or []
+        locked = Table.objects.select_for_update()
+        if tables:
+            locked = locked.filter(pk__in=[table.pk for table in tables])
+        list(locked.values_list("pk", flat=True))
+        index = build_index(reservation.start_time, reservation.end_time, exclude=reservation.pk)
+        start, end = reservation.start_time, reservation.end_time
+        if not tables:
+            best = index.best(start, end, reservation.party_size)
+            if best is None:
+                raise serializers.ValidationError(
+                    {"tables": "No free tables for this party size and time."}
+                )
+            return [table["id"] for table in best]
+
+        busy = [
+            table.table_name
+            for table in tables
+            if not index.is_open(table.id, start, end) or index.is_booked(table.id, start, end)
+        ]
+        if busy:
+            raise serializers.ValidationError(
+                {"tables": f"Tables not free at this time: {', '.join(busy)}."}
+            )
+        if sum(table.capacity for table in tables) < reservation.party_size:
+            raise serializers.ValidationError({"tables": "The tables don't seat the whole party."})
+        return tables
+
+    def create(self, validated_data):
+        tables = validated_data.pop("tables", None)
+        with transaction.atomic():
+            reservation = Reservation(**validated_data)
+            tables = self._assign_tables(reservation, tables)
+            reservation.save()
+            reservation.tables.set(tables)
+        return reservation
+
+    def update(self, instance, validated_data):
+        tables = validated_data.pop("tables", None)
+        with transaction.atomic():
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+            if tables is None:
+                if instance.status not in Reservation.ACTIVE_STATUSES:
+                    # Cancelled or finished bookings keep their tables for the record.
+                    instance.save()
+                    return instance
+                tables = list(instance.tables.all())
+            tables = self._assign_tables(instance, tables)
+            instance.save()
+            instance.tables.set(tables)
+        return instance
+
+
 class CouponSerializer(serializers.ModelSerializer):
     class Meta:
         model = Coupon
@@ -419,6 +607,94 @@ class MenuSerializer(serializers.ModelSerializer):
         ]
 
 
+class WeeklyMenuSerializer(serializers.Serializer):
+    """
+    A whole week of menus for a mess type in one request:
+    {"mess_type": 1, "days": {"monday": {"breakfast": [dish ids], ...}, ...}}
+    """
+
+    mess_type = serializers.PrimaryKeyRelatedField(queryset=MessType.objects.all())
+    name = serializers.CharField(max_length=200, required=False)
+    is_custom = serializers.BooleanField(default=False)
+    created_by = serializers.CharField(max_length=255, default="admin")
+    days = serializers.DictField(
+        child=serializers.DictField(
+            child=serializers.ListField(child=serializers.IntegerField(), allow_empty=True)
+        ),
+        allow_empty=False,
+    )
+
+    def validate_days(self, days):
+        day_names = {day for day, _ in Menu.DAY_OF_WEEK_CHOICES}
+        meal_names = {meal for meal, _ in MenuItem.MEAL_TYPE_CHOICES}
+        errors = {}
+        for day, meals in days.items():
+            if day not in day_names:
+                errors[day] = "Not a day of the week."
+            elif set(meals) - meal_names:
+                errors[day] = f"Unknown meal types: {', '.join(sorted(set(meals) - meal_names))}."
+        if errors:
+            raise serializers.ValidationError(errors)
+
+        dish_ids = {dish_id for meals in days.values() for ids in meals.values() for dish_id in ids}
+        self.dish_prices = dict(
+            Dish.objects.filter(id__in=dish_ids).values_list("id", "price")
+        )
+        missing = dish_ids - set(self.dish_prices)
+        if missing:
+            raise serializers.ValidationError(
+                f"Dishes not found: {', '.join(map(str, sorted(missing)))}."
+            )
+        return days
+
+    def create(self, validated_data):
+        mess_type = validated_data["mess_type"]
+        name = validated_data.get("name") or mess_type.get_name_display()
+        days = validated_data["days"]
+        day_labels = dict(Menu.DAY_OF_WEEK_CHOICES)
+
+        menus = [
+            Menu(
+                name=f"{name} - {day_labels[day]}",
+                day_of_week=day,
+                mess_type=mess_type,
+                is_custom=validated_data["is_custom"],
+                created_by=validated_data["created_by"],
+                # bulk_create skips the MenuItem signals, so total here.
+                sub_total=sum(
+                    (self.dish_prices[dish_id] for ids in meals.values() for dish_id in ids),
+                    Decimal("0.00"),
+                ),
+            )
+            for day, meals in days.items()
+        ]
+        with transaction.atomic():
+            menus = Menu.objects.bulk_create(menus)
+            MenuItem.objects.bulk_create(
+                [
+                    MenuItem(menu=menu, dish_id=dish_id, meal_type=meal)
+                    for menu, meals in zip(menus, days.values())
+                    for meal, ids in meals.items()
+                    for dish_id in ids
+                ]
+            )
+        return menus
+
+    def to_representation(self, menus):
+        return {
+            "menus": [
+                {
+                    "id": menu.id,
+                    "name": menu.name,
+                    "day_of_week": menu.day_of_week,
+                    "sub_total": menu.sub_total,
+                }
+                for menu in menus
+            ],
+            "weekly_total": sum((menu.sub_total for menu in menus), Decimal("0.00")),
+        }
+
+
 class MessSerializer(serializers.ModelSerializer):
     mess_type = MessTypeSerializer(read_only=True)
     mess_type_id = serializers.PrimaryKeyRelatedField(
@@ -446,20 +722,12 @@ class MessSerializer(serializers.ModelSerializer):
             "grand_total"
         ]
 
-    def calculate_total_amount(self, menus, weeks):
+    def calculate_total_amount(self, menus, days):
         weekly_total = sum(menu.sub_total for menu in menus)
-        return weekly_total * weeks
+        return prorated_charge(weekly_total, days)
 
     def create(self, validated_data):
-        menus_data = validated_data.pop('menus', [])
-        mess = Mess.objects.create(**validated_data)
-        mess.menus.set(menus_data)
-
-        # Calculate total amount
-        weeks = (validated_data['end_date'] - validated_data['start_date']).days // 7
-        mess.total_amount = self.calculate_total_amount(mess.menus.all(), weeks)
-        mess.save()
-        return mess
+        return create_mess(validated_data)
 
     def update(self, instance, validated_data):
         menus_data = validated_data.pop('menus', [])
@@ -469,9 +737,9 @@ class MessSerializer(serializers.ModelSerializer):
         if menus_data:
             instance.menus.set(menus_data)
 
-        # Calculate total amount
-        weeks = (instance.end_date - instance.start_date).days // 7
-        instance.total_amount = self.calculate_total_amount(instance.menus.all(), weeks)
+        # Calculate total amount, partial weeks pro rata by day
+        days = (instance.end_date - instance.start_date).days
+        instance.total_amount = self.calculate_total_amount(instance.menus.all(), days)
         instance.save()
         return instance
     
@@ -505,6 +773,12 @@ class MessTransactionSerializer(serializers.ModelSerializer):
         model = MessTransaction
         fields = ['id', 'received_amount', 'status', 'cash_amount', 'bank_amount', 'payment_method', 'mess','date']
 
+    def create(self, validated_data):
+        return record_mess_payment(MessTransaction(**validated_data))
+
+    def update(self, instance, validated_data):
+        return update_mess_payment(instance, **validated_data)
+
 class CreditTransactionSerializer(serializers.ModelSerializer):
     credit_user_details = serializers.SerializerMethodField()
 
@@ -0,0 +1,576 @@
+from datetime import timedelta
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models import (
+    Case,
+    Count,
+    DecimalField,
+    Exists,
+    F,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from delivery_drivers.models import DeliveryDriver
+from restaurant_app.models import (
+    Bill,
+    Coupon,
+    KitchenTicket,
+    MenuItem,
+    Mess,
+    MessTransaction,
+    Order,
+    OrderItem,
+    User,
+    bump_mess_forecast_version,
+    coupon_cache_key,
+    mess_forecast_version,
+    refresh_floor_plan_tables,
+)
+from restaurant_app.utils import PASSCODE_LENGTH, hash_passcode, hash_passwords
+
+STAFF_IMPORT_FIELDS = (
+    "username",
+    "email",
+    "password",
+    "passcode",
+    "role",
+    "mobile_number",
+    "gender",
+    "first_name",
+    "last_name",
+)
+
+# Columns stored as given, checked against the model's max_length.
+STAFF_IMPORT_LENGTH_FIELDS = ("username", "email", "mobile_number", "first_name", "last_name")
+
+
+class StaffImportError(Exception):
+    def __init__(self, errors):
+        super().__init__("Invalid staff rows")
+        self.errors = errors
+
+
+def validate_staff_rows(rows):
+    """
+    Return {row_number: [messages]} for rows that can't be imported.
+
+    Formats and lengths are checked as the model and the passcode login
+    would. Usernames and passcodes are checked against the file and the
+    database with one query each.
+    """
+    roles = {role for role, _ in User.ROLES}
+    genders = {gender for gender, _ in User.GENDERS}
+    errors = {}
+
+    usernames = [row.get("username") for row in rows]
+    digests = [hash_passcode(row["passcode"]) if row.get("passcode") else None for row in rows]
+    taken_usernames = set(
+        User.objects.filter(username__in=[u for u in usernames if u]).values_list(
+            "username", flat=True
+        )
+    )
+    taken_digests = set(
+        User.objects.filter(passcode__in=[d for d in digests if d]).values_list(
+            "passcode", flat=True
+        )
+    )
+
+    seen_usernames, seen_digests = set(), set()
+    for number, (row, digest) in enumerate(zip(rows, digests), start=1):
+        messages = []
+        for field in ("username", "password", "passcode", "role"):
+            if not row.get(field):
+                messages.append(f"{field} is required")
+        for field in STAFF_IMPORT_LENGTH_FIELDS:
+            max_length = User._meta.get_field(field).max_length
+            if len(row.get(field) or "") > max_length:
+                messages.append(f"{field} must be at most {max_length} characters")
+        if row.get("username"):
+            try:
+                User.username_validator(row["username"])
+            except ValidationError as e:
+                messages.extend(e.messages)
+        if row.get("email"):
+            try:
+                validate_email(row["email"])
+            except ValidationError as e:
+                messages.extend(e.messages)
+        if row.get("passcode") and len(row["passcode"]) != PASSCODE_LENGTH:
+            messages.append(f"passcode must be {PASSCODE_LENGTH} characters")
+        if row.get("role") and row["role"] not in roles:
+            messages.append(f"role must be one of {', '.join(sorted(roles))}")
+        if row.get("gender") and row["gender"] not in genders:
+            messages.append(f"gender must be one of {', '.join(sorted(genders))}")
+        username = row.get("username")
+        if username and (username in taken_usernames or username in seen_usernames):
+            messages.append("username already exists")
+        if digest and (digest in taken_digests or digest in seen_digests):
+            messages.append("passcode already in use")
+        seen_usernames.add(username)
+        seen_digests.add(digest)
+        if messages:
+            errors[number] = messages
+    return errors
+
+
+def import_staff(rows, workers=None):
+    """
+    Create staff, admin and driver users in bulk.
+
+    Passwords are hashed in a process pool, then users and the DeliveryDriver
+    profiles for drivers are written with two bulk_create calls in one
+    transaction. Raises StaffImportError without writing anything if any
+    row is invalid.
+    """
+    rows = [
+        {field: str(row.get(field) or "").strip() for field in STAFF_IMPORT_FIELDS}
+        for row in rows
+    ]
+    errors = validate_staff_rows(rows)
+    if errors:
+        raise StaffImportError(errors)
+
+    passwords = hash_passwords([row["password"] for row in rows], workers=workers)
+    users = []
+    for row, password in zip(rows, passwords):
+        user = User(
+            username=row["username"],
+            email=row["email"],
+            password=password,
+            passcode=hash_passcode(row["passcode"]),
+            role=row["role"],
+            mobile_number=row["mobile_number"],
+            gender=row["gender"] or None,
+            first_name=row["first_name"],
+            last_name=row["last_name"],
+        )
+        # bulk_create skips User.save.
+        user.apply_role_flags()
+        users.append(user)
+
+    with transaction.atomic():
+        users = User.objects.bulk_create(users)
+        drivers = DeliveryDriver.objects.bulk_create(
+            [DeliveryDriver(user=user) for user in users if user.role == "driver"]
+        )
+    return users, drivers
+
+
+CENTS = Decimal("0.01")
+
+
+def prorated_charge(weekly_total, days):
+    """Charge for `days` days of a plan whose menus cost `weekly_total` a week."""
+    return (Decimal(weekly_total) * days / 7).quantize(CENTS, rounding=ROUND_HALF_UP)
+
+
+def bill_messes(billing_date, period_days=30, dry_run=False):
+    """
+    Renew every mess whose period ended in the period_days up to
+    billing_date. Messes that ended earlier are treated as lapsed.
+
+    Weekly menu totals for all due messes come from one aggregate query.
+    Each mess moves to a new period of period_days starting at its old
+    end_date and is charged pro rata by day. Its discount_amount is taken
+    off, and the balance is rolled into the new pending_amount: unpaid
+    amounts are added and an overpayment (negative pending) is credited. The
+    messes are written with one bulk_update and the matching "due"
+    MessTransaction rows with one bulk_create. A renewed mess ends after
+    billing_date, so running twice for the same date is a no-op.
+    """
+    messes = list(
+        Mess.objects.filter(
+            end_date__lte=billing_date,
+            end_date__gt=billing_date - timedelta(days=period_days),
+        )
+        .annotate(weekly_total=Coalesce(Sum("menus__sub_total"), Value(Decimal("0.00"))))
+        .order_by("id")
+    )
+
+    transactions = []
+    for mess in messes:
+        charge = prorated_charge(mess.weekly_total, period_days)
+        carried = mess.pending_amount
+
+        mess.start_date = mess.end_date
+        mess.end_date = mess.end_date + timedelta(days=period_days)
+        mess.total_amount = charge
+        mess.grand_total = max(charge - mess.discount_amount, Decimal("0.00")) + carried
+        mess.pending_amount = mess.grand_total
+        mess.paid_amount = Decimal("0.00")
+        mess.cash_amount = Decimal("0.00")
+        mess.bank_amount = Decimal("0.00")
+        transactions.append(
+            MessTransaction(
+                mess=mess,
+                received_amount=Decimal("0.00"),
+                status="due" if mess.pending_amount > 0 else "completed",
+                payment_method=mess.payment_method,
+            )
+        )
+
+    if not dry_run and messes:
+        with transaction.atomic():
+            Mess.objects.bulk_update(
+                messes,
+                [
+                    "start_date",
+                    "end_date",
+                    "total_amount",
+                    "grand_total",
+                    "pending_amount",
+                    "paid_amount",
+                    "cash_amount",
+                    "bank_amount",
+                ],
+                batch_size=500,
+            )
+            MessTransaction.objects.bulk_create(transactions, batch_size=500)
+        bump_mess_forecast_version()
+
+    return messes
+
+
+MESS_FORECAST_CACHE_SECONDS = 60 * 60
+
+
+def mess_forecast_for(day):
+    """
+    Dishes to prepare on `day` for mess customers, grouped by meal type.
+
+    One grouped query counts the active messes (start_date <= day <=
+    end_date) subscribed to each of that weekday's menu items. Results are
+    cached per day until a mess or menu changes.
+    """
+    key = f"mess-forecast:{mess_forecast_version()}:{day.isoformat()}"
+    forecast = cache.get(key)
+    if forecast is not None:
+        return forecast
+
+    day_of_week = day.strftime("%A").lower()
+    rows = (
+        MenuItem.objects.filter(
+            menu__day_of_week=day_of_week,
+            menu__messes__start_date__lte=day,
+            menu__messes__end_date__gte=day,
+        )
+        .values("meal_type", "dish_id", "dish__name")
+        .annotate(quantity=Count("menu__messes"))
+        .order_by("meal_type", "-quantity", "dish__name")
+    )
+    meals = {meal: [] for meal, _ in MenuItem.MEAL_TYPE_CHOICES}
+    for row in rows:
+        meals.setdefault(row["meal_type"] or "unspecified", []).append(
+            {
+                "dish_id": row["dish_id"],
+                "dish_name": row["dish__name"],
+                "quantity": row["quantity"],
+            }
+        )
+
+    forecast = {"date": day, "day_of_week": day_of_week, "meals": meals}
+    cache.set(key, forecast, MESS_FORECAST_CACHE_SECONDS)
+    return forecast
+
+
+def create_mess(validated_data):
+    """
+    Create a mess subscription and its opening transaction.
+
+    The total is worked out from the selected menus before the INSERT, so
+    the Mess row is written once.
+    """
+    menus = validated_data.pop("menus", [])
+    days = (validated_data["end_date"] - validated_data["start_date"]).days
+    validated_data["total_amount"] = prorated_charge(
+        sum((menu.sub_total for menu in menus), Decimal("0.00")), days
+    )
+
+    with transaction.atomic():
+        mess = Mess.objects.create(initial_transaction_created=True, **validated_data)
+        mess.menus.set(menus)
+        create_opening_transaction(mess)
+    return mess
+
+
+def create_opening_transaction(mess):
+    """Record what was paid when the subscription was taken. Does not touch the mess totals."""
+    return MessTransaction.objects.create(
+        received_amount=mess.paid_amount,
+        status="completed" if mess.pending_amount == 0 else "due",
+        cash_amount=mess.cash_amount,
+        bank_amount=mess.bank_amount,
+        payment_method=mess.payment_method,
+        mess=mess,
+    )
+
+
+def _apply_mess_payment(mess_id, received_amount, cash_amount, bank_amount):
+    Mess.objects.filter(pk=mess_id).update(
+        paid_amount=F("paid_amount") + received_amount,
+        pending_amount=F("pending_amount") - received_amount,
+        cash_amount=F("cash_amount") + cash_amount,
+        bank_amount=F("bank_amount") + bank_amount,
+    )
+
+
+def record_mess_payment(mess_transaction):
+    """Save a new MessTransaction and add it to its mess's running totals in one UPDATE."""
+    with transaction.atomic():
+        mess_transaction.save(force_insert=True)
+        if mess_transaction.mess_id:
+            _apply_mess_payment(
+                mess_transaction.mess_id,
+                mess_transaction.received_amount,
+                mess_transaction.cash_amount,
+                mess_transaction.bank_amount,
+            )
+    return mess_transaction
+
+
+def update_mess_payment(mess_transaction, **fields):
+    """Edit a MessTransaction, moving only the difference onto the mess totals."""
+    with transaction.atomic():
+        if mess_transaction.mess_id:
+            _apply_mess_payment(
+                mess_transaction.mess_id,
+                -Decimal(mess_transaction.received_amount),
+                -Decimal(mess_transaction.cash_amount),
+                -Decimal(mess_transaction.bank_amount),
+            )
+        for field, value in fields.items():
+            setattr(mess_transaction, field, value)
+        mess_transaction.save()
+        if mess_transaction.mess_id:
+            _apply_mess_payment(
+                mess_transaction.mess_id,
+                mess_transaction.received_amount,
+                mess_transaction.cash_amount,
+                mess_transaction.bank_amount,
+            )
+    return mess_transaction
+
+
+class OrderEditError(Exception):
+    pass
+
+
+def recompute_order_totals(order_ids):
+    """
+    Set total_amount to the item total plus delivery charge for the given
+    orders, with one UPDATE over an aggregate subquery.
+    """
+    item_totals = (
+        OrderItem.objects.filter(order=OuterRef("pk"))
+        .order_by()
+        .values("order")
+        .annotate(total=Sum("line_total"))
+        .values("total")
+    )
+    Order.objects.filter(pk__in=order_ids).update(
+        total_amount=Coalesce(
+            Subquery(item_totals, output_field=DecimalField(max_digits=10, decimal_places=2)),
+            Value(Decimal("0.00")),
+        )
+        + F("delivery_charge")
+    )
+
+
+def _check_editable(orders):
+    for order in orders:
+        if order.order_type != "dining":
+            raise OrderEditError(f"Order #{order.id} is not a dining order.")
+        if order.status not in Order.OPEN_STATUSES:
+            raise OrderEditError(f"Order #{order.id} is {order.status}.")
+        if order.bill_generated or order.has_bill:
+            raise OrderEditError(f"Order #{order.id} has already been billed.")
+
+
+def _locked_orders(order_ids):
+    orders = (
+        Order.objects.select_for_update()
+        .filter(pk__in=order_ids)
+        .annotate(has_bill=Exists(Bill.objects.filter(order=OuterRef("pk"))))
+    )
+    orders = {order.id: order for order in orders}
+    missing = set(order_ids) - set(orders)
+    if missing:
+        raise OrderEditError(f"Orders not found: {', '.join(map(str, sorted(missing)))}.")
+    _check_editable(orders.values())
+    return orders
+
+
+def _after_moving_items(orders):
+    recompute_order_totals([order.id for order in orders])
+    table_ids = {order.table_id for order in orders}
+    transaction.on_commit(lambda: refresh_floor_plan_tables(table_ids))
+
+
+def split_order(order_id, item_ids, table=None):
+    """
+    Move the given items of a dining order onto a new order for the same
+    customer, e.g. to bill part of a table separately. The items move with
+    one UPDATE and both totals are recomputed with one more.
+    """
+    item_ids = set(item_ids)
+    with transaction.atomic():
+        source = _locked_orders([order_id])[order_id]
+        owned = set(OrderItem.objects.filter(order=source).values_list("id", flat=True))
+        if not item_ids or item_ids - owned:
+            raise OrderEditError("Items must belong to the order being split.")
+        if item_ids == owned:
+            raise OrderEditError("Leave at least one item on the original order.")
+
+        new_order = Order.objects.create(
+            user_id=source.user_id,
+            total_amount=Decimal("0.00"),
+            order_type=source.order_type,
+            status=source.status,
+            table=table or source.table,
+            customer_name=source.customer_name,
+            customer_phone_number=source.customer_phone_number,
+            payment_method=source.payment_method,
+        )
+        OrderItem.objects.filter(pk__in=item_ids).update(order=new_order)
+        _after_moving_items([source, new_order])
+    return new_order
+
+
+def merge_orders(target_id, source_ids):
+    """
+    Move every item of the source orders onto the target, e.g. when two
+    tables are joined, in one UPDATE. Open kitchen tickets move with them.
+    The emptied orders are cancelled through save(), so the Order receivers
+    (kitchen tickets, customer stats, floor plan) run for them.
+    """
+    source_ids = set(source_ids) - {target_id}
+    if not source_ids:
+        raise OrderEditError("Give at least one other order to merge.")
+    with transaction.atomic():
+        orders = _locked_orders([target_id, *source_ids])
+        OrderItem.objects.filter(order_id__in=source_ids).update(order_id=target_id)
+        KitchenTicket.objects.filter(
+            order_id__in=source_ids, status__in=KitchenTicket.OPEN_STATUSES
+        ).update(order_id=target_id, updated_at=timezone.now())
+        for source_id in sorted(source_ids):
+            source = orders[source_id]
+            source.status = "cancelled"
+            source.save(update_fields=["status"])
+        _after_moving_items(orders.values())
+    return orders[target_id]
+
+
+def create_kitchen_tickets(order, items, dishes):
+    """
+    One KitchenTicket per station for a batch of new order items, written
+    with one bulk_create. `dishes` maps dish id to (name, station).
+    """
+    lines_by_station = {}
+    for item in items:
+        name, station = dishes[item.dish_id]
+        lines_by_station.setdefault(station, []).append(
+            {"dish": name, "quantity": item.quantity, "variants": item.variants}
+        )
+    table_name = order.table.table_name if order.table_id else ""
+    return KitchenTicket.objects.bulk_create(
+        [
+            KitchenTicket(
+                order=order,
+                station=station,
+                order_type=order.order_type,
+                table_name=table_name,
+                note=order.kitchen_note,
+                lines=lines,
+            )
+            for station, lines in lines_by_station.items()
+        ]
+    )
+
+
+def bump_kitchen_tickets(ticket_ids):
+    """Move each open ticket one step along new -> preparing -> ready -> completed, in one UPDATE."""
+    return KitchenTicket.objects.filter(
+        pk__in=ticket_ids, status__in=KitchenTicket.OPEN_STATUSES
+    ).update(
+        status=Case(
+            *[
+                When(status=current, then=Value(following))
+                for current, following in KitchenTicket.NEXT_STATUS.items()
+            ],
+            default=F("status"),
+        ),
+        updated_at=timezone.now(),
+    )
+
+
+def complete_kitchen_tickets(ticket_ids):
+    return KitchenTicket.objects.filter(
+        pk__in=ticket_ids, status__in=KitchenTicket.OPEN_STATUSES
+    ).update(status="completed", updated_at=timezone.now())
+
+
+COUPON_CACHE_SECONDS = 5 * 60
+
+
+class CouponError(Exception):
+    pass
+
+
+def cached_coupon(code):
+    """The coupon for `code`, from the cache when possible. Unknown codes are cached too."""
+    key = coupon_cache_key(code)
+    coupon = cache.get(key)
+    if coupon is None:
+        coupon = Coupon.objects.filter(code=code).first() or False
+        cache.set(key, coupon, COUPON_CACHE_SECONDS)
+    return coupon or None
+
+
+def check_coupon(code, amount):
+    """
+    Return the coupon for `code` if it can be used on a purchase of
+    `amount`, else raise CouponError. usage_count may lag here; the
+    redeeming UPDATE is what enforces usage_limit.
+    """
+    coupon = cached_coupon(code)
+    if coupon is None or not coupon.is_valid():
+        raise CouponError("Invalid or expired coupon code.")
+    if coupon.min_purchase_amount is not None and amount < coupon.min_purchase_amount:
+        raise CouponError(f"Minimum purchase for this coupon is {coupon.min_purchase_amount}.")
+    return coupon
+
+
+def discounted_amount(coupon, amount):
+    return max(coupon.apply_discount(amount), Decimal("0.00")).quantize(CENTS, rounding=ROUND_HALF_UP)
+
+
+def redeem_coupon(code, amount):
+    """
+    Use the coupon once on a purchase of `amount` and return (coupon,
+    discounted amount). The usage count goes up in one conditional UPDATE
+    that also rechecks the dates and the limit, so concurrent redemptions
+    can never exceed usage_limit.
+    """
+    coupon = check_coupon(code, amount)
+    now = timezone.now()
+    redeemed = (
+        Coupon.objects.filter(
+            pk=coupon.pk, is_active=True, start_date__lte=now, end_date__gte=now
+        )
+        .filter(Q(usage_limit__isnull=True) | Q(usage_count__lt=F("usage_limit")))
+        .update(usage_count=F("usage_count") + 1)
+    )
+    if not redeemed:
+        raise CouponError("This coupon has reached its usage limit.")
+    return coupon, discounted_amount(coupon, amount)
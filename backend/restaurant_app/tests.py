@@ -1,3 +1,1735 @@
-from django.test import TestCase
+import importlib
+import itertools
+import random
+import threading
+from io import StringIO
+from datetime import datetime, time, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Sum
+from django.contrib.auth.hashers import check_password, make_password
+from django.contrib import admin
+from django.test import (
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
+
+from restaurant_app.authentication import CachedJWTAuthentication
+from restaurant_app.models import *
+from restaurant_app.reservations import TableIntervalIndex
+from restaurant_app.serializers import ReservationSerializer
+from restaurant_app.services import bill_messes, validate_staff_rows
+from restaurant_app.tokens import FULL_SYNC_SECONDS, RevokedTokenFilter, revoked_tokens
+from transactions_app.models import MainGroup, NatureGroup
+
+_sequence = itertools.count(1)
+
+
+def unique(prefix):
+    return f"{prefix}-{next(_sequence)}"
+
+
+def unique_phone(length=10):
+    return str(next(_sequence)).zfill(length)
+
+
+class AdminAPITestCase(TestCase):
+    """An API client signed in as an admin, with caches cleared between tests."""
+
+    def setUp(self):
+        cache.clear()
+        revoked_tokens.reset()
+        self.user = User.objects.create(
+            username="budget-admin",
+            email="budget-admin@example.com",
+            role="admin",
+            passcode="999999",
+            password="budget-password",
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+class QueryBudgetTestCase(AdminAPITestCase):
+    """
+    Base class for query-count regression tests.
+
+    Each endpoint is exercised at 1, 10 and 100 rows and must stay within a
+    fixed query budget, so an N+1 in a nested serializer fails here instead
+    of in production.
+    """
+
+    sizes = (1, 10, 100)
+
+    def count_queries(self, method, url, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data, format="json")
+        self.assertLess(response.status_code, 300, response.content[:500])
+        return len(queries)
+
+    def count_queries_for(self, func):
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        return len(queries)
+
+    def assertEndpointQueries(
+        self,
+        url,
+        make,
+        list_max,
+        retrieve_max=None,
+        create_data=None,
+        create_max=None,
+    ):
+        """
+        `make(n)` creates n more rows and returns them. `create_data()`
+        returns a fresh payload for each POST.
+        """
+        rows = []
+        for size in self.sizes:
+            rows += make(size - len(rows))
+
+            with self.subTest(action="list", rows=size):
+                self.assertLessEqual(self.count_queries("get", url), list_max)
+
+            if retrieve_max is not None:
+                with self.subTest(action="retrieve", rows=size):
+                    self.assertLessEqual(
+                        self.count_queries("get", f"{url}{rows[0].pk}/"), retrieve_max
+                    )
+
+            if create_data is not None:
+                with self.subTest(action="create", rows=size):
+                    self.assertLessEqual(
+                        self.count_queries("post", url, create_data()), create_max
+                    )
+
+
+def make_categories(n):
+    return Category.objects.bulk_create(
+        [Category(name=unique("category")) for _ in range(n)]
+    )
+
+
+def make_dishes(n, category=None):
+    category = category or make_categories(1)[0]
+    return Dish.objects.bulk_create(
+        [
+            Dish(name=unique("dish"), price=Decimal("10.00"), category=category)
+            for _ in range(n)
+        ]
+    )
+
+
+def make_orders(n, user, **fields):
+    dishes = make_dishes(2)
+    orders = []
+    for _ in range(n):
+        order = Order.objects.create(user=user, total_amount=Decimal("30.00"), **fields)
+        OrderItem.objects.bulk_create(
+            [
+                OrderItem(
+                    order=order,
+                    dish=dish,
+                    quantity=quantity,
+                    unit_price=dish.price,
+                    line_total=dish.price * quantity,
+                )
+                for dish, quantity in ((dishes[0], 1), (dishes[1], 2))
+            ]
+        )
+        orders.append(order)
+    return orders
+
+
+def make_credit_users(n):
+    return CreditUser.objects.bulk_create(
+        [
+            CreditUser(
+                username=unique("credit"),
+                mobile_number=unique_phone(),
+                limit_amount=Decimal("100000.00"),
+            )
+            for _ in range(n)
+        ]
+    )
+
+
+def make_menus(n):
+    mess_type = MessType.objects.get_or_create(name="breakfast_lunch_dinner")[0]
+    dishes = make_dishes(2)
+    menus = Menu.objects.bulk_create(
+        [Menu(name=unique("menu"), day_of_week="monday", mess_type=mess_type) for _ in range(n)]
+    )
+    MenuItem.objects.bulk_create(
+        [
+            MenuItem(menu=menu, dish=dish, meal_type="lunch")
+            for menu in menus
+            for dish in dishes
+        ]
+    )
+    return menus
+
+
+def make_messes(n):
+    menus = make_menus(2)
+    today = timezone.localdate()
+    messes = Mess.objects.bulk_create(
+        [
+            Mess(
+                customer_name=unique("mess"),
+                mobile_number=unique_phone(),
+                start_date=today,
+                end_date=today + timedelta(days=28),
+                mess_type=menus[0].mess_type,
+            )
+            for _ in range(n)
+        ]
+    )
+    Mess.menus.through.objects.bulk_create(
+        [
+            Mess.menus.through(mess_id=mess.id, menu_id=menu.id)
+            for mess in messes
+            for menu in menus
+        ]
+    )
+    return messes
+
+
+class RestaurantQueryBudgetTests(QueryBudgetTestCase):
+    def test_login(self):
+        user = User.objects.create(
+            username="cashier", email="cashier@example.com", passcode="123123",
+            password="cashier-password",
+        )
+        for _ in self.sizes:
+            self.assertLessEqual(
+                self.count_queries(
+                    "post", "/api/login/",
+                    {"username": user.username, "password": "cashier-password"},
+                ),
+                5,
+            )
+
+    @override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+    def test_staff_import(self):
+        rows = [
+            {
+                "username": unique("staff"),
+                "email": "staff@example.com",
+                "password": "shift-password",
+                "passcode": unique_phone(6),
+                "role": "driver" if i % 2 else "staff",
+            }
+            for i in range(20)
+        ]
+        # Twenty rows, half of them drivers, in a fixed number of queries.
+        self.assertLessEqual(self.count_queries("post", "/api/staff/import/", {"users": rows}), 6)
+
+    def test_login_passcode(self):
+        User.objects.create(username="waiter", email="waiter@example.com", passcode="246810")
+        for _ in self.sizes:
+            self.assertLessEqual(
+                self.count_queries("post", "/api/login-passcode/", {"passcode": "246810"}),
+                1,
+            )
+
+    def test_token_refresh_and_logout(self):
+        refresh = self.client.post(
+            "/api/login-passcode/", {"passcode": "999999"}, format="json"
+        ).data["refresh"]
+        # The first refresh loads the revoked set and records the passcode token.
+        refresh = self.client.post(
+            "/api/token/refresh/", {"refresh": refresh}, format="json"
+        ).data["refresh"]
+        for _ in self.sizes:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(
+                    "/api/token/refresh/", {"refresh": refresh}, format="json"
+                )
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(queries), 7)
+            # The rotated-out token is rejected without another blacklist lookup.
+            with CaptureQueriesContext(connection) as queries:
+                self.client.post("/api/token/refresh/", {"refresh": refresh}, format="json")
+            self.assertEqual(len(queries), 0)
+            refresh = response.data["refresh"]
+
+        self.assertLessEqual(
+            self.count_queries("post", "/api/logout/", {"refresh_token": refresh}), 5
+        )
+
+    def test_cached_jwt_user(self):
+        make_dishes(3)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+        with CaptureQueriesContext(connection) as cold:
+            client.get("/api/dishes/")
+        with CaptureQueriesContext(connection) as warm:
+            self.assertEqual(client.get("/api/dishes/").status_code, 200)
+        self.assertEqual(len(warm), len(cold) - 1)
+
+    def test_dishes(self):
+        category = make_categories(1)[0]
+        self.assertEndpointQueries(
+            "/api/dishes/",
+            lambda n: make_dishes(n, category),
+            list_max=2,
+            retrieve_max=1,
+            create_data=lambda: {"name": unique("dish"), "price": "12.50", "category": category.id},
+            create_max=2,
+        )
+
+    def test_variants(self):
+        dish = make_dishes(1)[0]
+        self.assertEndpointQueries(
+            "/api/variants/",
+            lambda n: DishVariant.objects.bulk_create(
+                [DishVariant(dish=dish, name=unique("variant")) for _ in range(n)]
+            ),
+            list_max=2,
+            retrieve_max=1,
+            create_data=lambda: {"name": unique("variant"), "dish": dish.id},
+            create_max=2,
+        )
+
+    def test_categories(self):
+        self.assertEndpointQueries(
+            "/api/categories/",
+            make_categories,
+            list_max=2,
+            retrieve_max=1,
+            create_data=lambda: {"name": unique("category")},
+            create_max=2,
+        )
+
+    def test_orders(self):
+        dishes = make_dishes(2)
+        self.assertEndpointQueries(
+            "/api/orders/",
+            lambda n: make_orders(n, self.user),
+            list_max=3,
+            retrieve_max=2,
+            create_data=lambda: {
+                "total_amount": "0.00",
+                "order_type": "takeaway",
+                "items": [
+                    {"dish": dishes[0].id, "quantity": 1},
+                    {"dish": dishes[1].id, "quantity": 2},
+                ],
+            },
+            create_max=10,
+        )
+
+    def test_order_add_items(self):
+        (order,) = make_orders(1, self.user, order_type="dining")
+        dishes = make_dishes(3)
+        for size in self.sizes:
+            items = [{"dish": dishes[i % 3].id, "quantity": 2} for i in range(size)]
+            # Pricing and inserting the new lines doesn't depend on how many there are.
+            self.assertLessEqual(
+                self.count_queries("patch", f"/api/orders/{order.id}/", {"items": items}), 11
+            )
+
+    def test_kitchen_tickets(self):
+        (order,) = make_orders(1, self.user)
+        for size in self.sizes:
+            KitchenTicket.objects.bulk_create(
+                [KitchenTicket(order=order, station="bar", order_type="dining") for _ in range(size)]
+            )
+            self.assertLessEqual(
+                self.count_queries("get", "/api/kitchen-tickets/queue/?station=bar"), 1
+            )
+
+        # Bulk bump and complete are one UPDATE each.
+        ids = list(KitchenTicket.objects.values_list("id", flat=True))
+        self.assertEqual(self.count_queries("post", "/api/kitchen-tickets/bump/", {"ids": ids}), 1)
+        self.assertEqual(
+            self.count_queries("post", "/api/kitchen-tickets/complete/", {"ids": ids}), 1
+        )
+
+    def test_customers(self):
+        for size in self.sizes:
+            orders = make_orders(size, self.user, customer_phone_number="9876543210")
+            for order in orders:
+                order.status = "delivered"
+                order.save()
+            self.assertLessEqual(
+                self.count_queries("get", "/api/customers/9876543210/orders/"), 2
+            )
+
+    def test_split_and_merge_orders(self):
+        floor = Floor.objects.create(name="Ground")
+        table, other = Table.objects.bulk_create(
+            [
+                Table(table_name=unique("table"), seats_count=4, capacity=4, floor=floor)
+                for _ in range(2)
+            ]
+        )
+        dish = make_dishes(1)[0]
+        for size in self.sizes:
+            (order,) = make_orders(1, self.user, order_type="dining", table=table)
+            OrderItem.objects.bulk_create(
+                [
+                    OrderItem(
+                        order=order, dish=dish, quantity=1, unit_price=dish.price, line_total=dish.price
+                    )
+                    for _ in range(size)
+                ]
+            )
+            moving = list(order.items.filter(dish=dish).values_list("id", flat=True))
+            # Constant however many items move.
+            self.assertLessEqual(
+                self.count_queries(
+                    "post", f"/api/orders/{order.id}/split/", {"items": moving, "table": other.id}
+                ),
+                12,
+            )
+
+    def test_bills(self):
+        pending = make_orders(len(self.sizes), self.user)
+
+        def make_bills(n):
+            return Bill.objects.bulk_create(
+                [
+                    Bill(order=order, user=self.user, total_amount=order.total_amount)
+                    for order in make_orders(n, self.user)
+                ]
+            )
+
+        self.assertEndpointQueries(
+            "/api/bills/",
+            make_bills,
+            list_max=4,
+            retrieve_max=3,
+            create_data=lambda: {
+                "order_id": pending.pop().id,
+                "total_amount": "30.00",
+                "paid": True,
+            },
+            create_max=11,
+        )
+
+    def test_notifications(self):
+        self.assertEndpointQueries(
+            "/api/notifications/",
+            lambda n: Notification.objects.bulk_create(
+                [Notification(user=self.user, message=unique("message")) for _ in range(n)]
+            ),
+            list_max=2,
+            retrieve_max=1,
+            create_data=lambda: {"message": unique("message")},
+            create_max=1,
+        )
+
+    def test_floors(self):
+        self.assertEndpointQueries(
+            "/api/floors/",
+            lambda n: Floor.objects.bulk_create([Floor(name=unique("floor")) for _ in range(n)]),
+            list_max=1,
+            retrieve_max=1,
+            create_data=lambda: {"name": unique("floor")},
+            create_max=2,
+        )
+
+    def test_tables(self):
+        floor = Floor.objects.create(name="Ground")
+        self.assertEndpointQueries(
+            "/api/tables/",
+            lambda n: Table.objects.bulk_create(
+                [
+                    Table(table_name=unique("table"), seats_count=4, capacity=4, floor=floor)
+                    for _ in range(n)
+                ]
+            ),
+            list_max=2,
+            retrieve_max=1,
+            create_data=lambda: {
+                "table_name": unique("table"),
+                "seats_count": 4,
+                "capacity": 4,
+                "floor": floor.id,
+            },
+            create_max=2,
+        )
+
+    def test_floor_plan(self):
+        ground = Floor.objects.create(name="Ground")
+        first = Floor.objects.create(name="First")
+        for size in self.sizes:
+            Table.objects.bulk_create(
+                [
+                    Table(table_name=unique("table"), seats_count=4, capacity=4, floor=floor)
+                    for floor in (ground, first)
+                    for _ in range(size)
+                ]
+            )
+            cache.clear()
+            self.assertLessEqual(self.count_queries("get", "/api/floors/plan/"), 3)
+            self.assertEqual(self.count_queries("get", "/api/floors/plan/"), 0)
+
+    def test_reservation_availability(self):
+        floor = Floor.objects.create(name="Ground")
+        day = timezone.localdate() + timedelta(days=1)
+        start = timezone.make_aware(datetime.combine(day, time(20)))
+        params = {
+            "party_size": 2,
+            "start_time": start.isoformat(),
+            "end_time": (start + timedelta(hours=1)).isoformat(),
+        }
+        for size in self.sizes:
+            tables = Table.objects.bulk_create(
+                [
+                    Table(table_name=unique("table"), seats_count=2, capacity=2, floor=floor)
+                    for _ in range(size)
+                ]
+            )
+            for table in tables:
+                Reservation.objects.create(
+                    customer_name=unique("guest"),
+                    party_size=2,
+                    start_time=start - timedelta(hours=2),
+                    end_time=start - timedelta(hours=1),
+                ).tables.add(table)
+            self.assertLessEqual(
+                self.count_queries("get", "/api/reservations/availability/", params), 2
+            )
+            # Lookups after the first are served from the cached index.
+            self.assertEqual(
+                self.count_queries("get", "/api/reservations/availability/", params), 0
+            )
+
+    def test_coupons(self):
+        end_date = timezone.now() + timedelta(days=30)
+        self.assertEndpointQueries(
+            "/api/coupons/",
+            lambda n: Coupon.objects.bulk_create(
+                [
+                    Coupon(code=unique("code"), discount_amount=Decimal("5.00"), end_date=end_date)
+                    for _ in range(n)
+                ]
+            ),
+            list_max=1,
+            retrieve_max=1,
+            create_data=lambda: {
+                "code": unique("code"),
+                "discount_amount": "5.00",
+                "end_date": end_date.isoformat(),
+            },
+            create_max=2,
+        )
+
+    def test_coupon_redeem(self):
+        Coupon.objects.create(
+            code="SAVE10",
+            discount_amount=Decimal("5.00"),
+            end_date=timezone.now() + timedelta(days=1),
+            usage_limit=1000,
+        )
+        data = {"code": "SAVE10", "amount": "100.00"}
+        self.client.get("/api/coupons/check/", data)
+        for _ in self.sizes:
+            # The coupon is cached, so redeeming is a single conditional UPDATE.
+            self.assertEqual(self.count_queries("post", "/api/coupons/redeem/", data), 1)
+
+    def test_mess_types(self):
+        choices = [name for name, _ in MessType.MESS_TYPE_CHOICES]
+        self.assertEndpointQueries(
+            "/api/mess-types/",
+            lambda n: MessType.objects.bulk_create(
+                [MessType(name=unique("type")) for _ in range(n)]
+            ),
+            list_max=2,
+            retrieve_max=1,
+            create_data=lambda: {"name": choices.pop()},
+            create_max=2,
+        )
+
+    def test_menus(self):
+        mess_type = MessType.objects.create(name="lunch_dinner")
+        self.assertEndpointQueries(
+            "/api/menus/",
+            make_menus,
+            list_max=4,
+            retrieve_max=3,
+            create_data=lambda: {
+                "name": unique("menu"),
+                "day_of_week": "friday",
+                "mess_type": mess_type.id,
+            },
+            create_max=3,
+        )
+
+    def test_menu_items(self):
+        menu = make_menus(1)[0]
+        dish = make_dishes(1)[0]
+        self.assertEndpointQueries(
+            "/api/menu-items/",
+            lambda n: MenuItem.objects.bulk_create(
+                [MenuItem(menu=menu, dish=dish, meal_type="dinner") for _ in range(n)]
+            ),
+            list_max=2,
+            retrieve_max=1,
+            create_data=lambda: {"menu": menu.id, "dish_id": dish.id, "meal_type": "lunch"},
+            create_max=4,
+        )
+
+    def test_menu_sub_totals(self):
+        menus = Menu.objects.bulk_create([Menu(name=unique("menu")) for _ in range(3)])
+        cheap, dear = make_dishes(2)
+        Dish.objects.filter(pk=cheap.pk).update(price=Decimal("5.00"))
+        Dish.objects.filter(pk=dear.pk).update(price=Decimal("7.00"))
+
+        with CaptureQueriesContext(connection) as queries, deferred_menu_sub_totals():
+            for menu in menus:
+                MenuItem.objects.create(menu=menu, dish=cheap, meal_type="dinner")
+                MenuItem.objects.create(menu=menu, dish=dear, meal_type="dinner")
+        self.assertEqual(
+            sum("UPDATE" in query["sql"] for query in queries.captured_queries), 1
+        )
+        menus[0].refresh_from_db()
+        self.assertEqual(menus[0].sub_total, Decimal("12.00"))
+
+        # A price change is pushed to every menu using the dish in one UPDATE.
+        dear = Dish.objects.get(pk=dear.pk)
+        dear.price = Decimal("9.00")
+        self.assertLessEqual(self.count_queries_for(dear.save), 2)
+        self.assertEqual(
+            list(Menu.objects.filter(pk__in=[m.pk for m in menus]).values_list("sub_total", flat=True)),
+            [Decimal("14.00")] * 3,
+        )
+
+        # Moving an item refreshes both menus; deleting one refreshes its menu.
+        item = MenuItem.objects.filter(menu=menus[0], dish=dear).get()
+        item.menu = menus[1]
+        item.save()
+        menus[0].refresh_from_db()
+        menus[1].refresh_from_db()
+        self.assertEqual((menus[0].sub_total, menus[1].sub_total), (Decimal("5.00"), Decimal("23.00")))
+        item.delete()
+        menus[1].refresh_from_db()
+        self.assertEqual(menus[1].sub_total, Decimal("14.00"))
+
+    def test_build_week(self):
+        mess_type = MessType.objects.create(name="breakfast_lunch_dinner")
+        for size in self.sizes:
+            dishes = make_dishes(min(size, 5))
+            days = {
+                day: {meal: [dish.id for dish in dishes] for meal, _ in MenuItem.MEAL_TYPE_CHOICES}
+                for day, _ in Menu.DAY_OF_WEEK_CHOICES
+            }
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(
+                    "/api/menus/build_week/",
+                    {"mess_type": mess_type.id, "days": days},
+                    format="json",
+                )
+            self.assertEqual(response.status_code, 201, response.content)
+            self.assertLessEqual(len(queries), 6)
+
+        menus = response.data["menus"]
+        self.assertEqual(len(menus), 7)
+        self.assertEqual(MenuItem.objects.filter(menu_id=menus[0]["id"]).count(), 15)
+        Menu.objects.filter(pk=menus[0]["id"]).refresh_sub_totals()
+        self.assertEqual(Menu.objects.get(pk=menus[0]["id"]).sub_total, menus[0]["sub_total"])
+
+        response = self.client.post(
+            "/api/menus/build_week/",
+            {"mess_type": mess_type.id, "days": {"monday": {"lunch": [0]}}},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_bill_messes(self):
+        billing_date = timezone.localdate() + timedelta(days=28)
+        for size in self.sizes:
+            messes = make_messes(size)
+            Menu.objects.refresh_sub_totals()
+            Mess.objects.filter(pk__in=[m.pk for m in messes]).update(
+                pending_amount=Decimal("10.00"), discount_amount=Decimal("5.00")
+            )
+            self.assertLessEqual(
+                self.count_queries_for(lambda: bill_messes(billing_date, period_days=10)), 6
+            )
+
+        mess = Mess.objects.annotate(weekly=Sum("menus__sub_total")).get(pk=messes[0].pk)
+        charge = (mess.weekly * 10 / 7).quantize(Decimal("0.01"))
+        self.assertEqual(mess.start_date, billing_date)
+        self.assertEqual(mess.end_date, billing_date + timedelta(days=10))
+        self.assertEqual(mess.total_amount, charge)
+        self.assertEqual(mess.pending_amount, charge - 5 + 10)
+        self.assertEqual(mess.transactions.filter(status="due").count(), 1)
+
+        # Already renewed messes are not billed twice.
+        self.assertEqual(bill_messes(billing_date, period_days=10), [])
+
+    def test_mess_forecast(self):
+        day = timezone.localdate() + timedelta(days=1)
+        for size in self.sizes:
+            messes = make_messes(size)
+            Menu.objects.filter(messes__in=messes).update(day_of_week=day.strftime("%A").lower())
+            url = f"/api/messes/forecast/?from_date={day}&to_date={day + timedelta(days=6)}"
+            self.assertLessEqual(self.count_queries("get", url), 7)
+            # Cached per day until a mess or menu changes.
+            self.assertEqual(self.count_queries("get", url), 0)
+
+        Mess.objects.filter(pk=messes[0].pk).update(end_date=day - timedelta(days=1))
+        messes[1].save()
+        response = self.client.get(f"/api/messes/forecast/?from_date={day}")
+        # Every mess gets two lunch menus of two dishes each.
+        lunch = response.data[0]["meals"]["lunch"]
+        self.assertEqual(sum(row["quantity"] for row in lunch), 4 * (sum(self.sizes) - 1))
+
+    def test_messes(self):
+        menus = make_menus(2)
+        today = timezone.localdate()
+        self.assertEndpointQueries(
+            "/api/messes/",
+            make_messes,
+            list_max=3,
+            retrieve_max=2,
+            create_data=lambda: {
+                "customer_name": unique("mess"),
+                "mobile_number": unique_phone(),
+                "start_date": today.isoformat(),
+                "end_date": (today + timedelta(days=14)).isoformat(),
+                "mess_type_id": menus[0].mess_type_id,
+                "paid_amount": "0.00",
+                "menus": [menu.id for menu in menus],
+            },
+            create_max=14,
+        )
+
+    def test_mess_transactions(self):
+        mess = make_messes(1)[0]
+        self.assertEndpointQueries(
+            "/api/mess-transactions/",
+            lambda n: MessTransaction.objects.bulk_create(
+                [
+                    MessTransaction(received_amount=Decimal("10.00"), status="due", mess=mess)
+                    for _ in range(n)
+                ]
+            ),
+            list_max=2,
+            retrieve_max=1,
+            create_data=lambda: {
+                "received_amount": "10.00",
+                "status": "completed",
+                "cash_amount": "10.00",
+                "bank_amount": "0.00",
+                "mess": mess.id,
+            },
+            create_max=5,
+        )
+
+    def test_mess_report(self):
+        for size in self.sizes:
+            make_messes(size)
+            self.assertLessEqual(
+                self.count_queries("get", "/api/messes/mess_report/?mess_type=breakfast_lunch_dinner"), 2
+            )
+            self.assertLessEqual(
+                self.count_queries("get", "/api/messes/mess_report_summary/?credit="), 2
+            )
+
+    def test_credit_users(self):
+        MainGroup.objects.create(
+            name="Sundry Debtors", nature_group=NatureGroup.objects.create(name="Assets")
+        )
+        self.assertEndpointQueries(
+            "/api/credit-users/",
+            make_credit_users,
+            list_max=3,
+            retrieve_max=2,
+            create_data=lambda: {
+                "username": unique("credit"),
+                "mobile_number": unique_phone(),
+                "limit_amount": "1000.00",
+            },
+            create_max=6,
+        )
+
+    def test_credit_orders(self):
+        # Credit orders are created by the order status update, not by POST.
+        credit_user = make_credit_users(1)[0]
+        self.assertEndpointQueries(
+            "/api/credit-orders/",
+            lambda n: CreditOrder.objects.bulk_create(
+                [
+                    CreditOrder(order=order, credit_user=credit_user)
+                    for order in make_orders(n, self.user)
+                ]
+            ),
+            list_max=2,
+            retrieve_max=1,
+        )
+
+    def test_credit_transactions(self):
+        credit_user = make_credit_users(1)[0]
+        self.assertEndpointQueries(
+            "/api/credit-transactions/",
+            lambda n: CreditTransaction.objects.bulk_create(
+                [
+                    CreditTransaction(
+                        received_amount=Decimal("5.00"), status="due", credit_user=credit_user
+                    )
+                    for _ in range(n)
+                ]
+            ),
+            list_max=4,
+            retrieve_max=3,
+            create_data=lambda: {"received_amount": "5.00", "credit_user": credit_user.id},
+            create_max=6,
+        )
+
+    def test_logo_info(self):
+        self.assertEndpointQueries(
+            "/api/logo-info/",
+            lambda n: LogoInfo.objects.bulk_create(
+                [
+                    LogoInfo(
+                        company_name=unique("company"),
+                        phone_number="000",
+                        location="City",
+                        office_number="000",
+                        main_logo="company_logos/main.png",
+                        print_logo="company_logos/print.png",
+                    )
+                    for _ in range(n)
+                ]
+            ),
+            list_max=2,
+            retrieve_max=1,
+        )
+
+
+
+class RevokedTokenFilterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(
+            username="revoker", email="revoker@example.com", passcode="424242"
+        )
+        self.filter = RevokedTokenFilter()
+        self.filter.sync()
+
+    def blacklist(self, row_id, age=timedelta()):
+        """A row another worker wrote `age` ago, committed only now."""
+        token = OutstandingToken.objects.create(
+            user=self.user,
+            jti=unique("jti"),
+            token="token",
+            expires_at=timezone.now() + timedelta(days=1),
+        )
+        # bulk_create skips the receiver that would add it to this process's set.
+        BlacklistedToken.objects.bulk_create([BlacklistedToken(id=row_id, token=token)])
+        BlacklistedToken.objects.filter(pk=row_id).update(blacklisted_at=timezone.now() - age)
+        return token.jti
+
+    def test_row_committed_after_a_higher_id_is_seen(self):
+        newer = self.blacklist(1000)
+        self.filter.sync()
+        late = self.blacklist(999, age=timedelta(seconds=30))
+        self.filter.sync()
+        self.assertIn(newer, self.filter._expires)
+        self.assertIn(late, self.filter._expires)
+
+    def test_full_sync_catches_older_late_commits(self):
+        jti = self.blacklist(1000, age=timedelta(days=1))
+        self.filter.sync()
+        self.assertNotIn(jti, self.filter._expires)
+        self.filter._full_synced_at -= FULL_SYNC_SECONDS
+        self.filter.sync()
+        self.assertIn(jti, self.filter._expires)
+
+
+
+class CachedJWTUserTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(
+            username="cached", email="cached@example.com", passcode="515151", password="pw"
+        )
+        self.token = AccessToken.for_user(self.user)
+
+    def get_user(self):
+        return CachedJWTAuthentication().get_user(self.token)
+
+    def test_only_credentials_are_deferred(self):
+        self.get_user()
+        with self.assertNumQueries(0):
+            user = self.get_user()
+            (user.first_name, user.mobile_number, user.last_login, user.date_joined)
+        self.assertEqual(user.get_deferred_fields(), {"password", "passcode"})
+
+    def test_save_drops_the_cached_user(self):
+        self.get_user()
+        self.user.mobile_number = "5550001"
+        self.user.save()
+        self.assertEqual(self.get_user().mobile_number, "5550001")
+
+    def test_delete_drops_the_cached_user(self):
+        self.get_user()
+        self.user.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.get_user()
+
+    def test_deactivated_user_is_rejected(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.token}")
+        self.assertEqual(client.get("/api/dishes/").status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(client.get("/api/dishes/").status_code, 401)
+
+
+class TokenRefreshTests(AdminAPITestCase):
+    def refresh(self, token):
+        return self.client.post("/api/token/refresh/", {"refresh": token}, format="json")
+
+    def test_rotated_and_logged_out_tokens_are_rejected(self):
+        first = self.client.post(
+            "/api/login-passcode/", {"passcode": "999999"}, format="json"
+        ).data["refresh"]
+        response = self.refresh(first)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.refresh(first).status_code, 401)
+
+        second = response.data["refresh"]
+        self.client.post("/api/logout/", {"refresh_token": second}, format="json")
+        self.assertEqual(self.refresh(second).status_code, 401)
+
+
+
+class StaffImportTests(AdminAPITestCase):
+    @override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+    def test_import(self):
+        rows = [
+            {
+                "username": unique("staff"),
+                "email": "staff@example.com",
+                "password": "shift-password",
+                "passcode": unique_phone(6),
+                "role": "driver" if i % 2 else "staff",
+            }
+            for i in range(4)
+        ]
+        response = self.client.post("/api/staff/import/", {"users": rows}, format="json")
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.data, {"created": 4, "drivers": 2})
+
+        driver = User.objects.select_related("driver_profile").get(username=rows[1]["username"])
+        self.assertTrue(check_password("shift-password", driver.password))
+        self.assertFalse(driver.is_staff)
+        self.assertIsNotNone(driver.driver_profile)
+
+        # Duplicates are reported per row and nothing is written.
+        response = self.client.post("/api/staff/import/", {"users": rows[:2]}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data["rows"]), {1, 2})
+
+    def test_save_keeps_hashes_from_other_hashers(self):
+        digest = make_password("secret", hasher="scrypt")
+        user = User.objects.create(
+            username="scrypt-user", email="scrypt@example.com", passcode="135790", password=digest
+        )
+        self.assertEqual(user.password, digest)
+
+
+class StaffImportValidationTests(TestCase):
+    def row(self, **fields):
+        return {
+            "username": unique("staff"),
+            "email": "staff@example.com",
+            "password": "shift-password",
+            "passcode": unique_phone(6),
+            "role": "staff",
+            **fields,
+        }
+
+    def test_valid_row(self):
+        self.assertEqual(validate_staff_rows([self.row()]), {})
+
+    def test_passcode_must_be_usable_for_login(self):
+        errors = validate_staff_rows([self.row(passcode="123"), self.row(passcode="1234567")])
+        self.assertEqual(
+            errors, {1: ["passcode must be 6 characters"], 2: ["passcode must be 6 characters"]}
+        )
+
+    def test_formats_and_lengths_are_reported_per_row(self):
+        errors = validate_staff_rows(
+            [
+                self.row(),
+                self.row(username="x" * 151),
+                self.row(username="has space"),
+                self.row(email="not-an-email"),
+                self.row(mobile_number="1" * 16),
+            ]
+        )
+        self.assertEqual(sorted(errors), [2, 3, 4, 5])
+        self.assertIn("username must be at most 150 characters", errors[2])
+        self.assertIn("mobile_number must be at most 15 characters", errors[5])
+
+
+class MessBillingTests(AdminAPITestCase):
+    def test_overpayment_is_credited_on_renewal(self):
+        (mess,) = make_messes(1)
+        Menu.objects.refresh_sub_totals()
+        Mess.objects.filter(pk=mess.pk).update(pending_amount=Decimal("-15.00"))
+        billing_date = timezone.localdate() + timedelta(days=28)
+        (billed,) = bill_messes(billing_date, period_days=10)
+        mess.refresh_from_db()
+        self.assertEqual(mess.pending_amount, billed.total_amount - Decimal("15.00"))
+
+    def test_command_rejects_impossible_dates(self):
+        with self.assertRaises(CommandError):
+            call_command("bill_messes", date="2024-02-30", stdout=StringIO())
+
+
+class MessPaymentTests(AdminAPITestCase):
+    def test_edit_moves_only_the_difference(self):
+        mess = make_messes(1)[0]
+        Mess.objects.filter(pk=mess.pk).update(pending_amount=Decimal("100.00"))
+        response = self.client.post(
+            "/api/mess-transactions/",
+            {"received_amount": "40.00", "status": "due", "cash_amount": "40.00", "mess": mess.id},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.client.patch(
+            f"/api/mess-transactions/{response.data['id']}/",
+            {"received_amount": "60.00", "cash_amount": "20.00", "bank_amount": "40.00"},
+            format="json",
+        )
+        mess.refresh_from_db()
+        self.assertEqual(
+            (mess.paid_amount, mess.pending_amount, mess.cash_amount, mess.bank_amount),
+            (Decimal("60.00"), Decimal("40.00"), Decimal("20.00"), Decimal("40.00")),
+        )
+
+    def test_bank_amount_defaults_to_zero(self):
+        mess = make_messes(1)[0]
+        Mess.objects.filter(pk=mess.pk).update(pending_amount=Decimal("100.00"))
+        response = self.client.post(
+            "/api/mess-transactions/",
+            {"received_amount": "25.00", "status": "due", "cash_amount": "25.00", "mess": mess.id},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Decimal(response.data["bank_amount"]), Decimal("0.00"))
+        mess.refresh_from_db()
+        self.assertEqual(
+            (mess.paid_amount, mess.pending_amount, mess.cash_amount, mess.bank_amount),
+            (Decimal("25.00"), Decimal("75.00"), Decimal("25.00"), Decimal("0.00")),
+        )
+
+
+
+class MessForecastTests(AdminAPITestCase):
+    def test_bad_dates(self):
+        for params in ({"from_date": "tomorrow"}, {"from_date": "2024-02-30"}):
+            response = self.client.get("/api/messes/forecast/", params)
+            self.assertEqual(response.status_code, 400, params)
+
+
+class MessReportTests(AdminAPITestCase):
+    def test_summary_by_payment_method(self):
+        make_messes(5)
+        Mess.objects.update(total_amount=Decimal("100.00"), pending_amount=Decimal("30.00"))
+        Mess.objects.filter(pk=Mess.objects.first().pk).update(payment_method="bank")
+        response = self.client.get("/api/messes/mess_report_summary/?mess_type=breakfast_lunch_dinner")
+        self.assertEqual(response.data["overall"]["count"], 5)
+        self.assertEqual(response.data["overall"]["total_amount"], Decimal("500.00"))
+        self.assertEqual(
+            {(row["payment_method"], row["count"]) for row in response.data["rows"]},
+            {("bank", 1), ("cash", 4)},
+        )
+
+    def test_unknown_mess_type(self):
+        response = self.client.get("/api/messes/mess_report/?mess_type=nope")
+        self.assertEqual(response.status_code, 400)
+
+
+class FloorPlanTests(AdminAPITestCase):
+    def test_table_states(self):
+        ground = Floor.objects.create(name="Ground")
+        table, other = Table.objects.bulk_create(
+            [
+                Table(table_name=unique("table"), seats_count=4, capacity=4, floor=ground)
+                for _ in range(2)
+            ]
+        )
+
+        def states():
+            plan = self.client.get("/api/floors/plan/").data
+            tables = {t["id"]: t for floor in plan for t in floor["tables"]}
+            return [
+                (tables[t.id]["state"], tables[t.id]["order_id"], tables[t.id]["running_total"])
+                for t in (table, other)
+            ]
+
+        self.assertEqual(states(), [("free", None, None), ("free", None, None)])
+        with self.captureOnCommitCallbacks(execute=True):
+            order, second = make_orders(2, self.user, order_type="dining", table=table)
+        self.assertEqual(states()[0], ("occupied", second.id, Decimal("60.00")))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for o in (order, second):
+                Bill.objects.create(order=o, user=self.user, total_amount=o.total_amount)
+        self.assertEqual(states()[0], ("billing", second.id, Decimal("60.00")))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.table = other
+            second.save()
+        self.assertEqual(
+            states(),
+            [("billing", order.id, Decimal("30.00")), ("billing", second.id, Decimal("30.00"))],
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.get(pk=order.pk)
+            order.status = "delivered"
+            order.save()
+        self.assertEqual(states()[0], ("free", None, None))
+
+    def test_layout_change_rebuilds_snapshot(self):
+        first = Floor.objects.create(name="First")
+        self.client.get("/api/floors/plan/")
+        Table.objects.create(table_name="Patio", seats_count=2, capacity=2, floor=first)
+        plan = self.client.get("/api/floors/plan/").data
+        self.assertIn("Patio", [t["table_name"] for floor in plan for t in floor["tables"]])
+
+
+class ReservationTests(AdminAPITestCase):
+    def test_booking_and_availability(self):
+        ground = Floor.objects.create(name="Ground")
+        first = Floor.objects.create(name="First")
+        small_a, small_b, four, six, evening = Table.objects.bulk_create(
+            [
+                Table(table_name="G1", seats_count=2, capacity=2, floor=ground),
+                Table(table_name="G2", seats_count=2, capacity=2, floor=ground),
+                Table(table_name="G3", seats_count=4, capacity=4, floor=ground),
+                Table(table_name="F1", seats_count=6, capacity=6, floor=first),
+                Table(
+                    table_name="F2",
+                    seats_count=8,
+                    capacity=8,
+                    floor=first,
+                    start_time="18:00",
+                    end_time="23:00",
+                ),
+            ]
+        )
+        day = timezone.localdate() + timedelta(days=1)
+        at = lambda hour: timezone.make_aware(datetime.combine(day, time(hour)))
+
+        def book(party_size, start, end, **extra):
+            return self.client.post(
+                "/api/reservations/",
+                {
+                    "customer_name": unique("guest"),
+                    "party_size": party_size,
+                    "start_time": start.isoformat(),
+                    "end_time": end.isoformat(),
+                    **extra,
+                },
+                format="json",
+            )
+
+        def available(party_size, start, end):
+            response = self.client.get(
+                "/api/reservations/availability/",
+                {
+                    "party_size": party_size,
+                    "start_time": start.isoformat(),
+                    "end_time": end.isoformat(),
+                },
+            )
+            return [[t["table_name"] for t in o["tables"]] for o in response.data["options"]]
+
+        # Lunch: the evening-only table is not offered and the tightest fit comes first.
+        self.assertEqual(available(4, at(12), at(14)), [["G3"], ["F1"]])
+        # Single tables first, then combinations on one floor.
+        self.assertEqual([sorted(b) for b in available(7, at(19), at(21))], [["F2"], ["G1", "G2", "G3"]])
+        self.assertEqual([sorted(b) for b in available(8, at(12), at(14))], [["G1", "G2", "G3"]])
+
+        booked = [book(4, at(12), at(14)).data["tables"] for _ in range(3)]
+        self.assertEqual(booked, [[four.id], [six.id], sorted([small_a.id, small_b.id])])
+        self.assertEqual(book(1, at(13), at(15)).status_code, 400)
+
+        # Adjacent windows don't clash.
+        self.assertEqual(len(available(2, at(14), at(15))), 2)
+        self.assertEqual(available(2, at(13), at(14)), [])
+
+        clash = book(2, at(13), at(15), tables=[four.id])
+        self.assertEqual(clash.status_code, 400)
+        self.assertIn("G3", str(clash.data))
+
+        first_booking = Reservation.objects.get(tables=four)
+        self.client.patch(
+            f"/api/reservations/{first_booking.id}/", {"status": "cancelled"}, format="json"
+        )
+        self.assertEqual(available(4, at(13), at(14)), [["G3"]])
+        self.assertEqual(list(first_booking.tables.all()), [four])
+
+    def test_same_slot_validated_twice_is_booked_once(self):
+        floor = Floor.objects.create(name="Ground")
+        table = Table.objects.create(table_name="G1", seats_count=4, capacity=4, floor=floor)
+        start = timezone.now() + timedelta(days=1)
+        data = {
+            "customer_name": "Guest",
+            "party_size": 2,
+            "start_time": start.isoformat(),
+            "end_time": (start + timedelta(hours=2)).isoformat(),
+        }
+        for tables in ([table.id], None):
+            with self.subTest(tables=tables):
+                Reservation.objects.all().delete()
+                payload = {**data, "tables": tables} if tables else data
+                first = ReservationSerializer(data=payload)
+                second = ReservationSerializer(data=payload)
+                self.assertTrue(first.is_valid() and second.is_valid())
+                first.save()
+                # The clash check runs again when saving, after the tables are locked.
+                with self.assertRaises(serializers.ValidationError):
+                    second.save()
+                self.assertEqual(Reservation.objects.filter(tables=table).count(), 1)
+
+    def test_availability_rejects_impossible_times(self):
+        response = self.client.get(
+            "/api/reservations/availability/",
+            {"party_size": 2, "start_time": "2024-02-30T19:00", "end_time": "2024-02-30T21:00"},
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_list_rejects_bad_dates(self):
+        for date in ("abc", "2024-02-30"):
+            response = self.client.get("/api/reservations/", {"date": date})
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get("/api/reservations/", {"date": "2024-02-28"}).status_code, 200)
+
+    def test_table_interval_index(self):
+        rng = random.Random(7)
+        start_of_day = timezone.make_aware(datetime.combine(timezone.localdate(), time.min))
+        minutes = lambda m: start_of_day + timedelta(minutes=m)
+        tables = [
+            {
+                "id": table_id,
+                "table_name": f"T{table_id}",
+                "floor_id": table_id % 3,
+                "floor__name": str(table_id % 3),
+                "capacity": 2 + table_id % 5,
+                "start_time": time(0),
+                "end_time": time(0),
+            }
+            for table_id in range(1, 41)
+        ]
+        bookings = []
+        for table in tables:
+            cursor = 0
+            while cursor < 23 * 60:
+                cursor += rng.randrange(0, 90)
+                length = rng.randrange(30, 150)
+                bookings.append((table["id"], minutes(cursor), minutes(cursor + length)))
+                cursor += length
+        index = TableIntervalIndex(tables, bookings)
+
+        for _ in range(500):
+            start = rng.randrange(0, 24 * 60)
+            window = (minutes(start), minutes(start + rng.randrange(15, 180)))
+            for table in tables:
+                expected = any(
+                    b_start < window[1] and window[0] < b_end
+                    for table_id, b_start, b_end in bookings
+                    if table_id == table["id"]
+                )
+                self.assertEqual(index.is_booked(table["id"], *window), expected)
+
+
+class OrderSplitMergeTests(AdminAPITestCase):
+    def setUp(self):
+        super().setUp()
+        floor = Floor.objects.create(name="Ground")
+        self.table, self.other = Table.objects.bulk_create(
+            [
+                Table(table_name=unique("table"), seats_count=4, capacity=4, floor=floor)
+                for _ in range(2)
+            ]
+        )
+        (self.order,) = make_orders(1, self.user, order_type="dining", table=self.table)
+
+    def post(self, url, data):
+        return self.client.post(url, data, format="json")
+
+    def split(self, item_ids, **extra):
+        return self.post(f"/api/orders/{self.order.id}/split/", {"items": item_ids, **extra})
+
+    def merge(self, order_ids):
+        return self.post(f"/api/orders/{self.order.id}/merge/", {"orders": order_ids})
+
+    def test_split_moves_items_to_a_new_order(self):
+        moving = list(self.order.items.filter(quantity=2).values_list("id", flat=True))
+        self.assertEqual(self.split(moving, table=self.other.id).status_code, 201)
+
+        self.order.refresh_from_db()
+        new_order = Order.objects.latest("id")
+        self.assertEqual(self.order.total_amount, Decimal("10.00"))
+        self.assertEqual(new_order.total_amount, Decimal("20.00"))
+        self.assertEqual((new_order.table_id, new_order.order_type), (self.other.id, "dining"))
+
+    def test_merge_moves_items_and_cancels_sources(self):
+        (source,) = make_orders(1, self.user, order_type="dining", table=self.other)
+        response = self.merge([source.id])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Decimal(response.data["total_amount"]), Decimal("60.00"))
+        self.assertEqual(len(response.data["items"]), 4)
+        source.refresh_from_db()
+        self.assertEqual((source.status, source.total_amount), ("cancelled", Decimal("0.00")))
+
+        # Cancelled orders can't be merged again.
+        self.assertEqual(self.merge([source.id]).status_code, 400)
+
+    def test_merge_moves_open_kitchen_tickets_to_the_target(self):
+        (source,) = make_orders(1, self.user, order_type="dining", table=self.other)
+        open_ticket, done_ticket = KitchenTicket.objects.bulk_create(
+            [
+                KitchenTicket(order=source, station="grill", order_type="dining"),
+                KitchenTicket(order=source, station="bar", order_type="dining", status="completed"),
+            ]
+        )
+        self.assertEqual(self.merge([source.id]).status_code, 200)
+
+        open_ticket.refresh_from_db()
+        done_ticket.refresh_from_db()
+        self.assertEqual((open_ticket.order_id, open_ticket.status), (self.order.id, "new"))
+        self.assertEqual((done_ticket.order_id, done_ticket.status), (source.id, "completed"))
+
+    def test_rejects_malformed_input(self):
+        self.assertEqual(self.merge(str(self.order.id)).status_code, 400)
+        self.assertEqual(self.merge(["x"]).status_code, 400)
+        self.assertEqual(self.split({"id": 1}).status_code, 400)
+        self.assertEqual(self.split([], table="x").status_code, 400)
+        response = self.post("/api/orders/x/merge/", {"orders": [self.order.id]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.merge([10**30]).status_code, 400)
+        self.assertEqual(self.split([], table=str(10**30)).status_code, 400)
+        response = self.post(f"/api/orders/{10**30}/merge/", {"orders": [self.order.id]})
+        self.assertEqual(response.status_code, 400)
+
+    def test_rejects_other_orders_items_and_takeaways(self):
+        (takeaway,) = make_orders(1, self.user, order_type="takeaway")
+        self.assertEqual(self.merge([takeaway.id]).status_code, 400)
+        self.assertEqual(self.split([takeaway.items.first().id]).status_code, 400)
+
+
+class OrderUpdateTests(AdminAPITestCase):
+    def setUp(self):
+        super().setUp()
+        (self.order,) = make_orders(1, self.user, order_type="dining")
+        self.dishes = make_dishes(3)
+
+    def patch(self, data):
+        return self.client.patch(f"/api/orders/{self.order.id}/", data, format="json")
+
+    def test_added_items_are_added_to_the_total(self):
+        items = [{"dish": dish.id, "quantity": 2} for dish in self.dishes]
+        response = self.patch({"items": items})
+        self.assertEqual(Decimal(response.data["total_amount"]), Decimal("90.00"))
+        self.assertEqual(self.order.items.filter(is_newly_added=True).count(), 3)
+
+    def test_delivery_charge_is_applied_to_the_stored_total(self):
+        response = self.patch({"delivery_charge": "5.00", "total_amount": "1.00"})
+        self.assertEqual(Decimal(response.data["total_amount"]), Decimal("35.00"))
+
+    def test_unknown_dish(self):
+        self.assertEqual(self.patch({"items": [{"dish": 0, "quantity": 1}]}).status_code, 400)
+
+    def test_delivering_updates_the_customer(self):
+        Order.objects.filter(pk=self.order.pk).update(
+            customer_phone_number="9876543210", customer_phone_key="9876543210"
+        )
+        response = self.patch({"status": "delivered"})
+        self.assertEqual(response.status_code, 200)
+        customer = Customer.objects.get(phone="9876543210")
+        self.assertEqual((customer.order_count, customer.total_spent), (1, Decimal("30.00")))
+
+
+class OrderItemPriceTests(AdminAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.dish = make_dishes(1)[0]
+        response = self.client.post(
+            "/api/orders/",
+            {
+                "total_amount": "0.00",
+                "order_type": "takeaway",
+                "items": [{"dish": self.dish.id, "quantity": 3}],
+            },
+            format="json",
+        )
+        self.item = OrderItem.objects.get(order_id=response.data["id"])
+
+    def test_price_is_stored_on_the_item(self):
+        self.assertEqual(
+            (self.item.unit_price, self.item.line_total), (Decimal("10.00"), Decimal("30.00"))
+        )
+
+    def test_price_change_does_not_move_past_sales(self):
+        self.dish.price = Decimal("12.00")
+        self.dish.save()
+        dashboard = self.client.get("/api/orders/dashboard_data/").data
+        self.assertEqual(dashboard["category_sales"][0]["value"], Decimal("30.00"))
+
+    def test_backfill(self):
+        # Rows from before the columns existed are filled in batches.
+        Dish.objects.filter(pk=self.dish.pk).update(price=Decimal("12.00"))
+        OrderItem.objects.update(unit_price=None, line_total=None)
+        call_command("backfill_order_item_prices", batch_size=1, stdout=StringIO())
+        self.item.refresh_from_db()
+        self.assertEqual(
+            (self.item.unit_price, self.item.line_total), (Decimal("12.00"), Decimal("36.00"))
+        )
+        self.assertFalse(OrderItem.objects.filter(line_total__isnull=True).exists())
+
+    def test_migration_prices_old_items(self):
+        backfill = importlib.import_module("restaurant_app.migrations.0009_backfill_order_item_prices")
+        OrderItem.objects.update(unit_price=None, line_total=None)
+        backfill.fill_order_item_prices(django_apps, None, batch_size=1)
+
+        response = self.client.get(f"/api/orders/{self.item.order_id}/")
+        self.assertEqual(response.status_code, 200)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.line_total, Decimal("30.00"))
+
+
+class KitchenTicketTests(AdminAPITestCase):
+    def setUp(self):
+        super().setUp()
+        grill = Category.objects.create(name=unique("category"), station="grill")
+        bar = Category.objects.create(name=unique("category"), station="bar")
+        (self.kebab,) = make_dishes(1, category=grill)
+        (self.juice,) = make_dishes(1, category=bar)
+        floor = Floor.objects.create(name="Ground")
+        table = Table.objects.create(table_name="T1", seats_count=4, capacity=4, floor=floor)
+        response = self.client.post(
+            "/api/orders/",
+            {
+                "total_amount": "0.00",
+                "order_type": "dining",
+                "table": table.id,
+                "kitchen_note": "No onions",
+                "items": [
+                    {"dish": self.kebab.id, "quantity": 2},
+                    {"dish": self.juice.id, "quantity": 1},
+                    {"dish": self.kebab.id, "quantity": 1, "variants": ["spicy"]},
+                ],
+            },
+            format="json",
+        )
+        self.order_id = response.data["id"]
+
+    def queue(self, **params):
+        return self.client.get("/api/kitchen-tickets/queue/", params).data
+
+    def test_one_ticket_per_station(self):
+        (ticket,) = self.queue(station="grill")["results"]
+        self.assertEqual(
+            (ticket["table_name"], ticket["note"], [line["quantity"] for line in ticket["lines"]]),
+            ("T1", "No onions", [2, 1]),
+        )
+        (ticket,) = self.queue(station="bar")["results"]
+        self.assertEqual([line["quantity"] for line in ticket["lines"]], [1])
+
+    def test_added_items_make_a_new_ticket(self):
+        cursor = self.queue(station="grill")["cursor"]
+        self.client.patch(
+            f"/api/orders/{self.order_id}/",
+            {"items": [{"dish": self.kebab.id, "quantity": 4}]},
+            format="json",
+        )
+        newer = self.queue(station="grill", since=cursor)
+        self.assertEqual([t["lines"][0]["quantity"] for t in newer["results"]], [4])
+
+    def test_bump_and_complete(self):
+        ids = list(KitchenTicket.objects.order_by("id").values_list("id", flat=True))
+        self.client.post("/api/kitchen-tickets/bump/", {"ids": ids}, format="json")
+        self.assertEqual(set(KitchenTicket.objects.values_list("status", flat=True)), {"preparing"})
+        self.client.post("/api/kitchen-tickets/bump/", {"ids": ids[:1]}, format="json")
+        self.assertEqual(KitchenTicket.objects.get(pk=ids[0]).status, "ready")
+        self.client.post("/api/kitchen-tickets/complete/", {"ids": ids[1:]}, format="json")
+        self.assertEqual([t["id"] for t in self.queue()["results"]], ids[:1])
+
+    def test_cancelling_the_order_clears_open_tickets(self):
+        self.client.post(f"/api/orders/{self.order_id}/cancel_order/")
+        self.assertEqual(set(KitchenTicket.objects.values_list("status", flat=True)), {"cancelled"})
+
+    def test_cursor_reports_bumped_and_cancelled_tickets(self):
+        bar, grill = KitchenTicket.objects.order_by("station").values_list("id", flat=True)
+        cursor = self.queue()["cursor"]
+        self.client.post("/api/kitchen-tickets/bump/", {"ids": [grill]}, format="json")
+        changed = self.queue(since=cursor)
+        self.assertEqual([(t["id"], t["status"]) for t in changed["results"]], [(grill, "preparing")])
+
+        self.client.post(f"/api/orders/{self.order_id}/cancel_order/")
+        changed = self.queue(since=changed["cursor"])
+        self.assertEqual(
+            sorted((t["id"], t["status"]) for t in changed["results"]),
+            sorted([(grill, "cancelled"), (bar, "cancelled")]),
+        )
+        self.assertEqual(self.queue(since=changed["cursor"])["results"], [])
+
+    def test_rejects_malformed_cursor_and_ids(self):
+        for since in ("12", "999999999999999999-1", f"1-{10**30}"):
+            response = self.client.get("/api/kitchen-tickets/queue/", {"since": since})
+            self.assertEqual(response.status_code, 400)
+        response = self.client.post("/api/kitchen-tickets/bump/", {"ids": [10**30]}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+
+class CouponRedeemTests(AdminAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.coupon = Coupon.objects.create(
+            code="SAVE10",
+            discount_amount=Decimal("0.00"),
+            discount_percentage=Decimal("10.00"),
+            end_date=timezone.now() + timedelta(days=1),
+            usage_limit=2,
+            min_purchase_amount=Decimal("50.00"),
+        )
+
+    def redeem(self, code="SAVE10", amount="100.00"):
+        return self.client.post(
+            "/api/coupons/redeem/", {"code": code, "amount": amount}, format="json"
+        )
+
+    def test_check_does_not_use_the_coupon(self):
+        response = self.client.get("/api/coupons/check/", {"code": "SAVE10", "amount": "40"})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get("/api/coupons/check/", {"code": "SAVE10", "amount": "100"})
+        self.assertEqual((response.data["discount"], response.data["total"]), (10, 90))
+        self.assertEqual(Coupon.objects.get(pk=self.coupon.pk).usage_count, 0)
+
+    def test_usage_limit(self):
+        self.assertEqual(self.redeem().status_code, 200)
+        self.assertEqual(self.redeem().status_code, 200)
+        self.assertEqual(self.redeem().status_code, 400)
+        self.assertEqual(Coupon.objects.get(pk=self.coupon.pk).usage_count, 2)
+
+    def test_unknown_code(self):
+        self.assertEqual(self.redeem(code="NOPE").status_code, 400)
+
+    def test_edits_invalidate_the_cached_coupon(self):
+        self.redeem()
+        self.coupon.refresh_from_db()
+        self.coupon.code = "SAVE10X"
+        self.coupon.save()
+        self.assertEqual(self.redeem().status_code, 400)
+        self.assertEqual(self.redeem(code="SAVE10X").data["total"], Decimal("90.00"))
+
+
+class CustomerTests(AdminAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.orders = make_orders(
+            12, self.user, customer_phone_number="+91 98765 43210", customer_name="Asha"
+        )
+        for order in self.orders:
+            order.status = "delivered"
+            order.save()
+        self.customer = Customer.objects.get()
+
+    def test_delivered_orders_update_the_customer(self):
+        self.assertEqual(
+            (
+                self.customer.phone,
+                self.customer.name,
+                self.customer.order_count,
+                self.customer.total_spent,
+            ),
+            ("9876543210", "Asha", 12, Decimal("360.00")),
+        )
+        # Saving a delivered order again doesn't count it twice.
+        order = Order.objects.get(pk=self.orders[0].pk)
+        order.kitchen_note = "Extra napkins"
+        order.save()
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.order_count, 12)
+
+    def test_lookup_and_order_history(self):
+        response = self.client.get("/api/customers/09876543210/").data
+        self.assertEqual(response["order_count"], 12)
+        page = self.client.get("/api/customers/9876543210/orders/").data
+        self.assertEqual((page["count"], len(page["results"])), (12, 10))
+        self.assertNotIn("items", page["results"][0])
+
+        # The old lookup still returns a plain list and accepts any formatting.
+        history = self.client.get(
+            "/api/orders/user_order_history/", {"customer_phone_number": "0091-9876543210"}
+        ).data
+        self.assertEqual(len(history), 12)
+
+    def test_number_is_kept_as_typed(self):
+        order = Order.objects.get(pk=self.orders[0].pk)
+        self.assertEqual(
+            (order.customer_phone_number, order.customer_phone_key),
+            ("+91 98765 43210", "9876543210"),
+        )
+        order.customer_phone_number = "98765 43211"
+        order.save(update_fields=["customer_phone_number"])
+        order.refresh_from_db()
+        self.assertEqual(order.customer_phone_key, "9876543211")
+
+    def test_rebuild(self):
+        # Credit users join the directory; the rebuild recomputes stats and
+        # fills keys missing from rows written around save().
+        make_credit_users(1)
+        Customer.objects.update(order_count=0, total_spent=0)
+        Order.objects.filter(pk=self.orders[0].pk).update(customer_phone_key="")
+        call_command("rebuild_customers", batch_size=7, stdout=StringIO())
+        self.customer.refresh_from_db()
+        self.assertEqual(
+            (self.customer.order_count, self.customer.total_spent), (12, Decimal("360.00"))
+        )
+        self.assertEqual(Customer.objects.count(), 2)
+        self.assertEqual(
+            set(Order.objects.values_list("customer_phone_number", flat=True)),
+            {"+91 98765 43210"},
+        )
+
+
+class ArchiveOrderTests(AdminAPITestCase):
+    def setUp(self):
+        super().setUp()
+        old = timezone.now() - timedelta(days=400)
+        self.closed = make_orders(5, self.user, status="delivered")
+        (self.on_credit,) = make_orders(1, self.user, status="delivered")
+        (self.still_open,) = make_orders(1, self.user, status="pending")
+        (self.recent,) = make_orders(1, self.user, status="delivered")
+        CreditOrder.objects.create(order=self.on_credit, credit_user=make_credit_users(1)[0])
+        Bill.objects.create(order=self.closed[0], user=self.user, total_amount=Decimal("30.00"))
+        Order.objects.exclude(pk=self.recent.pk).update(created_at=old)
+
+    def archive(self, **options):
+        out = StringIO()
+        call_command("archive_orders", stdout=out, **options)
+        return out.getvalue()
+
+    def report(self, **params):
+        return self.client.get("/api/orders/sales_report/", params).data
+
+    def test_only_old_closed_orders_are_moved(self):
+        self.assertIn("Archived 5 orders", self.archive(batch_size=2))
+        self.assertEqual(
+            set(Order.objects.values_list("id", flat=True)),
+            {self.on_credit.id, self.still_open.id, self.recent.id},
+        )
+        closed_ids = [order.id for order in self.closed]
+        self.assertFalse(OrderItem.objects.filter(order_id__in=closed_ids).exists())
+        self.assertFalse(Bill.objects.exists())
+
+        archived = ArchivedOrder.objects.get(order_id=self.closed[0].id)
+        self.assertEqual(archived.total_amount, Decimal("30.00"))
+        self.assertEqual(len(archived.payload["items"]), 2)
+        self.assertEqual(archived.payload["bills"][0]["total_amount"], "30.00")
+
+    def test_rerun_is_safe(self):
+        self.archive()
+        self.assertIn("Archived 0 orders", self.archive())
+        self.assertEqual(ArchivedOrder.objects.count(), 5)
+
+    def test_sales_report_reads_the_archive(self):
+        self.archive()
+        self.assertEqual(len(self.report()), 8)
+        self.assertEqual(len(self.report(order_status="delivered")), 7)
+        recent_only = self.report(
+            from_date=(timezone.localdate() - timedelta(days=30)).isoformat()
+        )
+        self.assertEqual([order["id"] for order in recent_only], [self.recent.id])
+
+    def test_recent_sales_report_skips_the_archive(self):
+        self.archive()
+        with CaptureQueriesContext(connection) as queries:
+            self.report(from_date=(timezone.localdate() - timedelta(days=30)).isoformat())
+        self.assertFalse(any("archivedorder" in query["sql"] for query in queries))
+
+    def test_zero_days_archives_every_closed_order(self):
+        self.assertIn("Archived 6 orders", self.archive(days=0))
+        self.assertFalse(Order.objects.filter(pk=self.recent.pk).exists())
+
+
+class UserAdminTests(TestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create(
+            username="root", email="root@example.com", role="admin", passcode="111111"
+        )
+        request = RequestFactory().get("/admin/")
+        request.user = self.admin_user
+        self.form_class = admin.site._registry[User].get_form(request)
+
+    def form(self, instance=None, **data):
+        return self.form_class(
+            {"username": unique("user"), "password": "secret", "role": "staff", **data},
+            instance=instance,
+        )
+
+    def test_duplicate_passcode_is_a_form_error(self):
+        form = self.form(passcode="111111")
+        self.assertFalse(form.is_valid())
+        self.assertEqual(list(form.errors), ["passcode"])
+
+    def test_unchanged_passcode_is_accepted(self):
+        form = self.form(instance=self.admin_user, passcode=self.admin_user.passcode)
+        self.assertTrue(form.is_valid(), form.errors)
+
+
+class ConcurrentReservationTests(TransactionTestCase):
+    def setUp(self):
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            self.skipTest("threads can't share an in-memory SQLite test database")
+
+    def test_same_slot_booked_twice_at_once(self):
+        floor = Floor.objects.create(name="Ground")
+        table = Table.objects.create(table_name="G1", seats_count=4, capacity=4, floor=floor)
+        start = timezone.now() + timedelta(days=1)
+        data = {
+            "customer_name": "Guest",
+            "party_size": 2,
+            "start_time": start.isoformat(),
+            "end_time": (start + timedelta(hours=2)).isoformat(),
+            "tables": [table.id],
+        }
+        barrier = threading.Barrier(2)
+        results = []
+
+        def book():
+            try:
+                serializer = ReservationSerializer(data=data)
+                serializer.is_valid(raise_exception=True)
+                barrier.wait()
+                serializer.save()
+                results.append("booked")
+            except serializers.ValidationError:
+                results.append("clash")
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=book) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(results), ["booked", "clash"])
+        self.assertEqual(Reservation.objects.filter(tables=table).count(), 1)
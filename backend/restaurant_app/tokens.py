@@ -0,0 +1,130 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+from rest_framework_simplejwt.tokens import BlacklistMixin, RefreshToken, TokenError
+from rest_framework_simplejwt.utils import aware_utcnow, datetime_from_epoch
+
+
+# Each sync re-reads rows blacklisted this far before the previous one, so
+# a row whose transaction committed after a newer row is still picked up.
+SYNC_OVERLAP = timedelta(minutes=5)
+
+# Backstop for commits delayed beyond the overlap: every so often the whole
+# unexpired blacklist is read again.
+FULL_SYNC_SECONDS = 60 * 60
+
+
+class RevokedTokenFilter:
+    """
+    In-process set of blacklisted refresh-token JTIs.
+
+    Loaded on first use, updated immediately for tokens blacklisted in this
+    process (see the BlacklistedToken receiver in models.py) and topped up
+    with rows written by other workers at most every
+    TOKEN_REVOCATION_SYNC_SECONDS, by blacklisted_at with an overlap window.
+    Expired JTIs are dropped on each sync.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._expires = {}
+        self._since = None
+        self._synced_at = 0.0
+        self._full_synced_at = 0.0
+
+    def add(self, jti, expires_at):
+        with self._lock:
+            self._expires[jti] = expires_at
+
+    def reset(self):
+        with self._lock:
+            self._expires = {}
+            self._since = None
+            self._synced_at = 0.0
+            self._full_synced_at = 0.0
+
+    def sync(self):
+        now = aware_utcnow()
+        started = time.monotonic()
+        full = self._since is None or started - self._full_synced_at >= FULL_SYNC_SECONDS
+        rows = BlacklistedToken.objects.values_list("token__jti", "token__expires_at")
+        if full:
+            rows = rows.filter(token__expires_at__gt=now)
+        else:
+            rows = rows.filter(blacklisted_at__gte=self._since - SYNC_OVERLAP)
+
+        with self._lock:
+            for jti, expires_at in rows:
+                self._expires[jti] = expires_at
+            self._expires = {
+                jti: expires_at
+                for jti, expires_at in self._expires.items()
+                if expires_at > now
+            }
+            self._since = now
+            self._synced_at = started
+            if full:
+                self._full_synced_at = started
+
+    def __contains__(self, jti):
+        interval = getattr(settings, "TOKEN_REVOCATION_SYNC_SECONDS", 10)
+        if self._since is None or time.monotonic() - self._synced_at >= interval:
+            self.sync()
+        return jti in self._expires
+
+
+revoked_tokens = RevokedTokenFilter()
+
+
+class FilteredRefreshToken(RefreshToken):
+    """
+    RefreshToken whose blacklist check reads revoked_tokens instead of
+    querying BlacklistedToken on every refresh or logout.
+
+    blacklist() and outstand() also skip the user lookups the stock token
+    does; the refresh serializer has already loaded the user.
+    """
+
+    def check_blacklist(self):
+        if self.payload[api_settings.JTI_CLAIM] in revoked_tokens:
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        try:
+            token = OutstandingToken.objects.get(jti=self.payload[api_settings.JTI_CLAIM])
+        except OutstandingToken.DoesNotExist:
+            # Passcode tokens are only recorded once they are revoked.
+            return super().blacklist()
+        return BlacklistedToken.objects.get_or_create(token=token)
+
+    def outstand(self):
+        # Only called right after set_jti(), so the jti is always new.
+        return OutstandingToken.objects.create(
+            user_id=self.payload.get(api_settings.USER_ID_CLAIM),
+            jti=self.payload[api_settings.JTI_CLAIM],
+            created_at=self.current_time,
+            token=str(self),
+            expires_at=datetime_from_epoch(self.payload["exp"]),
+        )
+
+
+class PasscodeRefreshToken(FilteredRefreshToken):
+    """
+    Refresh token for passcode (shift) logins.
+
+    Unlike RefreshToken.for_user it does not insert an OutstandingToken row
+    on every login. blacklist() still records the token on logout or
+    rotation, so revocation behaves the same.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        return super(BlacklistMixin, cls).for_user(user)
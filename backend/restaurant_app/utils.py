@@ -1,6 +1,10 @@
 import io
+import hmac
+import hashlib
+import string
 import requests
-from datetime import timedelta
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone as dt_timezone
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
 from reportlab.lib import colors
@@ -10,6 +14,11 @@ from reportlab.platypus import Paragraph, Spacer
 from reportlab.lib.units import inch
 from twilio.rest import Client
 from django.conf import settings
+from django.contrib.auth.hashers import (
+    UNUSABLE_PASSWORD_PREFIX,
+    identify_hasher,
+    make_password,
+)
 from django.utils import timezone
 
 
@@ -17,6 +26,101 @@ def default_time_period():
     return timezone.now() + timedelta(days=30)
 
 
+# Largest value a primary key column (64-bit signed) can hold.
+MAX_ID = 2**63 - 1
+
+
+def parse_id(value):
+    """`value` (an int or a string of digits) as an id, or None if it can't be one."""
+    text = str(value)
+    if not text.isdecimal() or not 0 < int(text) <= MAX_ID:
+        return None
+    return int(text)
+
+
+def id_list(value):
+    """`value` as a list of integer ids, or None if it isn't a list of ids."""
+    if not isinstance(value, list) or not all(
+        isinstance(item, int) and not isinstance(item, bool) and 0 < item <= MAX_ID
+        for item in value
+    ):
+        return None
+    return value
+
+
+CURSOR_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def ticket_cursor(ticket):
+    """
+    Where a kitchen queue poll stopped, as "<updated_at in microseconds>-<id>",
+    so it survives a query string unescaped.
+    """
+    return f"{(ticket.updated_at - CURSOR_EPOCH) // timedelta(microseconds=1)}-{ticket.id}"
+
+
+def parse_ticket_cursor(value):
+    """The (updated_at, id) in a ticket_cursor() value, or None if it isn't one."""
+    micros, _, ticket_id = str(value).partition("-")
+    ticket_id = parse_id(ticket_id)
+    if not micros.isdecimal() or ticket_id is None:
+        return None
+    try:
+        return CURSOR_EPOCH + timedelta(microseconds=int(micros)), ticket_id
+    except OverflowError:
+        return None
+
+
+def normalize_phone(value):
+    """
+    Digits only, without trunk zeros or a country code, so one customer's
+    number matches however it was typed. Keeps the last
+    CUSTOMER_PHONE_DIGITS digits.
+    """
+    digits = "".join(char for char in str(value or "") if char.isdigit()).lstrip("0")
+    return digits[-settings.CUSTOMER_PHONE_DIGITS:]
+
+
+# Passcode logins take exactly this many characters.
+PASSCODE_LENGTH = 6
+
+
+def hash_passcode(passcode):
+    """Keyed digest stored in User.passcode, so logins are a unique-index lookup."""
+    return hmac.new(
+        settings.PASSCODE_HMAC_KEY.encode(), str(passcode).encode(), hashlib.sha256
+    ).hexdigest()
+
+
+def is_hashed_passcode(value):
+    return len(value) == 64 and all(char in string.hexdigits for char in value)
+
+
+def is_hashed_password(value):
+    """True for unusable passwords and hashes from any configured hasher."""
+    if value.startswith(UNUSABLE_PASSWORD_PREFIX):
+        return True
+    try:
+        identify_hasher(value)
+    except ValueError:
+        return False
+    return True
+
+
+def hash_passwords(passwords, workers=None):
+    """
+    make_password for many values, spread over a process pool.
+
+    Each hash is deliberately slow (hundreds of thousands of PBKDF2
+    iterations), so large staff imports use every core instead of one.
+    """
+    passwords = list(passwords)
+    if len(passwords) < 8 or workers == 1:
+        return [make_password(password) for password in passwords]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(make_password, passwords, chunksize=16))
+
+
 def generate_order_pdf(order):
     buffer = io.BytesIO()
     
@@ -56,8 +160,8 @@ def generate_order_pdf(order):
         data.append([
             item.dish.name, 
             str(item.quantity), 
-            f"${item.dish.price:.2f}", 
-            f"${item.quantity * item.dish.price:.2f}"
+            f"${item.unit_price:.2f}", 
+            f"${item.line_total:.2f}"
         ])
     
     # Add total row
@@ -1,3 +1,5 @@
+import csv
+import io
 from datetime import timedelta
 from decimal import Decimal
 from django_filters.rest_framework import DjangoFilterBackend
@@ -5,19 +7,44 @@ from rest_framework import viewsets, filters, permissions, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework_simplejwt.tokens import TokenError, RefreshToken
 from rest_framework_simplejwt.exceptions import InvalidToken
+from django.conf import settings
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 from django.db.models import Sum, Count, Avg, F
-from django.utils.dateparse import parse_date
+from django.utils.dateparse import parse_date, parse_datetime
 from django.db.models import Q
 from django.db.models.functions import TruncDate, TruncHour
 from delivery_drivers.models import DeliveryOrder
 from delivery_drivers.serializers import DeliveryOrderSerializer
 from restaurant_app.models import *
 from restaurant_app.serializers import *
+from restaurant_app.reservations import reservation_index_for
+from restaurant_app.services import (
+    CouponError,
+    OrderEditError,
+    StaffImportError,
+    bump_kitchen_tickets,
+    check_coupon,
+    complete_kitchen_tickets,
+    discounted_amount,
+    import_staff,
+    merge_orders,
+    mess_forecast_for,
+    redeem_coupon,
+    split_order,
+)
+from restaurant_app.tokens import FilteredRefreshToken
+from restaurant_app.utils import (
+    id_list,
+    normalize_phone,
+    parse_id,
+    parse_ticket_cursor,
+    ticket_cursor,
+)
 from rest_framework.decorators import api_view
 
 
@@ -49,6 +76,36 @@ class PasscodeLoginView(APIView):
         return Response(serializer.validated_data, status=status.HTTP_200_OK)
 
 
+class StaffImportView(APIView):
+    """Bulk-create staff and drivers from a CSV upload ("file") or a JSON "users" list."""
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request):
+        upload = request.FILES.get("file")
+        if upload:
+            rows = list(csv.DictReader(io.TextIOWrapper(upload, encoding="utf-8-sig")))
+        else:
+            rows = request.data.get("users")
+        if not isinstance(rows, list) or not rows or not all(isinstance(row, dict) for row in rows):
+            return Response(
+                {"error": "Upload a CSV file or send a list of users"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            users, drivers = import_staff(rows)
+        except StaffImportError as e:
+            return Response(
+                {"error": "Invalid rows, nothing was imported", "rows": e.errors},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(
+            {"created": len(users), "drivers": len(drivers)},
+            status=status.HTTP_201_CREATED,
+        )
+
+
 class LogoutView(viewsets.ViewSet):
     permission_classes = (permissions.AllowAny,)
 
@@ -62,7 +119,7 @@ class LogoutView(viewsets.ViewSet):
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
-            token = RefreshToken(refresh_token)
+            token = FilteredRefreshToken(refresh_token)
             token.blacklist()
             return Response(
                 {"detail": "Successfully logged out"}, status=status.HTTP_200_OK
@@ -103,6 +160,11 @@ class DishViewSet(viewsets.ModelViewSet):
     search_fields = ["name", "description"]
     ordering_fields = ["name", "price"]
 
+    def perform_destroy(self, instance):
+        # Deleting a dish cascades to menu items; refresh their menus once.
+        with deferred_menu_sub_totals():
+            instance.delete()
+
 
 class DishVariantViewSet(viewsets.ModelViewSet):
     queryset = DishVariant.objects.all()
@@ -128,7 +190,9 @@ class OrderViewSet(viewsets.ModelViewSet):
         return context
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().select_related(
+            "user__driver_profile", "delivery_order__driver__user"
+        ).prefetch_related("items")
         order_type = self.request.query_params.get("order_type", None)
         if order_type:
             queryset = queryset.filter(order_type=order_type)
@@ -144,6 +208,45 @@ class OrderViewSet(viewsets.ModelViewSet):
         order.save()
         return Response({"detail": "Order has been cancelled."}, status=status.HTTP_200_OK)
 
+    @action(detail=True, methods=["post"])
+    def split(self, request, pk=None):
+        """Move {"items": [order item ids]} onto a new order, optionally at another "table"."""
+        item_ids = id_list(request.data.get("items"))
+        table_id = request.data.get("table")
+        if parse_id(pk) is None or item_ids is None or not (
+            not table_id or parse_id(table_id) is not None
+        ):
+            return Response(
+                {"error": "items must be a list of order item ids and table a table id"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        table = None
+        if table_id:
+            table = Table.objects.filter(pk=table_id).first()
+            if table is None:
+                return Response({"error": "Table not found"}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            new_order = split_order(int(pk), item_ids, table=table)
+        except OrderEditError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        orders = self.get_queryset().filter(pk__in=[pk, new_order.pk]).order_by("id")
+        return Response(self.get_serializer(orders, many=True).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=["post"])
+    def merge(self, request, pk=None):
+        """Move every item of {"orders": [order ids]} onto this order and cancel them."""
+        order_ids = id_list(request.data.get("orders"))
+        if parse_id(pk) is None or order_ids is None:
+            return Response(
+                {"error": "orders must be a list of order ids"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            order = merge_orders(int(pk), order_ids)
+        except OrderEditError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(self.get_serializer(self.get_queryset().get(pk=order.pk)).data)
+
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -175,7 +278,9 @@ class OrderViewSet(viewsets.ModelViewSet):
         
         # If customer_phone_number is provided, filter the queryset
         if customer_phone_number:
-            queryset = queryset.filter(customer_phone_number=customer_phone_number)
+            queryset = queryset.filter(
+                customer_phone_key=normalize_phone(customer_phone_number)
+            )
         else:
             # Return an empty queryset if no customer_phone_number is provided
             queryset = queryset.none()
@@ -195,31 +300,48 @@ class OrderViewSet(viewsets.ModelViewSet):
         from_date = parse_date(from_date) if from_date else None
         to_date = parse_date(to_date) if to_date else None
 
-        queryset = self.get_queryset()
-
+        filters = {}
         # Apply date filters if provided
-        if from_date and to_date:
-            queryset = queryset.filter(
-                created_at__date__gte=from_date, created_at__date__lte=to_date
-            )
-        elif from_date:
-            queryset = queryset.filter(created_at__date__gte=from_date)
-        elif to_date:
-            queryset = queryset.filter(created_at__date__lte=to_date)
+        if from_date:
+            filters["created_at__date__gte"] = from_date
+        if to_date:
+            filters["created_at__date__lte"] = to_date
 
         # Apply additional filters based on query parameters
         if order_type:
-            queryset = queryset.filter(order_type=order_type)
+            filters["order_type"] = order_type
         if payment_method:
-            queryset = queryset.filter(payment_method=payment_method)
+            filters["payment_method"] = payment_method
         if status:
-            queryset = queryset.filter(status=status)
+            filters["status"] = status
 
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        queryset = self.get_queryset().filter(**filters)
+        data = self.get_serializer(queryset, many=True).data
+
+        # Orders moved out by archive_orders are served from their snapshots.
+        # Nothing newer than the archive cutoff is archived, so ranges
+        # starting after it skip the archive query.
+        archive_cutoff = timezone.localdate(
+            timezone.now() - timedelta(days=settings.ORDER_ARCHIVE_AFTER_DAYS)
+        )
+        archived = []
+        if not from_date or from_date <= archive_cutoff:
+            archived = list(
+                ArchivedOrder.objects.filter(**filters).values_list("payload", flat=True)
+            )
+        if archived:
+            data = sorted(
+                [*data, *archived], key=lambda order: order["created_at"], reverse=True
+            )
+        return Response(data)
 
     @action(detail=False, methods=["get"])
     def dashboard_data(self, request):
+        """
+        Sales figures for the last day, week, month or year. Reads live
+        orders only: the longest range is a year, which archive_orders leaves
+        live as long as ORDER_ARCHIVE_AFTER_DAYS is at least 365.
+        """
         time_range = request.query_params.get("time_range", "month")
         queryset = self.get_queryset_by_time_range(time_range)
 
@@ -254,7 +376,7 @@ class OrderViewSet(viewsets.ModelViewSet):
         category_sales = (
             OrderItem.objects.filter(order__in=queryset)
             .values("dish__category__name")
-            .annotate(value=Sum(F("quantity") * F("dish__price")))
+            .annotate(value=Sum("line_total"))
             .order_by("-value")
         )
 
@@ -405,13 +527,116 @@ class OrderTypeChangeViewSet(viewsets.ViewSet):
 
 
 
+class CustomerViewSet(viewsets.ReadOnlyModelViewSet):
+    """Customers by phone, e.g. /api/customers/9876543210/. ?search= matches name or phone."""
+
+    queryset = Customer.objects.all()
+    serializer_class = CustomerSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [filters.SearchFilter]
+    search_fields = ["name", "phone"]
+    lookup_field = "phone"
+
+    def get_object(self):
+        self.kwargs[self.lookup_field] = normalize_phone(self.kwargs[self.lookup_field])
+        return super().get_object()
+
+    @action(detail=True, methods=["get"])
+    def orders(self, request, phone=None):
+        """Paginated order history, newest first, read through the (phone key, created_at) index."""
+        queryset = Order.objects.filter(customer_phone_key=normalize_phone(phone)).order_by(
+            "-created_at"
+        )
+        page = self.paginate_queryset(queryset)
+        serializer = CustomerOrderSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+
+class KitchenTicketViewSet(viewsets.ReadOnlyModelViewSet):
+    serializer_class = KitchenTicketSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    QUEUE_LIMIT = 200
+
+    def get_queryset(self):
+        queryset = KitchenTicket.objects.all()
+        station = self.request.query_params.get("station")
+        if station:
+            queryset = queryset.filter(station=station)
+        status_param = self.request.query_params.get("status")
+        if status_param:
+            queryset = queryset.filter(status=status_param)
+        return queryset
+
+    @action(detail=False, methods=["get"])
+    def queue(self, request):
+        """
+        Tickets for a kitchen screen. Without `since` it lists the open
+        tickets; with `since` (the previous cursor) every ticket created or
+        changed after it, including bumped, completed and cancelled ones, so
+        the screen can update or drop them. Poll again with the returned
+        cursor.
+        """
+        queryset = self.get_queryset()
+        since = request.query_params.get("since")
+        if since:
+            position = parse_ticket_cursor(since)
+            if position is None:
+                return Response(
+                    {"error": "since must be a cursor from a previous queue response"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            updated_at, ticket_id = position
+            queryset = queryset.filter(
+                Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=ticket_id)
+            )
+        elif not request.query_params.get("status"):
+            queryset = queryset.filter(status__in=KitchenTicket.OPEN_STATUSES)
+
+        tickets = list(queryset.order_by("updated_at", "id")[: self.QUEUE_LIMIT + 1])
+        has_more = len(tickets) > self.QUEUE_LIMIT
+        tickets = tickets[: self.QUEUE_LIMIT]
+        cursor = ticket_cursor(tickets[-1]) if tickets else since
+        return Response(
+            {
+                "results": self.get_serializer(tickets, many=True).data,
+                "cursor": cursor,
+                "has_more": has_more,
+            }
+        )
+
+    def _ticket_ids(self, request):
+        return id_list(request.data.get("ids"))
+
+    @action(detail=False, methods=["post"])
+    def bump(self, request):
+        """Move {"ids": [...]} one step: new -> preparing -> ready -> completed."""
+        ids = self._ticket_ids(request)
+        if ids is None:
+            return Response(
+                {"error": "ids must be a list of ticket ids"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({"updated": bump_kitchen_tickets(ids)})
+
+    @action(detail=False, methods=["post"])
+    def complete(self, request):
+        """Mark {"ids": [...]} completed whatever step they are at."""
+        ids = self._ticket_ids(request)
+        if ids is None:
+            return Response(
+                {"error": "ids must be a list of ticket ids"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({"updated": complete_kitchen_tickets(ids)})
+
+
 class BillViewSet(viewsets.ModelViewSet):
     queryset = Bill.objects.all()
     serializer_class = BillSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().select_related(
+            "order", "user__driver_profile"
+        ).prefetch_related("order__items__dish")
         status_param = self.request.query_params.get('status')  # Get the status from query params
         if status_param:
             queryset = queryset.filter(order__status=status_param)  # Filter based on order status
@@ -451,7 +676,7 @@ class CancelOrderByBillView(APIView):
 
 
 class NotificationViewSet(viewsets.ModelViewSet):
-    queryset = Notification.objects.all().order_by("-created_at")
+    queryset = Notification.objects.select_related("user__driver_profile").order_by("-created_at")
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -480,6 +705,23 @@ class FloorViewSet(viewsets.ModelViewSet):
         names = [item["name"] for item in serializer.data]
         return Response(names)
 
+    @action(detail=False, methods=["get"])
+    def plan(self, request):
+        """
+        Live floor plan: every table per floor with its state (free, occupied
+        or billing), the current dining order and its running total. Served
+        from the cached snapshot kept up to date by order and bill signals.
+        """
+        snapshot = floor_plan_snapshot()
+        floors = {
+            floor_id: {"id": floor_id, "name": name, "tables": []}
+            for floor_id, name in snapshot["floors"].items()
+        }
+        for table in snapshot["tables"].values():
+            if table["floor_id"] in floors:
+                floors[table["floor_id"]]["tables"].append(table)
+        return Response(list(floors.values()))
+
 
 class TableViewSet(viewsets.ModelViewSet):
     serializer_class = TableSerializer
@@ -493,6 +735,75 @@ class TableViewSet(viewsets.ModelViewSet):
         return queryset
 
 
+class ReservationViewSet(viewsets.ModelViewSet):
+    serializer_class = ReservationSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        queryset = Reservation.objects.prefetch_related("tables")
+        date = self.request.query_params.get("date")
+        if date:
+            try:
+                day = parse_date(date)
+            except ValueError:
+                # Well-formed but impossible, such as 2024-02-30.
+                day = None
+            if day is None:
+                raise ValidationError({"error": "date must be a YYYY-MM-DD date"})
+            queryset = queryset.filter(start_time__date=day)
+        status_param = self.request.query_params.get("status")
+        if status_param:
+            queryset = queryset.filter(status=status_param)
+        return queryset
+
+    @action(detail=False, methods=["get"])
+    def availability(self, request):
+        """
+        Ways to seat party_size people from start_time to end_time, best
+        first: a single table where possible, otherwise tables combined on
+        one floor. Answered from the cached per-day interval index.
+        """
+        try:
+            start = parse_datetime(request.query_params.get("start_time", ""))
+            end = parse_datetime(request.query_params.get("end_time", ""))
+        except ValueError:
+            start = end = None
+        try:
+            party_size = int(request.query_params.get("party_size", ""))
+        except ValueError:
+            party_size = 0
+        if not start or not end or party_size < 1:
+            return Response(
+                {"error": "start_time, end_time and party_size are required"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if timezone.is_naive(start):
+            start = timezone.make_aware(start)
+        if timezone.is_naive(end):
+            end = timezone.make_aware(end)
+        if not start < end <= start + timedelta(days=1):
+            return Response(
+                {"error": "end_time must be after start_time and within a day of it"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        index = reservation_index_for(timezone.localtime(start).date())
+        options = [
+            {
+                "floor": tables[0]["floor__name"],
+                "capacity": sum(table["capacity"] for table in tables),
+                "tables": [
+                    {"id": t["id"], "table_name": t["table_name"], "capacity": t["capacity"]}
+                    for t in tables
+                ],
+            }
+            for tables in index.options(start, end, party_size)
+        ]
+        return Response(
+            {"start_time": start, "end_time": end, "party_size": party_size, "options": options}
+        )
+
+
 class CouponViewSet(viewsets.ModelViewSet):
     queryset = Coupon.objects.all()
     serializer_class = CouponSerializer
@@ -525,6 +836,45 @@ class CouponViewSet(viewsets.ModelViewSet):
         self.perform_update(serializer)
         return Response(serializer.data)
 
+    def _coupon_request(self, data):
+        code = str(data.get("code") or "").strip()
+        try:
+            amount = Decimal(str(data.get("amount")))
+        except ArithmeticError:
+            amount = None
+        if not code or amount is None or not amount.is_finite() or amount < 0:
+            return None, None
+        return code, amount
+
+    @action(detail=False, methods=["get"])
+    def check(self, request):
+        """What ?code= would take off ?amount=, without using the coupon."""
+        code, amount = self._coupon_request(request.query_params)
+        if code is None:
+            return Response(
+                {"error": "code and amount are required"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            coupon = check_coupon(code, amount)
+        except CouponError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        total = discounted_amount(coupon, amount)
+        return Response({"code": code, "amount": amount, "discount": amount - total, "total": total})
+
+    @action(detail=False, methods=["post"])
+    def redeem(self, request):
+        """Use {"code", "amount"} once and return the discounted total."""
+        code, amount = self._coupon_request(request.data)
+        if code is None:
+            return Response(
+                {"error": "code and amount are required"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            coupon, total = redeem_coupon(code, amount)
+        except CouponError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"code": code, "amount": amount, "discount": amount - total, "total": total})
+
     def partial_update(self, request, *args, **kwargs):
         return self.update(request, *args, **kwargs)
 
@@ -540,7 +890,7 @@ class MessTypeViewSet(viewsets.ModelViewSet):
 
 
 class MenuViewSet(viewsets.ModelViewSet):
-    queryset = Menu.objects.all()
+    queryset = Menu.objects.prefetch_related("menu_items__dish")
     serializer_class = MenuSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ["mess_type", "is_custom", "created_by"]
@@ -582,15 +932,26 @@ class MenuViewSet(viewsets.ModelViewSet):
         serializer.is_valid(raise_exception=True)
         mess = serializer.save()
         return Response(serializer.data)
-    
+
+    def perform_destroy(self, instance):
+        with deferred_menu_sub_totals():
+            instance.delete()
+
+    @action(detail=False, methods=["post"])
+    def build_week(self, request):
+        serializer = WeeklyMenuSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
 
 class MenuItemViewSet(viewsets.ModelViewSet):
-    queryset = MenuItem.objects.all()
+    queryset = MenuItem.objects.select_related("dish")
     serializer_class = MenuItemSerializer
 
 
 class MessViewSet(viewsets.ModelViewSet):
-    queryset = Mess.objects.all()
+    queryset = Mess.objects.select_related("mess_type").prefetch_related("menus")
     serializer_class = MessSerializer
 
     def create(self, request, *args, **kwargs):
@@ -606,8 +967,7 @@ class MessViewSet(viewsets.ModelViewSet):
             serializer.data, status=status.HTTP_201_CREATED, headers=headers
         )
 
-    @action(detail=False, methods=["get"])
-    def mess_report(self, request):
+    def get_mess_report_queryset(self, request):
         from_date = request.query_params.get("from_date")
         to_date = request.query_params.get("to_date")
         payment_method = request.query_params.get("payment_method")
@@ -617,7 +977,6 @@ class MessViewSet(viewsets.ModelViewSet):
         # Convert to datetime objects for filtering
         from_date = parse_date(from_date) if from_date else None
         to_date = parse_date(to_date) if to_date else None
-        print("from :", from_date, "to :", to_date)
 
         queryset = self.get_queryset()
 
@@ -634,16 +993,83 @@ class MessViewSet(viewsets.ModelViewSet):
         if credit:
             queryset = queryset.filter(pending_amount__gt=0)
         if mess_type_name:
-            try:
-                mess_type_instance = MessType.objects.get(name=mess_type_name)
-                mess_type_id = mess_type_instance.id
-                queryset = queryset.filter(mess_type=mess_type_id)
-            except MessType.DoesNotExist:
-                return Response({"detail": "Invalid mess_type"}, status=400)
+            if mess_type_name not in dict(MessType.MESS_TYPE_CHOICES):
+                return None
+            queryset = queryset.filter(mess_type__name=mess_type_name)
+        return queryset
+
+    @action(detail=False, methods=["get"])
+    def mess_report(self, request):
+        queryset = self.get_mess_report_queryset(request)
+        if queryset is None:
+            return Response({"detail": "Invalid mess_type"}, status=400)
 
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=["get"])
+    def mess_report_summary(self, request):
+        """mess_report totals per mess type and payment method, computed in the database."""
+        queryset = self.get_mess_report_queryset(request)
+        if queryset is None:
+            return Response({"detail": "Invalid mess_type"}, status=400)
+
+        totals = {
+            "count": Count("id"),
+            "total_amount": Sum("total_amount"),
+            "paid_amount": Sum("paid_amount"),
+            "pending_amount": Sum("pending_amount"),
+            "cash_amount": Sum("cash_amount"),
+            "bank_amount": Sum("bank_amount"),
+            "discount_amount": Sum("discount_amount"),
+        }
+        queryset = queryset.order_by().prefetch_related(None)
+        rows = (
+            queryset.values("mess_type__name", "payment_method")
+            .annotate(**totals)
+            .order_by("mess_type__name", "payment_method")
+        )
+        overall = queryset.aggregate(**totals)
+        return Response(
+            {
+                "rows": [
+                    {
+                        "mess_type": row.pop("mess_type__name"),
+                        **{key: value or 0 for key, value in row.items()},
+                    }
+                    for row in rows
+                ],
+                "overall": {key: value or 0 for key, value in overall.items()},
+            }
+        )
+
+    @action(detail=False, methods=["get"])
+    def forecast(self, request):
+        """Per-dish quantities to prepare for each day from from_date to to_date (default tomorrow)."""
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        from_date = request.query_params.get("from_date")
+        to_date = request.query_params.get("to_date")
+        try:
+            from_date = parse_date(from_date) if from_date else tomorrow
+            to_date = parse_date(to_date) if to_date else from_date
+        except ValueError:
+            # Well-formed but impossible, such as 2024-02-30.
+            from_date = to_date = None
+        if from_date is None or to_date is None:
+            return Response(
+                {"error": "Dates must be YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        if not 0 <= (to_date - from_date).days < 31:
+            return Response(
+                {"error": "to_date must be within 31 days after from_date"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        days = (to_date - from_date).days + 1
+        return Response(
+            [mess_forecast_for(from_date + timedelta(days=i)) for i in range(days)]
+        )
+
 
 class SearchDishesAPIView(APIView):
     def get(self, request):
@@ -656,13 +1082,13 @@ class SearchDishesAPIView(APIView):
 
 
 class CreditUserViewSet(viewsets.ModelViewSet):
-    queryset = CreditUser.objects.all()
+    queryset = CreditUser.objects.prefetch_related("credit_orders")
     serializer_class = CreditUserSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     @action(detail=False, methods=["get"])
     def get_active_users(self, request, pk=None):
-        active_users = CreditUser.objects.filter(is_active=True)
+        active_users = self.get_queryset().filter(is_active=True)
         serializer = self.get_serializer(active_users, many=True)
         return Response({"data": serializer.data}, status=status.HTTP_200_OK)
 
@@ -702,7 +1128,9 @@ class CreditTransactionViewSet(viewsets.ModelViewSet):
 
     
     def get_queryset(self):
-        queryset = CreditTransaction.objects.all()
+        queryset = CreditTransaction.objects.select_related("credit_user").prefetch_related(
+            "credit_user__credit_orders"
+        )
         credit_user_id = self.request.query_params.get('credit_user', None)
         if credit_user_id is not None:
             queryset = queryset.filter(credit_user_id=credit_user_id)
@@ -37,7 +37,7 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "restaurant_app.authentication.CachedJWTAuthentication",
     ],
     "DEFAULT_THROTTLE_CLASSES": [
         "rest_framework.throttling.UserRateThrottle",
@@ -92,6 +92,10 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # SQLite ignores SELECT ... FOR UPDATE. Taking the write lock when a
+        # transaction starts serializes check-then-insert blocks such as
+        # table reservations instead.
+        "OPTIONS": {"transaction_mode": "IMMEDIATE"},
     }
 }
 
@@ -162,8 +166,41 @@ SIMPLE_JWT = {
     "SLIDING_TOKEN_REFRESH_EXP_CLAIM": "refresh_exp",
     "SLIDING_TOKEN_LIFETIME": timedelta(hours=24),
     "SLIDING_TOKEN_REFRESH_LIFETIME": timedelta(days=3),
+    "TOKEN_REFRESH_SERIALIZER": "restaurant_app.serializers.FilteredTokenRefreshSerializer",
 }
 
+# How stale the in-process revoked-token set may get for tokens blacklisted by
+# other workers. 0 re-syncs on every check.
+TOKEN_REVOCATION_SYNC_SECONDS = env.int("TOKEN_REVOCATION_SYNC_SECONDS", default=10)
+
+# How long CachedJWTAuthentication keeps a user's role/active flags. Saves in
+# this process invalidate at once; other workers see changes within this TTL
+# unless CACHES points at a shared backend.
+AUTH_USER_CACHE_SECONDS = env.int("AUTH_USER_CACHE_SECONDS", default=60)
+
+# Assign new delivery orders to drivers automatically (see delivery_drivers.dispatch),
+# never giving one driver more than DELIVERY_MAX_OPEN_ORDERS open orders.
+DELIVERY_AUTO_DISPATCH = env.bool("DELIVERY_AUTO_DISPATCH", default=True)
+DELIVERY_MAX_OPEN_ORDERS = env.int("DELIVERY_MAX_OPEN_ORDERS", default=1)
+
+# Upper bound on how long the cached floor plan (see restaurant_app.models.floor_plan_snapshot)
+# may drift from the orders table if an incremental update is lost.
+FLOOR_PLAN_CACHE_SECONDS = env.int("FLOOR_PLAN_CACHE_SECONDS", default=300)
+
+# Digits kept when normalizing phone numbers (the national number without the
+# country code). Orders and customers are matched on the result; run
+# rebuild_customers after changing it to re-key existing orders.
+CUSTOMER_PHONE_DIGITS = env.int("CUSTOMER_PHONE_DIGITS", default=10)
+
+# Closed orders older than this many days are moved to ArchivedOrder by the
+# archive_orders command. The sales report only looks in the archive for dates
+# before this cutoff, and the dashboard (up to a year back) reads live orders
+# only, so keep it at 365 or more.
+ORDER_ARCHIVE_AFTER_DAYS = env.int("ORDER_ARCHIVE_AFTER_DAYS", default=365)
+
+# Key for the passcode digests stored on User. Changing it invalidates all passcodes.
+PASSCODE_HMAC_KEY = env.str("PASSCODE_HMAC_KEY", default=SECRET_KEY)
+
 TWILIO_ACCOUNT_SID = env.str("TWILIO_ACCOUNT_SID")
 TWILIO_AUTH_TOKEN = env.str("TWILIO_AUTH_TOKEN")
 TWILIO_PHONE_NUMBER = env.str("TWILIO_PHONE_NUMBER")
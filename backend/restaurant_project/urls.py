@@ -13,11 +13,15 @@ from restaurant_app.views import (
     OrderViewSet,
     NotificationViewSet,
     BillViewSet,
+    KitchenTicketViewSet,
+    CustomerViewSet,
     LoginViewSet,
     PasscodeLoginView,
+    StaffImportView,
     LogoutView,
     FloorViewSet,
     TableViewSet,
+    ReservationViewSet,
     CouponViewSet,
     MenuViewSet,
     MenuItemViewSet,
@@ -56,9 +60,12 @@ router.register(r"categories", CategoryViewSet, basename="categories")
 router.register(r"orders", OrderViewSet, basename="orders")  # Primary Orders ViewSet
 router.register(r"order-type", OrderTypeChangeViewSet, basename="order_type")  # Separate route for changing order types
 router.register(r"bills", BillViewSet, basename="bills")
+router.register(r"kitchen-tickets", KitchenTicketViewSet, basename="kitchen_tickets")
+router.register(r"customers", CustomerViewSet, basename="customers")
 router.register(r"notifications", NotificationViewSet, basename="notifications")
 router.register(r"floors", FloorViewSet, basename="floors")
 router.register(r"tables", TableViewSet, basename="tables")
+router.register(r"reservations", ReservationViewSet, basename="reservations")
 router.register(r"coupons", CouponViewSet, basename="coupons")
 router.register(r"mess-types", MessTypeViewSet, basename="mess_types")
 router.register(r"menus", MenuViewSet, basename="menus")
@@ -100,6 +107,7 @@ urlpatterns = [
     path("api/", include(router.urls)),
     path("api/login-passcode/", PasscodeLoginView.as_view(), name="login-passcode"),
     path("api/token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
+    path("api/staff/import/", StaffImportView.as_view(), name="staff-import"),
     path("api/logout/", LogoutView.as_view({"post": "logout"}), name="logout"),
     path("api/search-dishes/", SearchDishesAPIView.as_view(), name="search_dishes"),  # Include the search API endpoint
 
@@ -1,3 +1,332 @@
-from django.test import TestCase
+from datetime import date
+from decimal import Decimal
 
-# Create your tests here.
+from restaurant_app.tests import QueryBudgetTestCase, unique, unique_phone
+from .models import (
+    BalanceSheet,
+    CashCountSheet,
+    CashCountSheetItems,
+    IncomeStatement,
+    Ledger,
+    MainGroup,
+    NatureGroup,
+    ProfitLossShareTransaction,
+    SharePaymentHistory,
+    ShareUsers,
+    ShareUserTransaction,
+    Transaction,
+)
+
+
+def make_nature_groups(n):
+    return NatureGroup.objects.bulk_create(
+        [NatureGroup(name=unique("nature")) for _ in range(n)]
+    )
+
+
+def make_main_groups(n):
+    nature_group = make_nature_groups(1)[0]
+    return MainGroup.objects.bulk_create(
+        [MainGroup(name=unique("group"), nature_group=nature_group) for _ in range(n)]
+    )
+
+
+def make_ledgers(n):
+    group = make_main_groups(1)[0]
+    return Ledger.objects.bulk_create(
+        [Ledger(name=unique("ledger"), group=group) for _ in range(n)]
+    )
+
+
+def make_share_users(n):
+    return ShareUsers.objects.bulk_create(
+        [
+            ShareUsers(
+                name=unique("partner"),
+                mobile_no=unique_phone(),
+                category="partners",
+                profitlose_share=Decimal("10.00"),
+                address="City",
+            )
+            for _ in range(n)
+        ]
+    )
+
+
+def make_profit_loss_transactions(n):
+    share_users = make_share_users(2)
+    transactions = ProfitLossShareTransaction.objects.bulk_create(
+        [
+            ProfitLossShareTransaction(
+                transaction_no=unique_phone(),
+                period_from=date(2024, 1, 1),
+                period_to=date(2024, 1, 31),
+                total_percentage=Decimal("20.00"),
+                total_amount=Decimal("200.00"),
+            )
+            for _ in range(n)
+        ]
+    )
+    ShareUserTransaction.objects.bulk_create(
+        [
+            ShareUserTransaction(
+                transaction=transaction,
+                share_user=share_user,
+                percentage=Decimal("10.00"),
+                profit_lose="profit",
+                amount=Decimal("100.00"),
+                percentage_amount=Decimal("10.00"),
+            )
+            for transaction in transactions
+            for share_user in share_users
+        ]
+    )
+    return transactions
+
+
+class AccountsQueryBudgetTests(QueryBudgetTestCase):
+    def test_nature_groups(self):
+        self.assertEndpointQueries(
+            "/api/nature-groups/",
+            make_nature_groups,
+            list_max=2,
+            retrieve_max=1,
+            create_data=lambda: {"name": unique("nature")},
+            create_max=2,
+        )
+
+    def test_main_groups(self):
+        self.assertEndpointQueries(
+            "/api/main-groups/",
+            make_main_groups,
+            list_max=2,
+            retrieve_max=1,
+        )
+
+    def test_ledgers(self):
+        group = make_main_groups(1)[0]
+        self.assertEndpointQueries(
+            "/api/ledgers/",
+            make_ledgers,
+            list_max=2,
+            retrieve_max=1,
+            create_data=lambda: {"name": unique("ledger"), "group_id": group.id},
+            create_max=3,
+        )
+
+    def test_transactions(self):
+        cash, sales = make_ledgers(2)
+
+        def make_transactions(n):
+            return Transaction.objects.bulk_create(
+                [
+                    Transaction(
+                        ledger=sales,
+                        particulars=cash,
+                        date=date(2024, 1, 1),
+                        credit_amount=Decimal("10.00"),
+                        voucher_no=i + 1,
+                        debit_credit="credit",
+                    )
+                    for i in range(n)
+                ]
+            )
+
+        def pay_in():
+            return {
+                "transaction_type": "payin",
+                "transaction1": {
+                    "ledger_id": cash.id,
+                    "particulars_id": sales.id,
+                    "date": "2024-01-02",
+                    "debit_amount": "10.00",
+                    "debit_credit": "debit",
+                },
+                "transaction2": {
+                    "ledger_id": sales.id,
+                    "particulars_id": cash.id,
+                    "date": "2024-01-02",
+                    "credit_amount": "10.00",
+                    "debit_credit": "credit",
+                },
+            }
+
+        self.assertEndpointQueries(
+            "/api/transactions/",
+            make_transactions,
+            list_max=2,
+            retrieve_max=1,
+            create_data=pay_in,
+            create_max=19,
+        )
+
+    def test_income_statements(self):
+        ledger = make_ledgers(1)[0]
+        self.assertEndpointQueries(
+            "/api/income-statements/",
+            lambda n: IncomeStatement.objects.bulk_create(
+                [IncomeStatement(ledger=ledger, income_type="Sales") for _ in range(n)]
+            ),
+            list_max=2,
+            retrieve_max=1,
+            create_data=lambda: {"ledger": ledger.id, "income_type": "Sales", "amount": "5.00"},
+            create_max=2,
+        )
+
+    def test_balance_sheets(self):
+        ledger = make_ledgers(1)[0]
+        self.assertEndpointQueries(
+            "/api/balance-sheets/",
+            lambda n: BalanceSheet.objects.bulk_create(
+                [BalanceSheet(ledger=ledger, balance_type="Asset") for _ in range(n)]
+            ),
+            list_max=2,
+            retrieve_max=1,
+            create_data=lambda: {"ledger": ledger.id, "balance_type": "Asset", "amount": "5.00"},
+            create_max=2,
+        )
+
+    def test_share_user_management(self):
+        self.assertEndpointQueries(
+            "/api/share-user-management/",
+            make_share_users,
+            list_max=2,
+            retrieve_max=1,
+            create_data=lambda: {
+                "name": unique("partner"),
+                "mobile_no": unique_phone(),
+                "category": "managements",
+                "profitlose_share": "5.00",
+                "address": "City",
+            },
+            create_max=1,
+        )
+
+    def test_profit_loss_share_transactions(self):
+        share_users = make_share_users(2)
+        self.assertEndpointQueries(
+            "/api/profit-loss-share-transactions/",
+            make_profit_loss_transactions,
+            list_max=4,
+            retrieve_max=3,
+            create_data=lambda: {
+                "period_from": "2024-02-01",
+                "period_to": "2024-02-29",
+                "status": "profit",
+                "total_amount": "0.00",
+                "total_percentage": "0.00",
+                "share_user_transactions": [
+                    {
+                        "share_user": share_user.id,
+                        "profit_lose": "profit",
+                        "percentage": "10.00",
+                        "amount": "100.00",
+                        "percentage_amount": "10.00",
+                    }
+                    for share_user in share_users
+                ],
+            },
+            create_max=10,
+        )
+
+    def test_share_user_transactions(self):
+        transaction = make_profit_loss_transactions(1)[0]
+        share_user = make_share_users(1)[0]
+
+        def make_share_user_transactions(n):
+            return ShareUserTransaction.objects.bulk_create(
+                [
+                    ShareUserTransaction(
+                        transaction=transaction,
+                        share_user=share_user,
+                        percentage=Decimal("10.00"),
+                        profit_lose="profit",
+                        amount=Decimal("100.00"),
+                        percentage_amount=Decimal("10.00"),
+                    )
+                    for _ in range(n)
+                ]
+            )
+
+        self.assertEndpointQueries(
+            "/api/share-user-transactions/",
+            make_share_user_transactions,
+            list_max=2,
+            retrieve_max=1,
+            create_data=lambda: {
+                "transaction": transaction.id,
+                "share_user": share_user.id,
+                "percentage": "10.00",
+                "profit_lose": "profit",
+                "amount": "100.00",
+                "percentage_amount": "10.00",
+            },
+            create_max=3,
+        )
+
+    def test_share_payment_history(self):
+        share_user_transaction = ShareUserTransaction.objects.filter(
+            transaction__in=make_profit_loss_transactions(1)
+        ).first()
+        self.assertEndpointQueries(
+            "/api/share-payment-history/",
+            lambda n: SharePaymentHistory.objects.bulk_create(
+                [
+                    SharePaymentHistory(
+                        share_user_transaction=share_user_transaction,
+                        paid_amount=Decimal("1.00"),
+                    )
+                    for _ in range(n)
+                ]
+            ),
+            list_max=2,
+            retrieve_max=1,
+            create_data=lambda: {
+                "share_user_transaction": share_user_transaction.id,
+                "paid_amount": "1.00",
+            },
+            create_max=4,
+        )
+
+    def test_cashsheet(self):
+        def make_cash_sheets(n):
+            sheets = CashCountSheet.objects.bulk_create(
+                [
+                    CashCountSheet(
+                        created_date=date(2024, 1, 1),
+                        amount=Decimal("600.00"),
+                        transaction_type="payin",
+                    )
+                    for _ in range(n)
+                ]
+            )
+            CashCountSheetItems.objects.bulk_create(
+                [
+                    CashCountSheetItems(
+                        created_date=date(2024, 1, 1),
+                        currency=currency,
+                        nos=1,
+                        amount=Decimal(currency),
+                        ref=sheet,
+                    )
+                    for sheet in sheets
+                    for currency in (100, 500)
+                ]
+            )
+            return sheets
+
+        self.assertEndpointQueries(
+            "/api/cashsheet/",
+            make_cash_sheets,
+            list_max=3,
+            retrieve_max=2,
+            create_data=lambda: {
+                "created_date": "2024-01-02",
+                "amount": "100.00",
+                "transaction_type": "payout",
+                "items": [
+                    {"created_date": "2024-01-02", "currency": 100, "nos": 1, "amount": "100.00"}
+                ],
+            },
+            create_max=3,
+        )
@@ -41,11 +41,11 @@ class NatureGroupViewSet(viewsets.ModelViewSet):
     serializer_class = NatureGroupSerializer
 
 class MainGroupViewSet(viewsets.ModelViewSet):
-    queryset = MainGroup.objects.all()
+    queryset = MainGroup.objects.select_related("nature_group")
     serializer_class = MainGroupSerializer
 
 class LedgerViewSet(viewsets.ModelViewSet):
-    queryset = Ledger.objects.all()
+    queryset = Ledger.objects.select_related("group__nature_group")
     serializer_class = LedgerSerializer
 
     @action(detail=False, methods=['get'], url_path='filter-by-group')
@@ -54,7 +54,7 @@ class LedgerViewSet(viewsets.ModelViewSet):
         
         if group_name:
             # Filter ledgers based on the group name
-            ledgers = Ledger.objects.filter(group__name=group_name)
+            ledgers = self.get_queryset().filter(group__name=group_name)
             
             if not ledgers.exists():  # If no ledgers found, return an empty list explicitly
                 return Response([])
@@ -70,7 +70,7 @@ class LedgerViewSet(viewsets.ModelViewSet):
         ledger_name = request.query_params.get('ledger_name')  
 
         if ledger_name:
-            ledgers = Ledger.objects.filter(name__icontains=ledger_name)
+            ledgers = self.get_queryset().filter(name__icontains=ledger_name)
             
             if not ledgers.exists():
                 return Response([]) 
@@ -81,7 +81,9 @@ class LedgerViewSet(viewsets.ModelViewSet):
             return Response({"error": "Ledger name not provided"}, status=400)
 
 class TransactionViewSet(viewsets.ModelViewSet):
-    queryset = Transaction.objects.all()
+    queryset = Transaction.objects.select_related(
+        "ledger__group__nature_group", "particulars__group__nature_group"
+    )
     serializer_class = TransactionSerializer
 
     # @transaction.atomic
@@ -244,7 +246,7 @@ class TransactionViewSet(viewsets.ModelViewSet):
             return Response([])  # Return empty response if both dates are not provided
 
         # Fetch filtered transactions
-        transactions = Transaction.objects.filter(filters)
+        transactions = self.queryset.filter(filters)
 
         # Return empty if no transactions found
         if not transactions.exists():
@@ -329,7 +331,9 @@ class ProfitLossShareTransactionViewSet(viewsets.ModelViewSet):
     queryset = ProfitLossShareTransaction.objects.all()
     serializer_class = ProfitLossShareTransactionSerializer
     def get_queryset(self):
-        queryset = ProfitLossShareTransaction.objects.all()
+        queryset = ProfitLossShareTransaction.objects.prefetch_related(
+            "share_user_transactions__share_user"
+        )
         transaction_no = self.request.query_params.get('transaction_no', None)
         if transaction_no:
             queryset = queryset.filter(transaction_no=transaction_no)
@@ -364,5 +368,5 @@ class SharePaymentHistoryViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(payment_histories, many=True)
         return Response(serializer.data)
 class CashCountSheetViewSet(viewsets.ModelViewSet):
-    queryset = CashCountSheet.objects.all()
+    queryset = CashCountSheet.objects.prefetch_related("items")
     serializer_class = CashCountSheetSerializer
\ No newline at end of file